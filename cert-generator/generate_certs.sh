@@ -3,9 +3,27 @@ set -e
 
 [ -z "$SIGNATURE_ALGO" ] && { echo "Errore: SIGNATURE_ALGO non definita. Controlla .env."; exit 1; }
 
-CA_KEY="/certs/CA.key"; CA_CERT="/certs/CA.crt"; SERVER_KEY="/certs/server.key"
-SERVER_CERT="/certs/server.crt"; SERVER_CHAIN="/certs/qsc-ca-chain.crt"; SERVER_CSR="/certs/server.csr"
+CERT_DIR="${CERT_DIR:-/certs}"
+CA_KEY="$CERT_DIR/CA.key"; CA_CERT="$CERT_DIR/CA.crt"; SERVER_KEY="$CERT_DIR/server.key"
+SERVER_CERT="$CERT_DIR/server.crt"; SERVER_CHAIN="$CERT_DIR/qsc-ca-chain.crt"; SERVER_CSR="$CERT_DIR/server.csr"
 EXTFILE="/tmp/ext.cnf"
+SERVER_HOST="${SERVER_HOST:-192.168.1.100}"; CERT_DAYS="${CERT_DAYS:-365}"
+FILES="CA.key CA.crt server.key server.crt qsc-ca-chain.crt"
+
+# Cache indirizzata dal contenuto: la chiave dipende da algoritmo, parametri di generazione e testo di questo script.
+# FORCE_NEW_CERT=1 ignora la cache e genera sempre nuove chiavi.
+CERT_CACHE="${CERT_CACHE:-/cert-cache}"
+CACHE_KEY="$SIGNATURE_ALGO-$( { echo "$SIGNATURE_ALGO|$SERVER_HOST|$CERT_DAYS"; cat "$0"; } | openssl dgst -sha256 -r | cut -c1-16)"
+CACHE_ENTRY="$CERT_CACHE/$CACHE_KEY"
+
+if [ "${FORCE_NEW_CERT:-0}" != 1 ] && [ -f "$CACHE_ENTRY/qsc-ca-chain.crt" ]; then
+  mkdir -p "$CERT_DIR"
+  for f in $FILES; do cp "$CACHE_ENTRY/$f" "$CERT_DIR/$f"; done
+  chmod 644 "$SERVER_KEY" "$SERVER_CHAIN" "$CA_CERT" "$SERVER_CERT"
+  echo "Certificati $SIGNATURE_ALGO dalla cache ($CACHE_KEY)."
+  echo "Certificati pronti."
+  exit 0
+fi
 
 openssl_pkey() {
   case "$1" in
@@ -28,14 +46,14 @@ sigopts() {
 echo "Generazione certificati..."
 openssl_pkey "$SIGNATURE_ALGO" "$CA_KEY"
 SIGOPT_CA=$(sigopts "$SIGNATURE_ALGO")
-openssl req -x509 -new -key "$CA_KEY" -out "$CA_CERT" -nodes -days 365 \
+openssl req -x509 -new -key "$CA_KEY" -out "$CA_CERT" -nodes -days "$CERT_DAYS" \
   -subj "/CN=oqstest CA" \
   -addext "basicConstraints=critical,CA:TRUE" \
   -addext "keyUsage=critical,keyCertSign,cRLSign" $SIGOPT_CA
 
 openssl_pkey "$SIGNATURE_ALGO" "$SERVER_KEY"
 openssl req -new -key "$SERVER_KEY" -out "$SERVER_CSR" \
-  -subj "/CN=192.168.1.100" \
+  -subj "/CN=$SERVER_HOST" \
   -addext "basicConstraints=critical,CA:FALSE" \
   -addext "keyUsage=critical,digitalSignature,keyEncipherment" \
   -addext "extendedKeyUsage=serverAuth"
@@ -48,7 +66,7 @@ extendedKeyUsage=serverAuth
 EOF
 
 openssl x509 -req -in "$SERVER_CSR" -out "$SERVER_CERT" -CA "$CA_CERT" -CAkey "$CA_KEY" \
-  -CAcreateserial -days 365 -extfile "$EXTFILE" $SIGOPT
+  -CAcreateserial -days "$CERT_DAYS" -extfile "$EXTFILE" $SIGOPT
 
 cat "$SERVER_CERT" "$CA_CERT" > "$SERVER_CHAIN"
 chmod 644 "$SERVER_KEY" "$SERVER_CHAIN" "$CA_CERT" "$SERVER_CERT"
@@ -57,4 +75,16 @@ echo "Certificati generati con successo!"
 echo "Verifica certificati..."
 openssl verify -CAfile "$CA_CERT" "$SERVER_CERT"
 openssl x509 -in "$SERVER_CERT" -text -noout | grep -A1 "Signature Algorithm"
-echo "Verifica completata!"
\ No newline at end of file
+echo "Verifica completata!"
+
+# Salvataggio nella cache solo se montata in scrittura (CERT_CACHE_MODE=rw, vedi run_test.py).
+# mkdir è atomico: con più generatori concorrenti solo chi crea la voce la popola, gli altri la lasciano intatta.
+# Ogni file viene copiato con un nome temporaneo e rinominato; qsc-ca-chain.crt, controllato da chi legge la cache, per ultimo.
+if [ "${FORCE_NEW_CERT:-0}" != 1 ] && [ -d "$CERT_CACHE" ] && [ -w "$CERT_CACHE" ] && mkdir "$CACHE_ENTRY" 2>/dev/null; then
+  if (for f in $FILES; do cp "$CERT_DIR/$f" "$CACHE_ENTRY/.$f.tmp" && mv "$CACHE_ENTRY/.$f.tmp" "$CACHE_ENTRY/$f" || exit 1; done); then
+    echo "Certificati salvati nella cache ($CACHE_KEY)."
+  else
+    rm -rf "$CACHE_ENTRY"
+  fi
+fi
+echo "Certificati pronti."
\ No newline at end of file
@@ -0,0 +1,84 @@
+"""Verifica che il backend dei workload non sia il collo di bottiglia rispetto alla terminazione TLS di nginx.
+
+Misura per --duration secondi, con --concurrency richieste in volo su un CurlMulti, le richieste/s servite:
+  - direttamente dal backend (HTTP su flask_app:5001, una connessione per richiesta come fa nginx verso l'upstream);
+  - attraverso nginx (SERVER_HOST) con un handshake TLS 1.3 completo per richiesta (KEM da DEFAULT_GROUPS, come nei test).
+Termina con codice 1 se il backend non regge almeno --min-ratio volte il carico del livello TLS.
+Da eseguire nel container del client a test concluso, perché le richieste sulla 443 finiscono nel log di accesso di nginx:
+
+    docker exec client_analysis python3 /app/backend_bench.py [--duration 10] [--concurrency 32] [--path /payload/1024]
+"""
+import argparse, csv, os, statistics, sys, time, pycurl
+from datetime import datetime
+
+BACKEND_URL, TLS_URL, CA_FILE = "http://flask_app:5001", f"https://{os.getenv('SERVER_HOST', '192.168.1.100')}", "/opt/certs/CA.crt"
+OUTPUT_CSV = "/app/output/request_logs/avg/backend_bench.csv"
+
+def new_handle(url, tls):
+    c = pycurl.Curl()
+    for o, v in [(pycurl.URL, url), (pycurl.WRITEFUNCTION, len), (pycurl.FRESH_CONNECT, 1), (pycurl.FORBID_REUSE, 1)]: c.setopt(o, v)
+    if tls:
+        c.setopt(pycurl.CAINFO, CA_FILE); c.setopt(pycurl.SSLVERSION, pycurl.SSLVERSION_TLSv1_3)
+    return c
+
+def run_load(url, duration, concurrency, tls):
+    """Carico a ciclo chiuso: ogni handle completato riparte subito finché non scade `duration`."""
+    m, handles, latencies, errors = pycurl.CurlMulti(), [new_handle(url, tls) for _ in range(concurrency)], [], 0
+    start = time.perf_counter()
+    end, in_flight = start + duration, len(handles)
+    for c in handles:
+        c.t0 = time.perf_counter(); m.add_handle(c)
+    try:
+        while in_flight:
+            while m.perform()[0] == pycurl.E_CALL_MULTI_PERFORM: pass
+            while True:
+                queued, ok_list, err_list = m.info_read()
+                for c, ok in [(c, True) for c in ok_list] + [(c, False) for c, _, _ in err_list]:
+                    now = time.perf_counter()
+                    m.remove_handle(c)
+                    if ok and c.getinfo(pycurl.RESPONSE_CODE) == 200: latencies.append((now - c.t0) * 1000)
+                    else: errors += 1
+                    if now < end:
+                        c.t0 = now; m.add_handle(c)
+                    else: in_flight -= 1
+                if queued == 0: break
+            if in_flight: m.select(0.1)
+    finally:
+        for c in handles: c.close()
+        m.close()
+    elapsed = time.perf_counter() - start
+    p50 = round(statistics.median(latencies), 3) if latencies else None
+    return {"requests": len(latencies), "errors": errors, "rps": round(len(latencies) / elapsed, 1), "p50_ms": p50}
+
+def main():
+    parser = argparse.ArgumentParser(description="Capacità del backend dei workload rispetto alla terminazione TLS di nginx")
+    parser.add_argument("--duration", type=float, default=10.0, help="secondi di misura per ciascun livello")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--path", default="/", help="endpoint del backend, es. / o /payload/1048576")
+    parser.add_argument("--min-ratio", type=float, default=2.0, help="rapporto minimo richiesto tra req/s del backend e req/s TLS")
+    parser.add_argument("--output", default=OUTPUT_CSV)
+    args = parser.parse_args()
+
+    backend = run_load(BACKEND_URL + args.path, args.duration, args.concurrency, tls=False)
+    print(f"🧪 Backend diretto: {backend['rps']} req/s, p50 {backend['p50_ms']} ms, errori {backend['errors']}")
+    tls = run_load(TLS_URL + args.path, args.duration, args.concurrency, tls=True)
+    print(f"🔐 nginx + TLS 1.3 ({os.getenv('DEFAULT_GROUPS', '?')}): {tls['rps']} req/s, p50 {tls['p50_ms']} ms, errori {tls['errors']}")
+    ratio = round(backend["rps"] / tls["rps"], 2) if tls["rps"] else float("inf")
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    file_exists = os.path.exists(args.output)
+    with open(args.output, "a", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        if not file_exists:
+            writer.writerow(["Timestamp", "KEM", "Path", "Concurrency", "Duration(s)", "Backend_RPS", "Backend_P50(ms)", "Backend_Errors",
+                             "TLS_RPS", "TLS_P50(ms)", "TLS_Errors", "Ratio"])
+        writer.writerow([datetime.now().strftime("%Y-%m-%d %H:%M:%S"), os.getenv("DEFAULT_GROUPS", ""), args.path, args.concurrency, args.duration,
+                         backend["rps"], backend["p50_ms"], backend["errors"], tls["rps"], tls["p50_ms"], tls["errors"], ratio])
+
+    if ratio < args.min_ratio:
+        print(f"❌ Il backend regge solo {ratio}x il carico TLS (minimo {args.min_ratio}x): aumentare BACKEND_WORKERS/BACKEND_THREADS.")
+        sys.exit(1)
+    print(f"✅ Il backend regge {ratio}x il carico del livello TLS.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""Lettura in streaming di catture pcap/pcapng in un solo passaggio: byte per connessione TCP verso il server e
+dimensioni dei messaggi dell'handshake TLS 1.3 (decifrati con il keylog quando disponibile)."""
+import struct, hmac, hashlib
+try:
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+except ImportError:
+    AESGCM = ChaCha20Poly1305 = None
+
+HANDSHAKE_MESSAGES = {1: "ClientHello", 2: "ServerHello", 8: "EncryptedExtensions", 11: "Certificate", 15: "CertificateVerify"}
+CIPHER_SUITES = {0x1301: ("aes", 16, hashlib.sha256), 0x1302: ("aes", 32, hashlib.sha384), 0x1303: ("chacha", 32, hashlib.sha256)}
+HRR_RANDOM = bytes.fromhex("cf21ad74e59a6111be1d8c021e65b891c2a211167abb8c5e079e09e2c8a8339c")
+MAX_BUFFER, CLOSE_GRACE, SWEEP_EVERY = 1 << 18, 2.0, 1024
+
+def iter_packets(path):
+    """Restituisce (timestamp, linktype, orig_len, data) per ogni pacchetto, leggendo il file un record alla volta."""
+    with open(path, "rb") as f:
+        magic = f.read(4)
+        yield from (_iter_pcapng(f, magic) if magic == b"\x0a\x0d\x0d\x0a" else _iter_pcap(f, magic))
+
+def _iter_pcap(f, magic):
+    formats = {b"\xd4\xc3\xb2\xa1": ("<", 1e-6), b"\xa1\xb2\xc3\xd4": (">", 1e-6), b"\x4d\x3c\xb2\xa1": ("<", 1e-9), b"\xa1\xb2\x3c\x4d": (">", 1e-9)}
+    if magic not in formats: raise ValueError("Formato di cattura non riconosciuto")
+    endian, resolution = formats[magic]
+    linktype = struct.unpack(endian + "HHiIII", f.read(20))[5]
+    while len(hdr := f.read(16)) == 16:
+        sec, frac, incl_len, orig_len = struct.unpack(endian + "IIII", hdr)
+        if len(data := f.read(incl_len)) < incl_len: break
+        yield sec + frac * resolution, linktype & 0xFFFF, orig_len, data
+
+def _iter_pcapng(f, block_type):
+    endian, interfaces = "<", []
+    while len(block_type) == 4 and len(raw_len := f.read(4)) == 4:
+        if block_type == b"\x0a\x0d\x0d\x0a":
+            bom = f.read(4)
+            endian, interfaces = ("<" if bom == b"\x4d\x3c\x2b\x1a" else ">"), []
+            body = bom + f.read(struct.unpack(endian + "I", raw_len)[0] - 16)
+        else:
+            body = f.read(struct.unpack(endian + "I", raw_len)[0] - 12)
+        if len(f.read(4)) < 4: break
+        btype = struct.unpack(endian + "I", block_type)[0]
+        if btype == 1:
+            interfaces.append((struct.unpack_from(endian + "H", body)[0], _ts_resolution(body, endian)))
+        elif btype == 6:
+            iface, ts_high, ts_low, cap_len, orig_len = struct.unpack_from(endian + "IIIII", body)
+            linktype, resolution = interfaces[iface]
+            yield ((ts_high << 32) | ts_low) * resolution, linktype, orig_len, body[20:20 + cap_len]
+        elif btype == 3 and interfaces:
+            orig_len = struct.unpack_from(endian + "I", body)[0]
+            yield None, interfaces[0][0], orig_len, body[4:4 + orig_len]
+        block_type = f.read(4)
+
+def _ts_resolution(idb, endian):
+    """Legge l'opzione if_tsresol di un Interface Description Block (default: microsecondi)."""
+    pos = 8
+    while pos + 4 <= len(idb):
+        code, length = struct.unpack_from(endian + "HH", idb, pos)
+        if code == 0: break
+        if code == 9 and length >= 1:
+            v = idb[pos + 4]
+            return 2 ** -(v & 0x7F) if v & 0x80 else 10 ** -v
+        pos += 4 + (length + 3) // 4 * 4
+    return 1e-6
+
+def _ipv4(linktype, data):
+    if linktype == 1:
+        off, ethertype = 14, data[12:14]
+        if ethertype == b"\x81\x00": off, ethertype = 18, data[16:18]
+    elif linktype == 113: off, ethertype = 16, data[14:16]
+    elif linktype == 276: off, ethertype = 20, data[0:2]
+    elif linktype in (12, 101, 228): off, ethertype = 0, b"\x08\x00"
+    else: return None
+    ip = data[off:]
+    return ip if ethertype == b"\x08\x00" and len(ip) >= 20 and ip[0] >> 4 == 4 else None
+
+def hkdf_expand_label(secret, label, length, hash_fn):
+    full_label = b"tls13 " + label
+    info, out, block, counter = struct.pack("!HB", length, len(full_label)) + full_label + b"\x00", b"", b"", 1
+    while len(out) < length:
+        block = hmac.new(secret, block + info + bytes([counter]), hash_fn).digest()
+        out, counter = out + block, counter + 1
+    return out[:length]
+
+def load_keylog(path):
+    """Mappa client_random -> SERVER_HANDSHAKE_TRAFFIC_SECRET dal file SSLKEYLOGFILE."""
+    secrets = {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[0] == "SERVER_HANDSHAKE_TRAFFIC_SECRET":
+                    secrets[bytes.fromhex(parts[1])] = bytes.fromhex(parts[2])
+    except (OSError, ValueError):
+        pass
+    return secrets
+
+class _TlsStream:
+    """Riassembla una direzione della connessione TCP e ne estrae i messaggi di handshake fino al Finished."""
+    __slots__ = ("conn", "from_client", "next_seq", "pending", "buf", "hs_buf", "aead", "iv", "record_seq", "done", "end_seq")
+
+    def __init__(self, conn, from_client):
+        self.conn, self.from_client, self.next_seq, self.pending = conn, from_client, None, {}
+        self.buf, self.hs_buf, self.aead, self.iv, self.record_seq, self.done = bytearray(), bytearray(), None, None, 0, False
+        self.end_seq = None
+
+    def finish(self):
+        self.done, self.end_seq, self.pending, self.buf, self.hs_buf, self.aead = True, self.next_seq, None, None, None, None
+
+    def in_handshake(self, seq):
+        """Vero se un segmento che inizia a `seq` trasporta dati della fase di handshake (anche se ritrasmesso o duplicato)."""
+        if not self.done: return True
+        return self.end_seq is not None and (seq - self.end_seq + (1 << 31)) % (1 << 32) - (1 << 31) < 0
+
+    def feed(self, seq, payload):
+        if self.next_seq is None: self.next_seq = seq
+        diff = (seq - self.next_seq + (1 << 31)) % (1 << 32) - (1 << 31)
+        if diff > 0:
+            if sum(map(len, self.pending.values())) + len(payload) > MAX_BUFFER: return self.finish()
+            self.pending[seq] = payload
+            return
+        self._append(payload[-diff:])
+        while self.pending and not self.done:
+            ready = [s for s in self.pending if (s - self.next_seq + (1 << 31)) % (1 << 32) - (1 << 31) <= 0]
+            if not ready: break
+            for s in ready: self._append(self.pending.pop(s)[(self.next_seq - s) % (1 << 32):])
+        if not self.done: self._parse_records()
+
+    def _append(self, data):
+        if not data: return
+        self.buf += data
+        self.next_seq = (self.next_seq + len(data)) % (1 << 32)
+        if len(self.buf) > MAX_BUFFER: self.finish()
+
+    def _parse_records(self):
+        while not self.done and len(self.buf) >= 5:
+            ctype, length = self.buf[0], struct.unpack_from("!H", self.buf, 3)[0]
+            if len(self.buf) < 5 + length: break
+            header, body = bytes(self.buf[:5]), bytes(self.buf[5:5 + length])
+            del self.buf[:5 + length]
+            if ctype == 22: self._parse_handshake(body)
+            elif ctype == 21: self.finish()
+            elif ctype == 23:
+                if self.from_client or self.aead is None:
+                    self.conn.encrypted(self)
+                    continue
+                nonce = bytes(a ^ b for a, b in zip(self.iv, self.record_seq.to_bytes(12, "big")))
+                self.record_seq += 1
+                try: inner = self.aead.decrypt(nonce, body, header).rstrip(b"\x00")
+                except Exception: self.finish(); continue
+                if inner and inner[-1] == 22: self._parse_handshake(inner[:-1])
+
+    def _parse_handshake(self, data):
+        self.hs_buf += data
+        while not self.done and len(self.hs_buf) >= 4:
+            length = int.from_bytes(self.hs_buf[1:4], "big")
+            if len(self.hs_buf) < 4 + length: break
+            msg = bytes(self.hs_buf[:4 + length])
+            del self.hs_buf[:4 + length]
+            self.conn.message(self, msg)
+
+class _Connection:
+    __slots__ = ("analyzer", "bytes", "tls_bytes", "sizes", "client_random", "streams", "closed_at")
+
+    def __init__(self, analyzer):
+        self.analyzer, self.bytes, self.tls_bytes, self.sizes = analyzer, [0, 0], [0, 0], {}
+        self.client_random, self.closed_at = None, None
+        self.streams = (_TlsStream(self, True), _TlsStream(self, False))
+
+    def message(self, stream, msg):
+        mtype = msg[0]
+        if mtype in HANDSHAKE_MESSAGES: self.sizes[HANDSHAKE_MESSAGES[mtype]] = len(msg)
+        if mtype == 1 and len(msg) >= 38: self.client_random = msg[6:38]
+        elif mtype == 2 and len(msg) >= 39 and msg[6:38] != HRR_RANDOM: self.install_keys(stream, msg)
+        elif mtype == 20 and not stream.from_client: stream.finish()
+
+    def install_keys(self, stream, server_hello):
+        sid_len = server_hello[38]
+        suite = CIPHER_SUITES.get(int.from_bytes(server_hello[39 + sid_len:41 + sid_len], "big"))
+        secret = self.analyzer.secrets.get(self.client_random)
+        if not suite or secret is None or AESGCM is None: return
+        kind, key_len, hash_fn = suite
+        key = hkdf_expand_label(secret, b"key", key_len, hash_fn)
+        stream.aead = AESGCM(key) if kind == "aes" else ChaCha20Poly1305(key)
+        stream.iv = hkdf_expand_label(secret, b"iv", 12, hash_fn)
+
+    def encrypted(self, stream):
+        # Il primo record cifrato del client è il suo Finished: anche l'handshake del server è concluso.
+        # Senza chiavi i record cifrati del server vengono solo scartati fino a quel momento.
+        if stream.from_client:
+            stream.finish()
+            if not self.streams[1].done: self.streams[1].finish()
+
+class PcapAnalyzer:
+    """Aggrega in un solo passaggio i byte delle connessioni TCP verso `server_ip:server_port`.
+    Conserva lo stato solo per le connessioni aperte: quelle chiuse vengono sommate ai totali e rilasciate."""
+
+    def __init__(self, server_ip, server_port=443, keylog_path=None):
+        self.server = (bytes(map(int, server_ip.split("."))), server_port)
+        self.secrets = load_keylog(keylog_path) if keylog_path else {}
+        self.active, self.connections = {}, 0
+        self.totals = {"upload": 0, "download": 0, "tls_upload": 0, "tls_download": 0}
+        self.size_totals, self.size_counts = {n: 0 for n in HANDSHAKE_MESSAGES.values()}, {n: 0 for n in HANDSHAKE_MESSAGES.values()}
+
+    def process(self, path):
+        for n, (ts, linktype, orig_len, data) in enumerate(iter_packets(path)):
+            self.packet(ts, linktype, orig_len, data)
+            if n % SWEEP_EVERY == 0 and ts is not None: self.sweep(ts)
+        self.sweep(None)
+        return self
+
+    def packet(self, ts, linktype, orig_len, data):
+        ip = _ipv4(linktype, data)
+        if ip is None or ip[9] != 6: return
+        ihl, total = (ip[0] & 0x0F) * 4, struct.unpack_from("!H", ip, 2)[0]
+        tcp = ip[ihl:total] if total else ip[ihl:]
+        if len(tcp) < 20: return
+        sport, dport, seq = struct.unpack_from("!HHI", tcp)
+        flags, payload = tcp[13], tcp[(tcp[12] >> 4) * 4:]
+        if (ip[16:20], dport) == self.server: key, from_client = (ip[12:16], sport), True
+        elif (ip[12:16], sport) == self.server: key, from_client = (ip[16:20], dport), False
+        else: return
+        conn = self.active.get(key)
+        if conn is None or (conn.closed_at is not None and from_client and flags & 0x12 == 0x02):
+            if conn is not None: self.close(conn)
+            conn = self.active[key] = _Connection(self)
+            self.connections += 1
+        direction, stream = (0 if from_client else 1), conn.streams[0 if from_client else 1]
+        conn.bytes[direction] += orig_len
+        if flags & 0x02: stream.next_seq = (seq + 1) % (1 << 32)
+        elif payload and stream.in_handshake(seq):
+            conn.tls_bytes[direction] += orig_len
+            if not stream.done: stream.feed(seq, payload)
+        if flags & 0x05 and conn.closed_at is None: conn.closed_at = ts if ts is not None else 0.0
+
+    def sweep(self, now):
+        for key in [k for k, c in self.active.items() if c.closed_at is not None and (now is None or now - c.closed_at > CLOSE_GRACE)]:
+            self.close(self.active.pop(key))
+        if now is None:
+            for conn in self.active.values(): self.close(conn)
+            self.active = {}
+
+    def close(self, conn):
+        for s in conn.streams:
+            if not s.done: s.finish()
+        self.totals["upload"] += conn.bytes[0]; self.totals["download"] += conn.bytes[1]
+        self.totals["tls_upload"] += conn.tls_bytes[0]; self.totals["tls_download"] += conn.tls_bytes[1]
+        for name, size in conn.sizes.items():
+            self.size_totals[name] += size; self.size_counts[name] += 1
+
+    def summary(self):
+        """Medie per connessione dei byte e, per ogni messaggio di handshake, dimensione media sulle connessioni in cui compare."""
+        div = lambda x, n: x / n if n > 0 else 0
+        result = {k: div(v, self.connections) for k, v in self.totals.items()}
+        result["connections"] = self.connections
+        result["message_sizes"] = {n: round(div(self.size_totals[n], self.size_counts[n]), 2) for n in HANDSHAKE_MESSAGES.values()}
+        return result
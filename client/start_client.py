@@ -1,31 +1,180 @@
-import pycurl, json, os, re, time, logging, subprocess, csv, psutil, pandas as pd
-from threading import Thread, Lock; from datetime import datetime; from io import BytesIO; from concurrent.futures import ThreadPoolExecutor, as_completed
+import pycurl, json, os, re, time, math, random, resource, logging, subprocess, csv, uuid, psutil, urllib.request, urllib.error, multiprocessing as mp, pandas as pd
+from threading import Thread, Event; from collections import defaultdict; from datetime import datetime; from io import BytesIO; from queue import Empty
+from pcap_reader import PcapAnalyzer, HANDSHAKE_MESSAGES
+from metrics_exporter import MetricsRegistry
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s", handlers=[logging.StreamHandler()])
 OUTPUT_DIR, MONITOR_DIR, TRACE_LOG_DIR, AVG_DIR = "/app/output/request_logs", "/app/output/system_logs", "/app/logs/", "/app/output/request_logs/avg/"
+PCAP_FILE, TLS_KEYLOG_FILE = "/app/pcap/capture.pcap", "/tls_keys/tls-secrets.log"
 for d in (OUTPUT_DIR, MONITOR_DIR, TRACE_LOG_DIR, AVG_DIR): os.makedirs(d, exist_ok=True)
-BASE_DOMAIN, NUM_REQUESTS, active_requests, active_requests_lock, global_stats = "192.168.1.100", 500, 0, Lock(), {"cpu_usage": [], "memory_usage": []}
+BASE_DOMAIN, NUM_REQUESTS, CONCURRENCY = os.getenv("SERVER_HOST", "192.168.1.100"), int(os.getenv("NUM_REQUESTS", "500")), max(1, int(os.getenv("CONCURRENCY", "1")))
+WARMUP_REQUESTS = int(os.getenv("WARMUP_REQUESTS", "0"))
+# CLIENT_MODE: "full" (handshake completo per richiesta), "resume" (nuova connessione con ripresa della sessione TLS via ticket/PSK),
+# "keepalive" (REQUESTS_PER_CONNECTION richieste sulla stessa connessione).
+CLIENT_MODE, REQUESTS_PER_CONNECTION = os.getenv("CLIENT_MODE", "full").lower(), max(1, int(os.getenv("REQUESTS_PER_CONNECTION", "10")))
+ARRIVAL_RATE, ARRIVAL_DIST, MAX_IN_FLIGHT = float(os.getenv("ARRIVAL_RATE", "0")), os.getenv("ARRIVAL_DIST", "constant").lower(), 1024
+TRACE_SAMPLE_EVERY, NUM_WORKERS = int(os.getenv("TRACE_SAMPLE_EVERY", "0")), max(1, int(os.getenv("NUM_WORKERS", "1")))
+WORKER_START_TIMEOUT = 60  # s di attesa alla barriera di avvio dei worker
+METRICS_PORT, LATENCY_BUCKETS = int(os.getenv("METRICS_PORT", "0")), [0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5]
+# Messaggi di handshake marcati temporalmente dalla debug callback (testo emesso da curl/OpenSSL per ogni messaggio).
+TLS_PHASE_MARKERS = [("ClientHello", b"(OUT), TLS handshake, Client hello (1)"), ("ServerHello", b"(IN), TLS handshake, Server hello (2)"),
+                     ("Certificate", b"(IN), TLS handshake, Certificate (11)"), ("CertificateVerify", b"(IN), TLS handshake, CERT verify (15)"),
+                     ("ServerFinished", b"(IN), TLS handshake, Finished (20)"), ("ClientFinished", b"(OUT), TLS handshake, Finished (20)")]
+PHASE_COLUMNS = [f"HS_{name}(ms)" for name, _ in TLS_PHASE_MARKERS]
+# WORKLOAD: "hello" (GET /), "get:<size>" (risposta di dimensione fissa), "stream:<size>" (risposta chunked), "post:<size>" (upload)
+# oppure un mix pesato, es. "get:1k=70,post:64k=20,stream:1m=10". Le dimensioni accettano i suffissi k e m (KiB, MiB).
+WORKLOAD, WORKLOAD_PATHS, SIZE_UNITS = os.getenv("WORKLOAD", "hello"), {"hello": "/", "get": "/payload/{}", "stream": "/stream/{}", "post": "/upload"}, {"": 1, "k": 1024, "m": 1024 ** 2}
+WORKLOAD_COLUMNS = ["Workload", "Payload_Bytes(B)", "Throughput(MB/s)", "Goodput(MB/s)"]
+# Colonne del CSV per richiesta: ogni richiesta è un dict con queste chiavi (request_row); Success_Count, Warmup e Request_ID
+# vengono valorizzati alla scrittura del file.
+HEADER = ["Request_Number", "Connect_Time(ms)", "TLS_Handshake(ms)", "Total_Time(ms)", "Elapsed_Time(ms)", "Status", "Success_Count", "Bytes_Sent(B)",
+          "Bytes_Received(B)", "KEM", "Signature", "Cert_Size(B)", "Scheduled_Latency(ms)", "Client_Mode", "Handshake_Type"] + PHASE_COLUMNS + WORKLOAD_COLUMNS + ["Warmup", "Request_ID"]
+# Ogni richiesta invia X-Request-ID "<RUN_ID>-<numero richiesta>", registrato da nginx (RID=) per il join con il log di accesso.
+# RUN_ID è l'ID della run assegnato dal coordinatore Flask al lock (un UUID locale se il coordinatore non lo fornisce).
+RUN_ID, COORDINATOR_URL = uuid.uuid4().hex[:12], f"http://{BASE_DOMAIN}"
+KEM_RE, SIG_RE = re.compile(rb"SSL connection using TLSv1.3 / [^/]+ / (\S+) /"), re.compile(rb"signed using (\S+)")
+active_requests, run_done, ssl_share, global_stats = mp.get_context("fork").Value("i", 0), Event(), None, {"cpu_usage": [], "memory_usage": []}
 CURL_COMMAND_TEMPLATE = ["curl", "--tlsv1.3", "--cacert", "/opt/certs/CA.crt", "-w", "Connect Time: %{time_connect}, TLS Handshake: %{time_appconnect}, Total Time: %{time_total}, %{http_code}\n", "-s", f"https://{BASE_DOMAIN}"]
 
+def client_process_usage():
+    """CPU (s) e RSS (B) del processo client e di tutti i suoi figli ancora in vita (worker e processi curl)."""
+    procs, user, sys_, rss = [psutil.Process()], 0.0, 0.0, 0
+    procs += procs[0].children(recursive=True)
+    for p in procs:
+        try:
+            with p.oneshot():
+                cpu = p.cpu_times(); user += cpu.user; sys_ += cpu.system; rss += p.memory_info().rss
+        except (psutil.NoSuchProcess, psutil.AccessDenied): continue
+    return user, sys_, rss
+
+# Metriche live (formato Prometheus) esposte su METRICS_PORT se > 0; i valori sono condivisi con i worker.
+METRICS = MetricsRegistry()
+M_REQUESTS = METRICS.counter("tls_client_requests_total", "Richieste completate per esito", "status", ("success", "failure"))
+M_HANDSHAKES = METRICS.counter("tls_client_handshakes_total", "Handshake completati per tipo", "type", ("full", "resumed", "reused"))
+M_HANDSHAKE_SECONDS = METRICS.histogram("tls_client_handshake_seconds", "Durata dell'handshake TLS (APPCONNECT_TIME meno CONNECT_TIME)", LATENCY_BUCKETS)
+M_REQUEST_SECONDS = METRICS.histogram("tls_client_request_seconds", "Durata totale della richiesta (TOTAL_TIME)", LATENCY_BUCKETS)
+M_BYTES = METRICS.counter("tls_client_bytes_total", "Byte TLS/HTTP scambiati secondo la debug callback", "direction", ("sent", "received"))
+METRICS.gauge("tls_client_active_requests", "Richieste in volo", lambda: active_requests.value)
+METRICS.gauge("tls_client_cpu_seconds_total", "CPU del client e dei processi figli", lambda: dict(zip(("user", "system"), client_process_usage()[:2])), "mode", "counter")
+METRICS.gauge("tls_client_resident_memory_bytes", "RSS del client e dei processi figli", lambda: client_process_usage()[2])
+
+def observe_request(row):
+    """Aggiorna le metriche live con una riga del CSV (successo o fallimento)."""
+    if METRICS_PORT <= 0: return
+    if row["Status"] != "Success": return M_REQUESTS.inc(value="failure")
+    M_REQUESTS.inc(value="success")
+    if row["Handshake_Type"] in M_HANDSHAKES.values: M_HANDSHAKES.inc(value=row["Handshake_Type"])
+    if row["Handshake_Type"] != "reused": M_HANDSHAKE_SECONDS.observe((row["TLS_Handshake(ms)"] - row["Connect_Time(ms)"]) / 1000)
+    M_REQUEST_SECONDS.observe(row["Total_Time(ms)"] / 1000)
+    M_BYTES.inc(row["Bytes_Sent(B)"], "sent"); M_BYTES.inc(row["Bytes_Received(B)"], "received")
+
+def parse_workload(spec):
+    """Operazioni del profilo come tuple (etichetta, tipo, dimensione in byte, peso)."""
+    ops = []
+    for item in spec.split(","):
+        label, _, weight = item.strip().partition("=")
+        kind, _, size = label.partition(":")
+        if kind not in WORKLOAD_PATHS or not (m := re.fullmatch(r"(\d+(?:\.\d+)?)([km]?)b?", size.lower() or "0")):
+            raise ValueError(f"Profilo di workload non valido: {item!r}")
+        ops.append((label, kind, int(float(m.group(1)) * SIZE_UNITS[m.group(2)]), float(weight or 1)))
+    return ops
+
+WORKLOAD_OPS = parse_workload(WORKLOAD)
+upload_bodies = {}
+
+def workload_for(req_num):
+    """Operazione assegnata alla richiesta: deterministica per numero di richiesta, quindi identica tra repliche e worker."""
+    if len(WORKLOAD_OPS) == 1: return WORKLOAD_OPS[0]
+    return random.Random(req_num).choices(WORKLOAD_OPS, weights=[op[3] for op in WORKLOAD_OPS])[0]
+
+def request_id(req_num):
+    return f"{RUN_ID}-{req_num}"
+
 def get_next_filename(base_path, base_name, extension):
     counter = 1
     while os.path.exists(filename := f"{base_path}/{base_name}{counter}.{extension}"): counter += 1
     return filename, counter
-    
+
+class LatencyHistogram:
+    """Istogramma log-lineare in stile HDR: valori in microsecondi con precisione relativa di ~3 cifre significative."""
+    SUB_BUCKET_BITS = 11
+
+    def __init__(self):
+        self.counts, self.total, self.max = defaultdict(int), 0, 0
+
+    def record(self, value_ms):
+        v = max(0, int(round(value_ms * 1000)))
+        shift = max(0, v.bit_length() - self.SUB_BUCKET_BITS)
+        self.counts[(shift, v >> shift)] += 1
+        self.total += 1; self.max = max(self.max, v)
+
+    def percentile(self, q):
+        if not self.total: return None
+        target, seen = max(1, math.ceil(q / 100 * self.total)), 0
+        for shift, sub in sorted(self.counts, key=lambda k: k[1] << k[0]):
+            seen += self.counts[(shift, sub)]
+            if seen >= target: return round(min(((sub + 1) << shift) - 1, self.max) / 1000, 3)
+
+def build_schedule(req_nums, rate, dist):
+    """Offset (s) di partenza previsti per ogni richiesta in modalità open-loop, a intervalli costanti o esponenziali (Poisson)."""
+    offsets, t = {}, 0.0
+    for req_num in req_nums:
+        offsets[req_num] = t
+        t += random.expovariate(rate) if dist == "poisson" else 1.0 / rate
+    return offsets
+
 def monitor_system():
     with open(MONITOR_FILE, "w", newline="", encoding="utf-8") as f:
         writer = csv.writer(f); writer.writerow(["Timestamp", "CPU_Usage(%)", "Memory_Usage(%)", "Active_TLS"])
         stable_counter = 0
         while True:
-            with active_requests_lock: tls = active_requests
+            tls = active_requests.value
             writer.writerow([datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f"), psutil.cpu_percent(), psutil.virtual_memory().percent, tls])
-            if tls == 0: stable_counter += 1
+            if tls == 0 and run_done.is_set(): stable_counter += 1
             if stable_counter >= 5: break
             time.sleep(0.1)
 
-def build_debug_callback(stream):
+class HandshakeStats:
+    """Contatori per richiesta aggiornati direttamente dalla debug callback, senza passare dal trace testuale."""
+    __slots__ = ("sent", "recv", "kem", "sig_alg", "cert_size", "cert_next", "saw_cert", "t0", "marks")
+
+    def __init__(self):
+        self.sent = self.recv = self.cert_size = 0
+        self.kem = self.sig_alg = "Unknown"
+        self.cert_next = self.saw_cert = False
+        self.t0, self.marks = time.perf_counter(), {}
+
+    def phases(self, connect_s):
+        """Durata (ms) di ogni fase dell'handshake: dal connect TCP al ClientHello, poi da ogni messaggio al successivo
+        osservato. Le fasi assenti (es. Certificate nelle sessioni riprese) valgono None."""
+        phases, prev = [], self.t0 + connect_s
+        for name, _ in TLS_PHASE_MARKERS:
+            if (t := self.marks.get(name)) is None: phases.append(None); continue
+            phases.append(round(max(0.0, t - prev) * 1000, 3)); prev = t
+        return phases
+
+def build_debug_callback(stats, stream=None):
+    """Aggiorna `stats` per ogni evento di debug; se `stream` è fornito scrive anche il trace testuale completo."""
     def debug_cb(t, m):
         try:
+            cert_next, stats.cert_next = stats.cert_next, False
+            if t == pycurl.INFOTYPE_SSL_DATA_IN:
+                stats.recv += len(m)
+                if cert_next: stats.cert_size = len(m)
+            elif t == pycurl.INFOTYPE_SSL_DATA_OUT or t == pycurl.INFOTYPE_HEADER_OUT:
+                stats.sent += len(m)
+            elif t == pycurl.INFOTYPE_HEADER_IN or t == pycurl.INFOTYPE_DATA_IN:
+                stats.recv += len(m)
+            elif t == pycurl.INFOTYPE_TEXT:
+                if b"TLS handshake" in m:
+                    now = time.perf_counter()
+                    # Con HelloRetryRequest vale la prima occorrenza di ogni messaggio.
+                    for name, marker in TLS_PHASE_MARKERS:
+                        if marker in m: stats.marks.setdefault(name, now); break
+                if b"TLS handshake, Certificate (11):" in m: stats.cert_next = stats.saw_cert = True
+                elif b"SSL connection using" in m and (x := KEM_RE.search(m)): stats.kem = x.group(1).decode("iso-8859-1")
+                elif b"signed using" in m and (x := SIG_RE.search(m)): stats.sig_alg = x.group(1).decode("iso-8859-1")
+            if stream is None: return
             if t == pycurl.INFOTYPE_TEXT:
                 stream.write(b"* " + m)
             elif t == pycurl.INFOTYPE_HEADER_IN:
@@ -41,60 +190,153 @@ def build_debug_callback(stream):
             elif t == pycurl.INFOTYPE_SSL_DATA_OUT:
                 stream.write(f"=> Send SSL data, {len(m)} bytes\n".encode())
         except Exception as e:
-            stream.write(f"# Error in debug callback: {e}\n".encode())
+            if stream is not None: stream.write(f"# Error in debug callback: {e}\n".encode())
     return debug_cb
 
-def execute_request(req_num):
-    global active_requests
-    trace_file, kem, sig_alg, cert_size = f"{TRACE_LOG_DIR}trace_{req_num}.log", "Unknown", "Unknown", 0
-    with active_requests_lock:
-        active_requests += 1
+def new_curl():
+    """Handle configurato secondo CLIENT_MODE: in "full" e "resume" ogni richiesta apre una nuova connessione,
+    in "resume" le sessioni TLS sono condivise tra gli handle del processo tramite CurlShare."""
+    global ssl_share
+    c = pycurl.Curl()
+    for o, v in [(pycurl.CAINFO, "/opt/certs/CA.crt"), (pycurl.SSLVERSION, pycurl.SSLVERSION_TLSv1_3), (pycurl.WRITEFUNCTION, len)]: c.setopt(o, v)
+    if CLIENT_MODE != "keepalive":
+        c.setopt(pycurl.FRESH_CONNECT, 1); c.setopt(pycurl.FORBID_REUSE, 1)
+    # Sul CurlMulti gli handle condividono connessioni e sessioni TLS: in "full" nessuna ripresa, ogni riga è un handshake completo.
+    if CLIENT_MODE == "full": c.setopt(pycurl.SSL_SESSIONID_CACHE, 0)
+    if CLIENT_MODE == "resume":
+        if ssl_share is None:
+            ssl_share = pycurl.CurlShare(); ssl_share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_SSL_SESSION)
+        c.setopt(pycurl.SHARE, ssl_share)
+    c.conn_requests = 0
+    return c
+
+def setup_handle(req_num, c=None):
+    """Prepara un handle (nuovo o, in keep-alive, riutilizzato sulla stessa connessione) per la richiesta `req_num`."""
+    traced = TRACE_SAMPLE_EVERY > 0 and (req_num - 1) % TRACE_SAMPLE_EVERY == 0
+    c, stats, stderr_buf = c or new_curl(), HandshakeStats(), BytesIO() if traced else None
+    label, kind, size, _ = workload_for(req_num)
+    headers = [f"X-Request-ID: {request_id(req_num)}"]
+    for o, v in [(pycurl.URL, f"https://{BASE_DOMAIN}" + WORKLOAD_PATHS[kind].format(size)), (pycurl.VERBOSE, True),
+                 (pycurl.DEBUGFUNCTION, build_debug_callback(stats, stderr_buf))]: c.setopt(o, v)
+    if kind == "post":
+        if size not in upload_bodies: upload_bodies[size] = bytes(size)
+        # Senza "Expect:" libcurl attenderebbe un 100-continue prima di inviare il corpo.
+        c.setopt(pycurl.POST, 1); c.setopt(pycurl.POSTFIELDSIZE_LARGE, size); c.setopt(pycurl.READDATA, BytesIO(upload_bodies[size]))
+        headers.append("Expect:")
+    else: c.setopt(pycurl.HTTPGET, 1)
+    c.setopt(pycurl.HTTPHEADER, headers)
+    c.conn_requests += 1
+    if CLIENT_MODE == "keepalive": c.setopt(pycurl.FORBID_REUSE, int(c.conn_requests >= REQUESTS_PER_CONNECTION))
+    c.req_num, c.stats, c.stderr_buf, c.workload, c.start = req_num, stats, stderr_buf, label, time.time()
+    c.scheduled = c.start
+    return c
+
+def release_handle(c):
+    """Chiude l'handle, salvo in keep-alive se la connessione deve ancora servire altre richieste: in quel caso lo restituisce."""
+    if CLIENT_MODE == "keepalive" and c.conn_requests < REQUESTS_PER_CONNECTION: return c
+    c.close()
+
+def request_row(values):
+    """Riga del CSV per richiesta sulle colonne di HEADER; quelle non indicate restano vuote."""
+    return {**dict.fromkeys(HEADER), **values}
+
+def failed_result(req_num):
+    if METRICS_PORT > 0: M_REQUESTS.inc(value="failure")
+    return request_row({"Request_Number": req_num, "Status": "Failure", "Bytes_Sent(B)": 0, "Bytes_Received(B)": 0, "KEM": "Unknown", "Signature": "Unknown",
+                        "Cert_Size(B)": 0, "Client_Mode": CLIENT_MODE, "Handshake_Type": "", "Workload": workload_for(req_num)[0], "Payload_Bytes(B)": 0})
+
+def collect_result(c, end):
+    """Legge metriche e contatori di un handle completato, salva il trace se campionato e restituisce la riga del CSV."""
+    req_num, stats, stderr_buf = c.req_num, c.stats, c.stderr_buf
+    elapsed, latency = round((end - c.start) * 1000, 3), round((end - c.scheduled) * 1000, 3)
+    connect_s = c.getinfo(c.CONNECT_TIME)
+    conn = round(connect_s * 1000, 3)
+    hs = round(c.getinfo(c.APPCONNECT_TIME) * 1000, 3)
+    total = round(c.getinfo(c.TOTAL_TIME) * 1000, 3)
+    status = str(c.getinfo(c.RESPONSE_CODE))
+    success = "Success" if status == "200" else "Failure"
+    hs_type = "reused" if c.getinfo(c.NUM_CONNECTS) == 0 else "full" if stats.saw_cert else "resumed"
+    if stderr_buf is not None:
+        with open(f"{TRACE_LOG_DIR}trace_{req_num}.log", "wb") as f:
+            f.write(stderr_buf.getvalue())
+    sent, recv, kem, sig_alg, cert_size = stats.sent, stats.recv, stats.kem, stats.sig_alg, stats.cert_size
+    phases = stats.phases(connect_s)
+    logging.info(f"Richiesta {req_num}: {success} | Connessione={conn} ms, Handshake={hs} ms, Total_Time={total} ms, ElaspsedTime={elapsed} ms, Inviati={sent}, Ricevuti={recv}, HTTP={status}, KEM={kem}, Firma={sig_alg}, Cert_Size={cert_size} B, Handshake={hs_type}")
+    # Throughput sulla sola fase HTTP (dopo l'handshake), goodput sull'intera richiesta handshake compreso.
+    payload = int(c.getinfo(c.SIZE_DOWNLOAD) + c.getinfo(c.SIZE_UPLOAD))
+    transfer_s, total_s = c.getinfo(c.TOTAL_TIME) - c.getinfo(c.APPCONNECT_TIME), c.getinfo(c.TOTAL_TIME)
+    throughput = round(payload / transfer_s / 1e6, 3) if transfer_s > 0 else None
+    goodput = round(payload / total_s / 1e6, 3) if total_s > 0 else None
+    row = request_row({"Request_Number": req_num, "Connect_Time(ms)": conn, "TLS_Handshake(ms)": hs, "Total_Time(ms)": total, "Elapsed_Time(ms)": elapsed,
+                       "Status": success, "Bytes_Sent(B)": sent, "Bytes_Received(B)": recv, "KEM": kem, "Signature": sig_alg, "Cert_Size(B)": cert_size,
+                       "Scheduled_Latency(ms)": latency, "Client_Mode": CLIENT_MODE, "Handshake_Type": hs_type, **dict(zip(PHASE_COLUMNS, phases)),
+                       "Workload": c.workload, "Payload_Bytes(B)": payload, "Throughput(MB/s)": throughput, "Goodput(MB/s)": goodput})
+    observe_request(row)
+    return row
+
+def execute_request(req_num, c=None):
+    """Esegue una richiesta e restituisce la riga del CSV e l'handle da riutilizzare (solo in keep-alive)."""
+    with active_requests.get_lock():
+        active_requests.value += 1
     try:
-        start = time.time()
-        buffer, stderr_buf, c = BytesIO(), BytesIO(), pycurl.Curl()
-        for o, v in [(pycurl.URL, f"https://{BASE_DOMAIN}"),(pycurl.CAINFO, "/opt/certs/CA.crt"), (pycurl.SSLVERSION, pycurl.SSLVERSION_TLSv1_3), (pycurl.WRITEDATA, buffer),
-            (pycurl.VERBOSE, True),(pycurl.DEBUGFUNCTION, build_debug_callback(stderr_buf))]: c.setopt(o, v)
+        c = setup_handle(req_num, c)
         c.perform()
-        elapsed = round((time.time() - start) * 1000, 3)
-        conn = round(c.getinfo(c.CONNECT_TIME) * 1000, 3)
-        hs = round(c.getinfo(c.APPCONNECT_TIME) * 1000, 3)
-        total = round(c.getinfo(c.TOTAL_TIME) * 1000, 3)
-        status = str(c.getinfo(c.RESPONSE_CODE))
-        success = "Success" if status == "200" else "Failure"
-        c.close()
-        stderr = stderr_buf.getvalue().decode("iso-8859-1", errors="replace").splitlines()
-        with open(trace_file, "w", encoding="iso-8859-1") as f:
-            f.write("\n".join(stderr))
-        sent = recv = 0
-        prev = ""
-        for line in stderr:
-            if (m := re.search(r"(=> Send SSL data, (\d+)|Send header, (\d+))", line)):
-                sent += int(m.group(2) or m.group(3))
-            if (m := re.search(r"(<= Recv SSL data, (\d+)|Recv header, (\d+)|Recv data, (\d+))", line)):
-                recv += int(m.group(2) or m.group(3) or m.group(4))
-            if (m := re.search(r"SSL connection using TLSv1.3 / [^/]+ / (\S+) /", line)):
-                kem = m.group(1)
-            if "signed using" in line and (m := re.search(r"signed using (\S+)", line)):
-                sig_alg = m.group(1)
-            if "TLS handshake, Certificate (11):" in prev and (m := re.search(r"<= Recv SSL data, (\d+)", line)):
-                cert_size = int(m.group(1))
-            prev = line
-        logging.info(f"Richiesta {req_num}: {success} | Connessione={conn} ms, Handshake={hs} ms, Total_Time={total} ms, ElaspsedTime={elapsed} ms, Inviati={sent}, Ricevuti={recv}, HTTP={status}, KEM={kem}, Firma={sig_alg}, Cert_Size={cert_size} B")
-        return [req_num, conn, hs, total, elapsed, success, sent, recv, kem, sig_alg, cert_size]
+        return collect_result(c, time.time()), release_handle(c)
     except Exception as e:
         logging.error(f"Errore richiesta {req_num}: {e}")
-        return [req_num, None, None, None, None, "Failure", 0, 0, kem, sig_alg, cert_size]
+        if c is not None: c.close()
+        return failed_result(req_num), None
     finally:
-        with active_requests_lock:
-            active_requests -= 1
+        with active_requests.get_lock():
+            active_requests.value -= 1
+
+def execute_requests_multi(req_nums, concurrency, schedule=None):
+    """Esegue le richieste su un unico CurlMulti mantenendo al massimo `concurrency` connessioni in volo.
+    Con `schedule` (offset in secondi per numero di richiesta) ogni richiesta parte non prima del proprio istante previsto
+    e la latenza è misurata da quell'istante, così le code lato server non vengono nascoste (open-loop)."""
+    m, pending, in_flight, results, base = pycurl.CurlMulti(), sorted(req_nums, reverse=True), 0, [], time.time()
+    idle = []  # handle keep-alive pronti per la richiesta successiva sulla propria connessione
+    due = lambda req_num: base + schedule[req_num] if schedule else 0
+    def finish(c, errmsg=None):
+        nonlocal in_flight
+        req_num, end = c.req_num, time.time()
+        m.remove_handle(c); in_flight -= 1
+        with active_requests.get_lock(): active_requests.value -= 1
+        if errmsg is None:
+            try:
+                results.append(collect_result(c, end))
+                if (reusable := release_handle(c)) is not None: idle.append(reusable)
+                return
+            except Exception as e: errmsg = str(e)
+        logging.error(f"Errore richiesta {req_num}: {errmsg}")
+        results.append(failed_result(req_num)); c.close()
+    try:
+        while pending or in_flight:
+            while pending and in_flight < concurrency and due(pending[-1]) <= time.time():
+                c = setup_handle(pending.pop(), idle.pop() if idle else None)
+                if schedule: c.scheduled = due(c.req_num)
+                with active_requests.get_lock(): active_requests.value += 1
+                m.add_handle(c); in_flight += 1
+            while m.perform()[0] == pycurl.E_CALL_MULTI_PERFORM: pass
+            while True:
+                queued, ok_list, err_list = m.info_read()
+                for c in ok_list: finish(c)
+                for c, _, errmsg in err_list: finish(c, errmsg)
+                if queued == 0: break
+            wait = min(1.0, max(0.0, due(pending[-1]) - time.time())) if pending and in_flight < concurrency else 1.0
+            if in_flight: m.select(wait)
+            elif wait: time.sleep(wait)
+    finally:
+        for c in idle: c.close()
+        m.close()
+    return results
 
 def execute_request_curl(req_num):
-    global active_requests
     trace_file, cert_size, kem, sig_alg  = f"{TRACE_LOG_DIR}trace_{req_num}.log", 0, "Unknown", "Unknown"
-    with active_requests_lock: active_requests += 1  
+    with active_requests.get_lock(): active_requests.value += 1
     try:
         start = time.time()
-        process = subprocess.Popen(CURL_COMMAND_TEMPLATE + ["--trace", trace_file, "-o", "/dev/null"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        process = subprocess.Popen(CURL_COMMAND_TEMPLATE + ["-H", f"X-Request-ID: {request_id(req_num)}", "--trace", trace_file, "-o", "/dev/null"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
         stdout, _ = process.communicate()
         elapsed_time = round((time.time() - start) * 1000, 3)
         bytes_sent = bytes_received = 0
@@ -120,84 +362,124 @@ def execute_request_curl(req_num):
             connect_time = handshake_time = total_time = None
             success_status = "Failure"
         logging.info(f"Richiesta {req_num}: {success_status} | Connessione={connect_time} ms, Handshake={handshake_time} ms, Total_Time={total_time} ms, ElaspsedTime={elapsed_time} ms, Inviati={bytes_sent}, Ricevuti={bytes_received}, HTTP={http_status}, KEM={kem}, Firma={sig_alg}, Cert_Size={cert_size} B")
-        return [req_num, connect_time, handshake_time, total_time, elapsed_time, success_status, bytes_sent, bytes_received, kem, sig_alg, cert_size]
+        return request_row({"Request_Number": req_num, "Connect_Time(ms)": connect_time, "TLS_Handshake(ms)": handshake_time, "Total_Time(ms)": total_time,
+                            "Elapsed_Time(ms)": elapsed_time, "Status": success_status, "Bytes_Sent(B)": bytes_sent, "Bytes_Received(B)": bytes_received,
+                            "KEM": kem, "Signature": sig_alg, "Cert_Size(B)": cert_size, "Scheduled_Latency(ms)": elapsed_time, "Client_Mode": "full",
+                            "Handshake_Type": "full", "Workload": "hello", "Payload_Bytes(B)": 0})
     except Exception as e:
         logging.error(f"Errore richiesta {req_num}: {e}")
-        return [req_num, None, None, None, None, "Failure", 0, 0, kem, sig_alg, cert_size]
+        return request_row({"Request_Number": req_num, "Status": "Failure", "Bytes_Sent(B)": 0, "Bytes_Received(B)": 0, "KEM": kem, "Signature": sig_alg,
+                            "Cert_Size(B)": cert_size, "Client_Mode": "full", "Handshake_Type": "", "Workload": "hello", "Payload_Bytes(B)": 0})
     finally:
-        with active_requests_lock: active_requests -= 1
+        with active_requests.get_lock(): active_requests.value -= 1
+
+def process_cpu_times():
+    """CPU user/sys (s) consumata dal processo client e dai processi figli già terminati (worker inclusi)."""
+    own, children = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + children.ru_utime, own.ru_stime + children.ru_stime
+
+def run_requests(req_nums, schedule=None):
+    if schedule: return execute_requests_multi(req_nums, MAX_IN_FLIGHT, schedule)
+    if CONCURRENCY > 1: return execute_requests_multi(req_nums, CONCURRENCY)
+    results, c = [], None
+    for r in req_nums:
+        row, c = execute_request(r, c)
+        results.append(row)
+    if c is not None: c.close()
+    return results
+
+def run_worker(idx, req_nums, schedule, barrier, queue):
+    global ssl_share
+    ssl_share = None  # ogni worker mantiene la propria cache di sessioni TLS
+    try:
+        cores = sorted(os.sched_getaffinity(0))
+        os.sched_setaffinity(0, {cores[idx % len(cores)]})
+    except (AttributeError, OSError) as e:
+        logging.warning(f"Worker {idx}: impossibile impostare l'affinità CPU ({e})")
+    try:
+        barrier.wait()
+        queue.put((idx, run_requests(req_nums, schedule)))
+    except Exception as e:
+        logging.error(f"Errore nel worker {idx}: {e}")
+        queue.put((idx, [failed_result(r) for r in req_nums]))
 
-def convert_to_bytes(value, unit):
-    unit = unit.lower()
-    value = float(value)
-    units = {'b': 1, 'byte': 1, 'bytes': 1, 'kb': 1024, 'mb': 1024**2, 'gb': 1024**3}
-    if unit in units: return int(value * units[unit])
-    raise ValueError(f"Unità non riconosciuta: {unit}")
+def run_workers(req_nums, num_workers, schedule=None):
+    """Distribuisce le richieste (interlacciate) su `num_workers` processi, ognuno su un core, avviati insieme da una barriera.
+    Un worker terminato senza consegnare i risultati (OOM kill, segfault in pycurl/OpenSSL) non blocca la run: le richieste
+    del suo gruppo vengono registrate come fallite. Con la barriera a tempo, un worker morto all'avvio non blocca gli altri."""
+    ctx, shards = mp.get_context("fork"), [list(req_nums)[w::num_workers] for w in range(num_workers)]
+    barrier, queue = ctx.Barrier(num_workers, timeout=WORKER_START_TIMEOUT), ctx.Queue()
+    workers = [ctx.Process(target=run_worker, args=(w, shards[w], schedule, barrier, queue)) for w in range(num_workers)]
+    for p in workers: p.start()
+    shard_results, dead = {}, set()
+    def collect(timeout):
+        idx, rows = queue.get(timeout=timeout)
+        shard_results[idx] = rows; dead.discard(idx)
+    while len(shard_results) + len(dead) < num_workers:
+        try: collect(1)
+        except Empty:
+            for w, p in enumerate(workers):
+                if w not in shard_results and w not in dead and p.exitcode is not None:
+                    logging.error(f"Worker {w} terminato (codice {p.exitcode}) senza risultati: {len(shards[w])} richieste registrate come fallite")
+                    dead.add(w)
+    try:  # risultati arrivati dopo che il worker era già stato dato per terminato
+        while True: collect(0.1)
+    except Empty: pass
+    for w in dead: shard_results[w] = [failed_result(r) for r in shards[w]]
+    for p in workers: p.join()
+    return sorted((r for rows in shard_results.values() for r in rows), key=lambda r: r["Request_Number"])
 
 def analyze_pcap():
-    pcap_file, tls_keylog_file = "/app/pcap/capture.pcap", "/tls_keys/tls-secrets.log"
+    """Analizza la cattura in un unico passaggio: medie per connessione dei byte totali, dei byte di handshake e
+    dimensioni medie dei messaggi ClientHello/ServerHello/EncryptedExtensions/Certificate/CertificateVerify."""
     try:
-        result = subprocess.run(["tshark", "-r", pcap_file, "-q", "-z", "conv,tcp"], capture_output=True, text=True, timeout=60)
-        if result.returncode != 0:
-            logging.error("Errore nell'analisi del file pcap con tshark")
-            return 0, 0, 0, 0
-
-        upload_bytes = download_bytes = num_connessioni = 0
-        pattern = re.compile(r"(\d+\.\d+\.\d+\.\d+:\d+)\s+<->\s+(\d+\.\d+\.\d+\.\d+:\d+)\s+\d+\s+(\d+)\s+(\w+)\s+\d+\s+(\d+)\s+(\w+)")
-        for line in result.stdout.split("\n"):
-            match = pattern.search(line)
-            if match:
-                num_connessioni += 1
-                download = convert_to_bytes(match.group(3), match.group(4))
-                upload = convert_to_bytes(match.group(5), match.group(6))
-                download_bytes += download; upload_bytes += upload
-
-        tls_result = subprocess.run([ "tshark", "-r", pcap_file, "-Y", "tls.handshake", "-T", "fields",
-            "-e", "ip.src", "-e", "tcp.srcport", "-e", "ip.dst", "-e", "tcp.dstport", "-e", "frame.len", "-e", "tls.handshake.type",
-            "-o", f"tls.keylog_file:{tls_keylog_file}"], capture_output=True, text=True, timeout=60)
-
-        tls_upload_bytes = tls_download_bytes = 0
-        if tls_result.returncode == 0:
-            for line in tls_result.stdout.splitlines():
-                try:
-                    fields = line.split("\t")
-                    if len(fields) >= 6:
-                        dst_ip, frame_size = fields[2], int(fields[4])
-                        if dst_ip == BASE_DOMAIN: tls_upload_bytes += frame_size
-                        else: tls_download_bytes += frame_size
-                except ValueError: continue
-
-        div = lambda x: x / num_connessioni if num_connessioni > 0 else 0
-        avg_upload, avg_download = div(upload_bytes), div(download_bytes)
-        avg_tls_upload, avg_tls_download = div(tls_upload_bytes), div(tls_download_bytes)
-
-        logging.info(f"Numero connessioni individuate: {num_connessioni}")
-        logging.info(f"Totale upload: {upload_bytes} bytes | Totale download: {download_bytes} bytes")
-        logging.info(f"Media byte inviati: {avg_upload:.2f} B | Media byte ricevuti: {avg_download:.2f} B")
-        logging.info(f"Media traffico TLS inviato: {avg_tls_upload:.2f} B | Media traffico TLS ricevuto: {avg_tls_download:.2f} B")
-
-        return avg_upload, avg_download, avg_tls_upload, avg_tls_download
-    except subprocess.TimeoutExpired:
-        logging.error("Timeout durante l'esecuzione di tshark.")
-        return 0, 0, 0, 0
+        stats = PcapAnalyzer(BASE_DOMAIN, 443, TLS_KEYLOG_FILE).process(PCAP_FILE).summary()
     except Exception as e:
-        logging.error(f"Errore durante l'analisi: {e}")
-        return 0, 0, 0, 0
+        logging.error(f"Errore durante l'analisi del file pcap: {e}")
+        return 0, 0, 0, 0, {name: 0 for name in HANDSHAKE_MESSAGES.values()}
+    logging.info(f"Numero connessioni individuate: {stats['connections']}")
+    logging.info(f"Media byte inviati: {stats['upload']:.2f} B | Media byte ricevuti: {stats['download']:.2f} B")
+    logging.info(f"Media traffico TLS inviato: {stats['tls_upload']:.2f} B | Media traffico TLS ricevuto: {stats['tls_download']:.2f} B")
+    logging.info("Dimensioni medie messaggi di handshake: " + ", ".join(f"{k}={v} B" for k, v in stats["message_sizes"].items()))
+    return stats["upload"], stats["download"], stats["tls_upload"], stats["tls_download"], stats["message_sizes"]
+
+def append_csv_row(path, header, row):
+    """Aggiunge una riga a un CSV di report; se il file esiste con intestazione diversa lo riallinea alle nuove colonne."""
+    if os.path.exists(path):
+        with open(path, newline="", encoding="utf-8") as f:
+            current = next(csv.reader(f), [])
+        if current != header: pd.read_csv(path).reindex(columns=header).to_csv(path, index=False)
+    file_exists = os.path.exists(path)
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        if not file_exists: writer.writerow(header)
+        writer.writerow(row)
 
-def update_average_report(request_results):
+def update_average_report(request_results, cpu_times=(0.0, 0.0)):
     """Genera il report delle medie globali per il batch corrente e aggiorna average_metrics.csv."""
     avg_file = os.path.join(AVG_DIR, "average_metrics.csv")
-    success_results = [r for r in request_results if r[1] is not None]
+    success_results = [r for r in request_results if r["Connect_Time(ms)"] is not None]
     if not success_results:
         logging.warning("Nessuna richiesta di successo, il report delle medie non verrà aggiornato.")
         return
 
-    mean = lambda idx: round(sum(r[idx] for r in success_results) / len(success_results), 4)
-    avg_connect_time, avg_handshake_time = mean(1), mean(2)
-    avg_total_time, avg_elapsed_time = mean(3), mean(4)
-    avg_logical_bytes_sent, avg_logical_bytes_received = mean(6), mean(7)
-    kem_used = next((r[8] for r in success_results if r[8] and r[8] != "Unknown"), "Unknown")
-    sig_used = next((r[9] for r in success_results if r[9] and r[9] != "Unknown"), "Unknown")
+    mean = lambda col: round(sum(r[col] for r in success_results) / len(success_results), 4)
+    avg_connect_time, avg_handshake_time = mean("Connect_Time(ms)"), mean("TLS_Handshake(ms)")
+    avg_total_time, avg_elapsed_time = mean("Total_Time(ms)"), mean("Elapsed_Time(ms)")
+    avg_logical_bytes_sent, avg_logical_bytes_received = mean("Bytes_Sent(B)"), mean("Bytes_Received(B)")
+    cpu_user, cpu_sys = (round(t, 4) for t in cpu_times)
+    # Con tutte le connessioni riutilizzate non c'è alcun handshake a cui attribuire la CPU: la metrica resta vuota.
+    handshakes = sum(1 for r in success_results if r["Handshake_Type"] != "reused")
+    cpu_us_per_handshake = round((cpu_times[0] + cpu_times[1]) * 1e6 / handshakes, 2) if handshakes else None
+    def mean_present(col):
+        values = [r[col] for r in success_results if r[col] is not None]
+        return round(sum(values) / len(values), 4) if values else None
+    phase_means = [mean_present(col) for col in PHASE_COLUMNS]
+    # Quota del tempo totale spesa fino alla fine dell'handshake: indica quando il trasferimento dati diventa dominante.
+    handshake_share = round(avg_handshake_time / avg_total_time * 100, 2) if avg_total_time else None
+    workload_means = [mean_present(col) for col in WORKLOAD_COLUMNS[1:]]
+    kem_used = next((r["KEM"] for r in success_results if r["KEM"] and r["KEM"] != "Unknown"), "Unknown")
+    sig_used = next((r["Signature"] for r in success_results if r["Signature"] and r["Signature"] != "Unknown"), "Unknown")
 
     if os.path.exists(MONITOR_FILE):
         df = pd.read_csv(MONITOR_FILE)
@@ -207,76 +489,102 @@ def update_average_report(request_results):
         avg_ram = round(valid_ram.mean(), 4) if not valid_ram.empty else 0.0
     else: avg_cpu, avg_ram = 0.0, 0.0
 
-    avg_upload, avg_download, avg_tls_upload, avg_tls_download = analyze_pcap()
-    file_exists = os.path.exists(avg_file)
-    with open(avg_file, "a", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        if not file_exists:
-            writer.writerow([
-                "KEM", "Signature", "Avg_Connect_Time(ms)", "Avg_Handshake_Time(ms)",
-                "Avg_Total_Time(ms)", "Avg_Elapsed_Time(ms)", "Client_Avg_CPU_Usage(%)",
-                "Client_Avg_RAM_Usage(%)", "Avg_Upload_Bytes (Wireshark)", "Avg_Download_Bytes (Wireshark)",
-                "Avg_TLS_Upload_Bytes (Wireshark)", "Avg_TLS_Download_Bytes (Wireshark)",
-                "Avg_Logical_Bytes_Sent (cURL)", "Avg_Logical_Bytes_Received (cURL)"])
-        writer.writerow([
-            kem_used, sig_used, avg_connect_time, avg_handshake_time, avg_total_time,
-            avg_elapsed_time, avg_cpu, avg_ram, avg_upload, avg_download,
-            avg_tls_upload, avg_tls_download, avg_logical_bytes_sent, avg_logical_bytes_received])
+    avg_upload, avg_download, avg_tls_upload, avg_tls_download, message_sizes = analyze_pcap()
+    append_csv_row(avg_file, [
+        "KEM", "Signature", "Avg_Connect_Time(ms)", "Avg_Handshake_Time(ms)",
+        "Avg_Total_Time(ms)", "Avg_Elapsed_Time(ms)", "Client_Avg_CPU_Usage(%)",
+        "Client_Avg_RAM_Usage(%)", "Avg_Upload_Bytes (Wireshark)", "Avg_Download_Bytes (Wireshark)",
+        "Avg_TLS_Upload_Bytes (Wireshark)", "Avg_TLS_Download_Bytes (Wireshark)",
+        "Avg_Logical_Bytes_Sent (cURL)", "Avg_Logical_Bytes_Received (cURL)"] +
+        [f"Avg_{name}_Size(B) (Wireshark)" for name in HANDSHAKE_MESSAGES.values()] +
+        ["Client_CPU_User(s)", "Client_CPU_Sys(s)", "Client_CPU_us_per_Handshake", "Client_Mode"] + [f"Avg_{col}" for col in PHASE_COLUMNS] +
+        ["Workload", "Avg_Payload_Bytes(B)", "Avg_Throughput(MB/s)", "Avg_Goodput(MB/s)", "Handshake_Share(%)", "Run_ID"], [
+        kem_used, sig_used, avg_connect_time, avg_handshake_time, avg_total_time,
+        avg_elapsed_time, avg_cpu, avg_ram, avg_upload, avg_download,
+        avg_tls_upload, avg_tls_download, avg_logical_bytes_sent, avg_logical_bytes_received] + list(message_sizes.values()) +
+        [cpu_user, cpu_sys, cpu_us_per_handshake, CLIENT_MODE] + phase_means + [WORKLOAD] + workload_means + [handshake_share, RUN_ID])
     logging.info(f"Report delle medie aggiornato: {avg_file}")
 
+def update_latency_report(request_results, load_mode):
+    """Aggiorna latency_percentiles.csv con p50/p90/p99/p99.9 per coppia KEM/firma, calcolati da istogrammi HDR."""
+    pct_file, metrics, quantiles = os.path.join(AVG_DIR, "latency_percentiles.csv"), [(name, f"{name}(ms)") for name in ("Connect_Time", "TLS_Handshake", "Total_Time", "Scheduled_Latency")], [50, 90, 99, 99.9]
+    histograms = defaultdict(lambda: {name: LatencyHistogram() for name, _ in metrics})
+    for r in request_results:
+        if r["Connect_Time(ms)"] is None: continue
+        for name, col in metrics: histograms[(r["KEM"], r["Signature"])][name].record(r[col])
+    if not histograms:
+        logging.warning("Nessuna richiesta di successo, il report dei percentili non verrà aggiornato.")
+        return
+    header = ["KEM", "Signature", "Client_Mode", "Load_Mode", "Target_Rate(req/s)", "Count"] + [f"{name}_P{q:g}(ms)" for name, _ in metrics for q in quantiles]
+    for (kem, sig), hists in histograms.items():
+        append_csv_row(pct_file, header, [kem, sig, CLIENT_MODE, load_mode, ARRIVAL_RATE, hists["Total_Time"].total] +
+                       [hists[name].percentile(q) for name, _ in metrics for q in quantiles])
+    logging.info(f"Report dei percentili di latenza aggiornato: {pct_file}")
+
+def coordinator_request(path, method="GET", timeout=35):
+    with urllib.request.urlopen(urllib.request.Request(f"{COORDINATOR_URL}{path}", method=method), timeout=timeout) as r:
+        return json.load(r)
+
 def wait_and_lock_server():
-    base_url_http = f"http://{BASE_DOMAIN}"
-    print("🔁 Sync con Nginx/Flask via HTTP (curl)...")
+    """Blocca la run corrente sul coordinatore Flask e ne restituisce l'ID. Se un'altra run è in corso attende
+    il suo completamento con un long-poll invece di interrogare /status a intervalli fissi."""
+    print("🔁 Sync con il coordinatore Flask...")
     while True:
         try:
-            r = subprocess.run(["curl", "-s", f"{base_url_http}/status"],
-                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
-            if r.returncode != 0 or not r.stdout.strip():
-                raise Exception("Nessuna risposta")
-            try:
-                res = json.loads(r.stdout)
-            except json.JSONDecodeError:
-                raise Exception(f"Risposta non JSON valida: {r.stdout.strip()}")
-            if res.get("ready") is True:
-                print("⏳ Test in corso. Attendo riavvio server...")
-            else:
-                p = subprocess.run(["curl", "-s", "-X", "POST", f"{base_url_http}/ready"],
-                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-                if p.returncode == 0:
-                    print("✅ Server lockato. Avvio richieste.")
-                    break
-        except Exception as e:
-            print(f"❌ Server non pronto. Retry... ({e})")
-        time.sleep(1)
+            res = coordinator_request("/ready", "POST")
+            run_id = res.get("run_id") or RUN_ID
+            print(f"✅ Server lockato (run {run_id}). Avvio richieste.")
+            return run_id
+        except urllib.error.HTTPError as e:
+            if e.code != 409:
+                print(f"❌ Risposta inattesa dal coordinatore: HTTP {e.code}. Retry..."); time.sleep(1); continue
+            busy = json.load(e)
+            print(f"⏳ Run {busy['run_id']} in corso. Attendo il suo completamento...")
+            try: coordinator_request(f"/wait?phase=complete&run_id={busy['run_id']}")
+            except (urllib.error.URLError, OSError, ValueError): time.sleep(1)
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            print(f"❌ Server non pronto. Retry... ({e})"); time.sleep(0.5)
+
+def notify_client_done():
+    try: coordinator_request(f"/runs/{RUN_ID}/client-done", "POST", timeout=5)
+    except (urllib.error.URLError, OSError, ValueError) as e: logging.warning(f"Impossibile notificare il coordinatore: {e}")
 
 OUTPUT_FILE, file_index = get_next_filename(OUTPUT_DIR, "request_client", "csv")
 MONITOR_FILE, _ = get_next_filename(MONITOR_DIR, "system_client", "csv")
-wait_and_lock_server()
+if METRICS_PORT > 0:
+    METRICS.serve(METRICS_PORT); logging.info(f"Metriche live su http://0.0.0.0:{METRICS_PORT}/metrics")
+RUN_ID = wait_and_lock_server()
 with open(OUTPUT_FILE, "w", newline="", encoding="utf-8") as f:
-    writer = csv.writer(f)
-    writer.writerow(["Request_Number", "Connect_Time(ms)", "TLS_Handshake(ms)", "Total_Time(ms)", "Elapsed_Time(ms)", 
-                     "Status", "Success_Count", "Bytes_Sent(B)", "Bytes_Received(B)", "KEM", "Signature", "Cert_Size(B)"])
+    writer = csv.DictWriter(f, HEADER)
+    writer.writeheader()
     
+    # Le richieste di warm-up (prima connessione, cache, avvio dei worker nginx) sono escluse da medie e monitoraggio.
+    warmup_results = run_requests(range(1, WARMUP_REQUESTS + 1)) if WARMUP_REQUESTS > 0 else []
+    if warmup_results: logging.info(f"Warm-up completato: {len(warmup_results)} richieste escluse dalle medie.")
+    req_nums = range(WARMUP_REQUESTS + 1, WARMUP_REQUESTS + NUM_REQUESTS + 1)
     monitor_thread = Thread(target=monitor_system); monitor_thread.start()
     start_time = time.time()
-    request_results = []  
+    request_results, load_mode = [], f"open-{ARRIVAL_DIST}" if ARRIVAL_RATE > 0 else "closed"
+    schedule = build_schedule(req_nums, ARRIVAL_RATE, ARRIVAL_DIST) if ARRIVAL_RATE > 0 else None
+    cpu_start = process_cpu_times()
     try:
-        for i in range(NUM_REQUESTS):
-            result = execute_request(i + 1)
-            request_results.append(result)
-        # with ThreadPoolExecutor(max_workers=NUM_REQUESTS) as executor:
-        #     futures = [executor.submit(execute_request, i + 1) for i in range(NUM_REQUESTS)]  
-        #     for future in as_completed(futures): request_results.append(future.result()) 
+        if NUM_WORKERS > 1: request_results = run_workers(req_nums, NUM_WORKERS, schedule)
+        else: request_results = run_requests(req_nums, schedule)
     finally:
-        monitor_thread.join()
-        end_time = time.time()
-    kem_used  = next((r[8] for r in request_results if r[8] != "Unknown"), "Unknown")
-    sig_used = next((r[9] for r in request_results if r[9] != "Unknown"), "Unknown")
-    pd.read_csv(MONITOR_FILE).assign(KEM=kem_used, Signature=sig_used).to_csv(MONITOR_FILE, index=False)
-    success_count = 0
-    for result in request_results:
-        request_number = result[0]
-        if result[5] == "Success": success_count += 1
-        writer.writerow(result[:6] + [f"{success_count}/{NUM_REQUESTS}"] + result[6:])
-update_average_report(request_results)
-logging.info(f"Test completato in {end_time - start_time:.2f} secondi. Report: {OUTPUT_FILE}")
\ No newline at end of file
+        run_done.set(); monitor_thread.join()
+        end_time, cpu_end = time.time(), process_cpu_times()
+    kem_used  = next((r["KEM"] for r in request_results if r["KEM"] != "Unknown"), "Unknown")
+    sig_used = next((r["Signature"] for r in request_results if r["Signature"] != "Unknown"), "Unknown")
+    pd.read_csv(MONITOR_FILE).assign(KEM=kem_used, Signature=sig_used, Run_ID=RUN_ID).to_csv(MONITOR_FILE, index=False)
+    # Le richieste su connessioni riutilizzate non vedono l'handshake: ereditano KEM e firma del batch.
+    for r in warmup_results + request_results:
+        if r["Status"] == "Success" and r["Handshake_Type"] == "reused": r["KEM"], r["Signature"] = kem_used, sig_used
+    for results, warmup in ((warmup_results, True), (request_results, False)):
+        success_count = 0
+        for result in results:
+            if result["Status"] == "Success": success_count += 1
+            writer.writerow({**result, "Success_Count": f"{success_count}/{len(results)}", "Warmup": warmup, "Request_ID": request_id(result["Request_Number"])})
+update_average_report(request_results, tuple(e - s for s, e in zip(cpu_start, cpu_end)))
+update_latency_report(request_results, load_mode)
+logging.info(f"Test completato in {end_time - start_time:.2f} secondi. Report: {OUTPUT_FILE}")
+notify_client_done()
\ No newline at end of file
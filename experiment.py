@@ -0,0 +1,29 @@
+"""Scenari dei test (experiment.json) e costanti condivise da run_test.py e dai benchmark; l'import non legge file né crea cartelle."""
+import itertools, json, os
+
+# Configurazioni da testare: le matrici di experiment.json (vedi "Matrice degli Esperimenti" nel readme). Senza il file
+# si usano le coppie per indice di sig_list/kem_list, con il profilo di workload di workload_list (es. "get:1m").
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+EXPERIMENT_FILE = os.path.join(BASE_DIR, "experiment.json")
+sig_list, kem_list = ["ecdsa_p256", "mldsa44", "p256_mldsa44"], ["secp256r1", "mlkem512", "p256_mlkem512"]
+workload_list = ["hello"] * len(kem_list)
+NUM_RUNS, TIMEOUT, SLEEP = 10, 300, 2
+
+def load_experiment(path):
+    """Espande le matrici abilitate dello spec in scenari {kem, sig, workload, runs, env}: coppie per indice ("zip")
+    o prodotto cartesiano ("cross") di KEM e firme, incrociate con ogni workload; env e runs della matrice prevalgono su quelli globali."""
+    with open(path, encoding="utf-8") as f: spec = json.load(f)
+    scenarios = []
+    for m in spec["matrices"]:
+        if not m.get("enabled", True): continue
+        if m.get("pairing", "zip") == "zip" and len(m["kem"]) != len(m["sig"]): raise ValueError(f"Matrice {m.get('name')}: kem e sig di lunghezza diversa.")
+        pairs = zip(m["kem"], m["sig"]) if m.get("pairing", "zip") == "zip" else itertools.product(m["kem"], m["sig"])
+        for (kem, sig), workload in itertools.product(list(pairs), m.get("workload", ["hello"])):
+            env = {k: str(v) for k, v in {**spec.get("env", {}), **m.get("env", {})}.items()}
+            scenarios.append({"kem": kem, "sig": sig, "workload": workload, "runs": m.get("runs", spec.get("runs", NUM_RUNS)), "env": env})
+    return scenarios, spec.get("runs", NUM_RUNS)
+
+def load_scenarios(path=EXPERIMENT_FILE):
+    """Scenari e repliche predefinite di `path`; senza il file, le coppie di kem_list/sig_list con workload_list."""
+    if os.path.exists(path): return load_experiment(path)
+    return [{"kem": k, "sig": s, "workload": w, "runs": NUM_RUNS, "env": {}} for k, s, w in zip(kem_list, sig_list, workload_list)], NUM_RUNS
@@ -1,22 +1,151 @@
-import os, json
-from flask import Flask, jsonify, request
+import os, sys, json, time, uuid, threading
+from collections import deque
+from flask import Flask, Response, jsonify, request
 
 app = Flask(__name__)
-ready_flag = False
+
+# Lo stesso modulo serve due ruoli (vedi serve.sh): il coordinatore, processo singolo su 5000 raggiunto da run_test.py e
+# dalla porta 80 di nginx, e il backend dei workload su 5001 dietro la porta 443, servito da gunicorn con più worker.
+# Lo stato delle run vive nella memoria del processo, quindi è valido solo nell'istanza del coordinatore.
+
+# Coordinamento delle run: ogni run ha un ID e attraversa le fasi ready -> locked -> client-done/server-done.
+# Quando client e server hanno entrambi terminato la run è completa e il coordinatore ne apre una nuova in "ready".
+EVENTS, MAX_WAIT = ("locked", "client-done", "server-done"), 25.0
+# Con lo stack persistente il coordinatore vive per tutto il piano: la cronologia SSE conserva solo gli ultimi HISTORY_SIZE
+# stati (`published` ne conta il totale, per la posizione di ogni stream) e delle run completate restano solo le più recenti,
+# fino a KEPT_RUNS run in tutto: una run eliminata risponde 404. Le run non completate non vengono mai eliminate.
+HISTORY_SIZE, KEPT_RUNS = 256, 1024
+# Profili di workload: risposte di dimensione fissa, risposte in streaming (chunked) e upload.
+MAX_PAYLOAD, CHUNK_SIZE = 64 * 1024 ** 2, 64 * 1024
+cond, runs, current, history, published = threading.Condition(), {}, None, deque(maxlen=HISTORY_SIZE), 0
+
+def publish(run):
+    """Registra lo stato della run nella cronologia letta dagli stream SSE e sveglia i long-poll in attesa."""
+    global published
+    history.append(json.dumps(run)); published += 1
+    cond.notify_all()
+
+def new_run():
+    global current
+    for run_id in [r for r, run in runs.items() if run["complete"]][:max(0, len(runs) + 1 - KEPT_RUNS)]: del runs[run_id]
+    current = uuid.uuid4().hex[:12]
+    runs[current] = {"run_id": current, "phase": "ready", "events": {"ready": time.time()}, "complete": False}
+    publish(runs[current])
+
+def get_run(run_id):
+    return runs.get(current if run_id in (None, "", "current") else run_id)
+
+def reached(run, phase):
+    return run is not None and (run["complete"] if phase == "complete" else phase in run["events"])
+
+with cond: new_run()
 
 @app.route('/')
 def home():
     return jsonify(message="Hello, HTTPS world!")
 
+# Un solo buffer casuale di MAX_PAYLOAD byte: ogni risposta ne è una fetta, liberata a fine richiesta, invece di un buffer
+# per dimensione tenuto in cache (fino a 64 MiB ciascuno, per worker). Il buffer nasce alla prima richiesta di payload, così
+# il coordinatore non lo alloca mai; serve.sh imposta PAYLOAD_PRELOAD=1 solo per il backend, che lo genera all'import
+# (con gunicorn --preload una volta nel master, condiviso dai worker).
+PAYLOAD, payload_lock = None, threading.Lock()
+
+def payload(size):
+    global PAYLOAD
+    if PAYLOAD is None:
+        with payload_lock:
+            if PAYLOAD is None: PAYLOAD = os.urandom(MAX_PAYLOAD)
+    return PAYLOAD[:size]
+
+if os.getenv("PAYLOAD_PRELOAD") == "1": payload(0)
+
+@app.route('/payload/<int:size>')
+def get_payload(size):
+    if size > MAX_PAYLOAD: return jsonify(error=f"Dimensione massima {MAX_PAYLOAD} B."), 413
+    return Response(payload(size), mimetype="application/octet-stream")
+
+@app.route('/stream/<int:size>')
+def stream_payload(size):
+    """Risposta senza Content-Length inviata a blocchi di `chunk` byte (nginx la inoltra al client in chunked encoding)."""
+    if size > MAX_PAYLOAD: return jsonify(error=f"Dimensione massima {MAX_PAYLOAD} B."), 413
+    chunk = max(1, min(request.args.get("chunk", CHUNK_SIZE, type=int), MAX_PAYLOAD))
+    def generate():
+        block, sent = payload(min(size, chunk)), 0
+        while sent < size:
+            n = min(chunk, size - sent)
+            yield block if n == len(block) else block[:n]
+            sent += n
+    return Response(generate(), mimetype="application/octet-stream")
+
+@app.route('/upload', methods=['POST'])
+def upload():
+    received = 0
+    while data := request.stream.read(CHUNK_SIZE): received += len(data)
+    return jsonify(received=received)
+
 @app.route('/ready', methods=['POST'])
 def set_ready():
-    global ready_flag
-    ready_flag = True
-    return jsonify(status="ready flag set")
+    """Blocca la run corrente per un client; 409 se è già bloccata."""
+    with cond:
+        run = runs[current]
+        if run["phase"] != "ready": return jsonify(status="busy", **run), 409
+        run["phase"] = "locked"; run["events"]["locked"] = time.time()
+        publish(run)
+        return jsonify(status="locked", **run)
 
 @app.route('/status', methods=['GET'])
 def get_status():
-    return jsonify(ready=ready_flag)
+    with cond:
+        run = runs[current]
+        return jsonify(ready=run["phase"] != "ready", **run)
+
+@app.route('/runs/<run_id>', methods=['GET'])
+def get_run_state(run_id):
+    with cond:
+        run = get_run(run_id)
+        return jsonify(run) if run else (jsonify(error=f"Run {run_id} sconosciuta."), 404)
+
+@app.route('/runs/<run_id>/<event>', methods=['POST'])
+def post_event(run_id, event):
+    """Registra client-done o server-done; con entrambi la run è completa e se ne apre una nuova."""
+    if event not in EVENTS[1:]: return jsonify(error=f"Evento {event} non valido."), 400
+    with cond:
+        run = get_run(run_id)
+        if run is None: return jsonify(error=f"Run {run_id} sconosciuta."), 404
+        run["events"].setdefault(event, time.time())
+        if not run["complete"]: run["phase"] = event
+        if all(e in run["events"] for e in EVENTS[1:]): run["complete"] = True
+        publish(run)
+        if run["complete"] and run["run_id"] == current: new_run()
+        return jsonify(run)
+
+@app.route('/wait', methods=['GET'])
+def wait_phase():
+    """Long-poll: risponde appena la run (`run_id`, default la corrente) raggiunge `phase` (o "complete"),
+    oppure allo scadere di `timeout` secondi con reached=false."""
+    phase, run_id = request.args.get("phase", "locked"), request.args.get("run_id")
+    timeout = min(MAX_WAIT, float(request.args.get("timeout", MAX_WAIT)))
+    with cond:
+        if get_run(run_id) is None: return jsonify(error=f"Run {run_id} sconosciuta."), 404
+        ok = cond.wait_for(lambda: reached(get_run(run_id), phase), timeout)
+        run = get_run(run_id)
+        if run is None: return jsonify(error=f"Run {run_id} sconosciuta."), 404
+        return jsonify(reached=ok, **run)
+
+@app.route('/events', methods=['GET'])
+def events():
+    """Server-sent events: lo stato JSON della run a ogni cambio di fase (a partire da quello corrente),
+    con un commento di keep-alive ogni 15 s."""
+    def stream():
+        with cond: seen = published - 1
+        while True:
+            with cond:
+                cond.wait_for(lambda: published > seen, 15)
+                # Uno stream rimasto indietro di oltre HISTORY_SIZE stati riparte dal più vecchio ancora conservato.
+                pending, seen = list(history)[max(0, len(history) - (published - seen)):], published
+            if not pending: yield ": keep-alive\n\n"; continue
+            for payload in pending: yield f"event: phase\ndata: {payload}\n\n"
+    return Response(stream(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 @app.route('/plan', methods=['GET'])
 def get_plan():
@@ -33,4 +162,4 @@ def get_plan():
 
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=int(sys.argv[1]) if len(sys.argv) > 1 else 5000, threaded=True)
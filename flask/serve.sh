@@ -0,0 +1,13 @@
+#!/bin/sh
+# Coordinatore delle run (stato in memoria, processo singolo) su 5000 e backend dei workload su 5001.
+# BACKEND_SERVER=gunicorn (default): pre-fork WSGI con BACKEND_WORKERS processi da BACKEND_THREADS thread; con --preload
+# il buffer dei payload viene generato una volta nel master e condiviso dai worker. Il coordinatore non lo genera:
+# PAYLOAD_PRELOAD viene esportata solo dopo il suo avvio.
+# BACKEND_SERVER=werkzeug: server di sviluppo di Flask, come nelle versioni precedenti.
+python app.py 5000 &
+export PAYLOAD_PRELOAD=1
+if [ "${BACKEND_SERVER:-gunicorn}" = "werkzeug" ]; then
+    exec python app.py 5001
+fi
+exec gunicorn app:app --bind 0.0.0.0:5001 --workers "${BACKEND_WORKERS:-4}" --worker-class gthread --threads "${BACKEND_THREADS:-4}" \
+    --backlog 2048 --log-level warning --preload
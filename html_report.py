@@ -0,0 +1,91 @@
+"""Report HTML unico e autosufficiente (nessuna risorsa esterna) con grafici interattivi, alternativo ai PNG di run_test.py.
+
+Contiene le medie per richiesta di ogni scenario (average_metrics_per_request.csv) e, se presente, la tabella di
+request_stats.csv. Nel browser si scelgono metrica e scenari: il grafico per richiesta mostra i valori al passaggio
+del mouse, quello di confronto mediana e p95 per scenario.
+
+    write_html_report(pd.read_csv(output_csv), pd.read_csv(request_stats_csv), "report/report.html")
+"""
+import html, json, math
+
+METRICS = ["Avg_Connect_Time(ms)", "Avg_Handshake_Time(ms)", "Avg_Total_Time(ms)", "Avg_Elapsed_Time(ms)", "Avg_HS_ClientHello(ms)",
+           "Avg_HS_ServerHello(ms)", "Avg_HS_Certificate(ms)", "Avg_HS_CertificateVerify(ms)", "Avg_HS_ServerFinished(ms)", "Avg_HS_ClientFinished(ms)"]
+
+PAGE = """<!DOCTYPE html>
+<html lang="it"><head><meta charset="utf-8"><title>Report TLS post-quantum</title>
+<style>
+body{font-family:system-ui,sans-serif;margin:24px;color:#222}h1{font-size:20px}h2{font-size:16px;margin-top:28px}
+.controls{display:flex;gap:16px;flex-wrap:wrap;align-items:flex-start}.controls label{display:block;font-size:13px}
+svg{border:1px solid #ddd;background:#fff}#tip{position:fixed;pointer-events:none;background:#222;color:#fff;font-size:12px;padding:6px 8px;border-radius:4px;display:none;white-space:pre}
+table{border-collapse:collapse;font-size:12px}td,th{border:1px solid #ddd;padding:3px 6px;text-align:right}th{background:#f4f4f4}td:nth-child(-n+4){text-align:left}
+</style></head><body>
+<h1>Report TLS post-quantum</h1><p>__SUMMARY__</p>
+<div class="controls"><div><b>Metrica</b><br><select id="metric"></select></div><div><b>Scenari</b><div id="scenarios"></div></div></div>
+<h2>Media per richiesta</h2><svg id="line" width="1100" height="380"></svg>
+<h2>Mediana e p95 delle medie per richiesta</h2><svg id="bars" width="1100" height="300"></svg>
+__STATS__
+<div id="tip"></div>
+<script>
+const DATA = __DATA__, METRICS = __METRICS__, NS = "http://www.w3.org/2000/svg";
+const COLORS = ["#1f77b4","#ff7f0e","#2ca02c","#d62728","#9467bd","#8c564b","#e377c2","#7f7f7f","#bcbd22","#17becf"];
+const metricSel = document.getElementById("metric"), box = document.getElementById("scenarios"), tip = document.getElementById("tip");
+METRICS.forEach(m => metricSel.add(new Option(m, m)));
+DATA.forEach((s, i) => { const l = document.createElement("label");
+  l.innerHTML = `<input type="checkbox" ${i < 3 ? "checked" : ""} data-i="${i}"> <span style="color:${COLORS[i % 10]}">■</span> ${s.name}`; box.appendChild(l); });
+const el = (tag, attrs, parent) => { const e = document.createElementNS(NS, tag); for (const k in attrs) e.setAttribute(k, attrs[k]); parent.appendChild(e); return e; };
+const quantile = (v, q) => { const a = v.filter(x => x !== null).sort((x, y) => x - y); if (!a.length) return null;
+  const p = (a.length - 1) * q, lo = Math.floor(p); return a[lo] + (a[Math.min(lo + 1, a.length - 1)] - a[lo]) * (p - lo); };
+function axes(svg, W, H, pad, ymax, xlabels) {
+  el("line", {x1: pad, y1: H - pad, x2: W - 10, y2: H - pad, stroke: "#999"}, svg); el("line", {x1: pad, y1: 10, x2: pad, y2: H - pad, stroke: "#999"}, svg);
+  for (let k = 0; k <= 4; k++) { const y = H - pad - (H - pad - 10) * k / 4;
+    el("line", {x1: pad, y1: y, x2: W - 10, y2: y, stroke: "#eee"}, svg); el("text", {x: pad - 6, y: y + 4, "font-size": 11, "text-anchor": "end"}, svg).textContent = (ymax * k / 4).toFixed(2); }
+  (xlabels || []).forEach(([x, t]) => { el("text", {x, y: H - pad + 16, "font-size": 11, "text-anchor": "middle"}, svg).textContent = t; });
+}
+function draw() {
+  const m = metricSel.value, chosen = [...box.querySelectorAll("input:checked")].map(c => +c.dataset.i);
+  const line = document.getElementById("line"), bars = document.getElementById("bars"); line.innerHTML = bars.innerHTML = "";
+  const W = 1100, H = 380, pad = 50, n = Math.max(1, ...chosen.map(i => DATA[i].metrics[m].length));
+  const ymax = Math.max(1e-9, ...chosen.flatMap(i => DATA[i].metrics[m].filter(v => v !== null))) * 1.05;
+  const X = k => pad + (W - pad - 10) * k / Math.max(1, n - 1), Y = v => H - pad - (H - pad - 10) * v / ymax;
+  axes(line, W, H, pad, ymax, [0, 0.25, 0.5, 0.75, 1].map(f => [X(Math.round(f * (n - 1))), Math.round(f * (n - 1)) + 1]));
+  chosen.forEach(i => { const pts = DATA[i].metrics[m].map((v, k) => v === null ? null : `${X(k)},${Y(v)}`).filter(p => p);
+    el("polyline", {points: pts.join(" "), fill: "none", stroke: COLORS[i % 10], "stroke-width": 1.5}, line); });
+  line.onmousemove = e => { const r = line.getBoundingClientRect(), k = Math.round((e.clientX - r.left - pad) / (W - pad - 10) * (n - 1));
+    if (k < 0 || k >= n || !chosen.length) { tip.style.display = "none"; return; }
+    tip.textContent = `Richiesta ${k + 1}\\n` + chosen.map(i => `${DATA[i].name}: ${DATA[i].metrics[m][k] ?? "-"}`).join("\\n");
+    Object.assign(tip.style, {display: "block", left: e.clientX + 14 + "px", top: e.clientY + 14 + "px"}); };
+  line.onmouseleave = () => tip.style.display = "none";
+  const q = chosen.map(i => [i, quantile(DATA[i].metrics[m], 0.5), quantile(DATA[i].metrics[m], 0.95)]);
+  const bmax = Math.max(1e-9, ...q.map(([, , p95]) => p95 || 0)) * 1.1, BH = 300, slot = (W - pad - 10) / Math.max(1, q.length);
+  axes(bars, W, BH, pad, bmax, q.map(([i], j) => [pad + slot * (j + 0.5), DATA[i].name.slice(0, 40)]));
+  q.forEach(([i, med, p95], j) => [[med, "mediana"], [p95, "p95"]].forEach(([v, label], b) => { if (v === null) return;
+    const h = (BH - pad - 10) * v / bmax, x = pad + slot * j + slot * (0.15 + 0.35 * b);
+    const r = el("rect", {x, y: BH - pad - h, width: slot * 0.33, height: h, fill: COLORS[i % 10], opacity: b ? 0.5 : 0.9}, bars);
+    r.onmousemove = e => { tip.textContent = `${DATA[i].name}\\n${label}: ${v.toFixed(3)}`; Object.assign(tip.style, {display: "block", left: e.clientX + 14 + "px", top: e.clientY + 14 + "px"}); };
+    r.onmouseleave = () => tip.style.display = "none"; }));
+}
+metricSel.onchange = box.onchange = draw; draw();
+</script></body></html>
+"""
+
+def _clean(values):
+    return [None if v is None or (isinstance(v, float) and math.isnan(v)) else round(float(v), 4) for v in values]
+
+def _name(group):
+    """"KEM + firma (workload, opzioni)" dalla colonna Scenario, o "KEM + firma" per i CSV meno recenti senza di essa."""
+    kem, sig, *extra = str(group["Scenario"].iloc[0]).split("|") if "Scenario" in group.columns else (group["KEM"].iloc[0], group["Signature"].iloc[0])
+    return f"{kem} + {sig}" + (f" ({', '.join(extra)})" if extra else "")
+
+def write_html_report(per_request, stats=None, path="report/report.html"):
+    """Scrive il report: una serie per scenario con le metriche di METRICS presenti in `per_request`."""
+    metrics = [m for m in METRICS if m in per_request.columns]
+    keys = ["Scenario"] if "Scenario" in per_request.columns else ["KEM", "Signature"]
+    data = [{"name": _name(group), "metrics": {m: _clean(group[m].tolist()) for m in metrics}}
+            for _, group in per_request.groupby(keys, sort=False)]
+    table = ""
+    if stats is not None and not stats.empty:
+        table = "<h2>Statistiche per richiesta (request_stats.csv)</h2>" + stats.to_html(index=False, na_rep="-", float_format=lambda v: f"{v:.3f}")
+    page = (PAGE.replace("__SUMMARY__", html.escape(f"{len(data)} scenari, {len(per_request)} righe di medie per richiesta."))
+                .replace("__STATS__", table).replace("__METRICS__", json.dumps(metrics)).replace("__DATA__", json.dumps(data, allow_nan=False)))
+    with open(path, "w", encoding="utf-8") as f: f.write(page)
+    print(f"✅ Report HTML salvato in {path}")
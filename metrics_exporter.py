@@ -0,0 +1,115 @@
+"""Esportatore minimale di metriche nel formato testo di Prometheus, senza dipendenze esterne.
+
+Contatori e istogrammi vivono in memoria condivisa (multiprocessing, contesto fork): i processi figli creati dopo le
+metriche, come i worker del client, aggiornano gli stessi valori esposti dal processo principale. I gauge sono calcolati
+al momento dello scrape da una funzione. Usato da client/start_client.py e nginx/start_server.py:
+
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Richieste completate", "status", ("success", "failure"))
+    registry.serve(9100)   # curl -s localhost:9100/metrics
+"""
+import bisect, math, multiprocessing as mp, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_ctx = mp.get_context("fork")
+
+def _fmt(value):
+    return "+Inf" if value == math.inf else repr(float(value))
+
+def _labels(pairs):
+    pairs = [(k, v) for k, v in pairs if k]
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}" if pairs else ""
+
+class Counter:
+    """Contatore monotono, opzionalmente con un'etichetta dai valori noti in anticipo."""
+    kind = "counter"
+
+    def __init__(self, name, help_text, label=None, values=("",)):
+        self.name, self.help, self.label = name, help_text, label
+        self.values = {v: _ctx.Value("d", 0.0) for v in values}
+
+    def inc(self, amount=1.0, value=""):
+        cell = self.values[value]
+        with cell.get_lock(): cell.value += amount
+
+    def samples(self):
+        for v, cell in self.values.items(): yield self.name, _labels([(self.label, v)]), cell.value
+
+class Gauge:
+    """Valore calcolato allo scrape da `fn`, che restituisce un numero o un dizionario {valore etichetta: numero}."""
+    def __init__(self, name, help_text, fn, label=None, kind="gauge"):
+        self.name, self.help, self.fn, self.label, self.kind = name, help_text, fn, label, kind
+
+    def samples(self):
+        value = self.fn()
+        for v, x in (value.items() if isinstance(value, dict) else [("", value)]):
+            yield self.name, _labels([(self.label, v)]), x
+
+class Histogram:
+    """Istogramma a bucket fissi: conteggi per bucket, somma e numero di osservazioni in un unico array condiviso."""
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets):
+        self.name, self.help, self.buckets = name, help_text, sorted(buckets) + [math.inf]
+        self.cells = _ctx.Array("d", len(self.buckets) + 2)
+
+    def observe(self, value):
+        idx = bisect.bisect_left(self.buckets, value)
+        with self.cells.get_lock():
+            self.cells[idx] += 1; self.cells[-2] += value; self.cells[-1] += 1
+
+    def samples(self):
+        with self.cells.get_lock(): cells = list(self.cells)
+        cumulative = 0
+        for bound, count in zip(self.buckets, cells):
+            cumulative += count
+            yield f"{self.name}_bucket", _labels([("le", _fmt(bound))]), cumulative
+        yield f"{self.name}_sum", "", cells[-2]
+        yield f"{self.name}_count", "", cells[-1]
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, label=None, values=("",)):
+        return self._add(Counter(name, help_text, label, values))
+
+    def gauge(self, name, help_text, fn, label=None, kind="gauge"):
+        return self._add(Gauge(name, help_text, fn, label, kind))
+
+    def histogram(self, name, help_text, buckets):
+        return self._add(Histogram(name, help_text, buckets))
+
+    def render(self):
+        lines = []
+        for m in self.metrics:
+            lines += [f"# HELP {m.name} {m.help}", f"# TYPE {m.name} {m.kind}"]
+            try:
+                lines += [f"{name}{labels} {_fmt(value)}" for name, labels, value in m.samples()]
+            except Exception as e:
+                lines.append(f"# errore nel calcolo di {m.name}: {e}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port):
+        """Avvia in un thread daemon un server HTTP che espone le metriche su /metrics."""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404); return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers(); self.wfile.write(body)
+
+            def log_message(self, *args): pass
+
+        server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
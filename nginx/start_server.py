@@ -1,5 +1,6 @@
-import subprocess, re, psutil, csv, time, os, pandas as pd
+import subprocess, re, psutil, csv, json, time, os, resource, urllib.request, numpy as np, pandas as pd
 from datetime import datetime
+from metrics_exporter import MetricsRegistry
 
 def get_next_filename(path, name, ext, counter=1):
     while os.path.exists(f"{path}/{name}{counter}.{ext}"): counter += 1
@@ -9,11 +10,21 @@ RESOURCE_LOG_DIR, FILTERED_LOG_DIR = "/opt/nginx/output/resource_logs", "/opt/ng
 for d in (RESOURCE_LOG_DIR, FILTERED_LOG_DIR): os.makedirs(d, exist_ok=True)
 
 RESOURCE_LOG, OUTPUT_FILE = get_next_filename(RESOURCE_LOG_DIR, "monitor_nginx", "csv"), get_next_filename(FILTERED_LOG_DIR, "monitor_nginx_filtered", "csv")
+REQUEST_LOG = get_next_filename(FILTERED_LOG_DIR, "request_nginx", "csv")
 ACCESS_LOG, AVG_METRICS_FILE = "/opt/nginx/logs/access_custom.log",f"{FILTERED_LOG_DIR}/avg_nginx_usage.csv"
-EXPECTED_REQUESTS, SAMPLING_INTERVAL = 500, 0.1
+NUM_REQUESTS, WARMUP_REQUESTS = int(os.getenv("NUM_REQUESTS", "500")), int(os.getenv("WARMUP_REQUESTS", "0"))
+SAMPLING_INTERVAL = max(0.001, float(os.getenv("SAMPLING_INTERVAL_MS", "100")) / 1000)
+METRICS_PORT, LATENCY_BUCKETS = int(os.getenv("METRICS_PORT", "0")), [0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5]
+COORDINATOR_URL, COORDINATOR_WAIT = os.getenv("COORDINATOR_URL", "http://flask_app:5000"), 60
+TCP_TABLES = ("/proc/net/tcp", "/proc/net/tcp6")
+RESOURCE_COLUMNS = ["Timestamp", "CPU (%)", "Mem (%)", "Bytes Sent", "Bytes Recv", "Conn Attive"]
+KEM_MAP = { "0x0200": "mlkem512", "0x0201": "mlkem768", "0x0202": "mlkem1024", "0x2f4b": "p256_mlkem512", "0x2f4c": "p384_mlkem768", "0x2f4d": "p521_mlkem1024" }
+# Riga del log_format "custom" di nginx.conf: [$msec] "$request" $status ... $request_time $upstream_response_time $pipe $pid KEM= SIGN= RID=
+# CONN= REQS= REUSED= ($connection, $connection_requests, $ssl_session_reused), assenti nei log meno recenti
+ACCESS_LOG_RE = re.compile(r'\[(?P<msec>[\d.]+)\] "[^"]*" (?P<status>\d+) \d+ "[^"]*" "[^"]*" \S+ (?P<request_time>[\d.]+) (?P<upstream_time>\S+) \S+ '
+                           r'(?P<pid>\d+) KEM=(?P<kem>\S*) SIGN=\S* RID=(?P<rid>\S*)(?: CONN=(?P<conn>\d+) REQS=(?P<conn_requests>\d+) REUSED=(?P<reused>\S+))?')
 
 def get_kem_sig_from_logs(log_path, cert_path):
-    kem_map = { "0x0200": "mlkem512", "0x0201": "mlkem768", "0x0202": "mlkem1024", "0x2f4b": "p256_mlkem512", "0x2f4c": "p384_mlkem768", "0x2f4d": "p521_mlkem1024" }
     sig_oid_map = { "2.16.840.1.101.3.4.3.17": "mldsa44", "2.16.840.1.101.3.4.3.18": "mldsa65", "2.16.840.1.101.3.4.3.19": "mldsa87",
         "1.3.9999.7.5": "p256_mldsa44", "1.3.9999.7.7": "p384_mldsa65", "1.3.9999.7.8": "p521_mldsa87"}
     kem, sig_alg = "Unknown", "Unknown"
@@ -21,7 +32,7 @@ def get_kem_sig_from_logs(log_path, cert_path):
         with open(log_path, "r") as f:
             for line in reversed(f.readlines()):
                 if m := re.search(r'KEM=([\w\d._:-]+)', line):
-                    kem = kem_map.get(m.group(1), m.group(1)); break
+                    kem = KEM_MAP.get(m.group(1), m.group(1)); break
     except Exception as e:
         print(f"Errore log Nginx: {e}")
 
@@ -36,36 +47,202 @@ def get_kem_sig_from_logs(log_path, cert_path):
         print(f"Errore firma certificato: {e}")
     return kem, sig_alg
 
-def append_kem_sig_to_csv(f, kem, sig):
+def append_kem_sig_to_csv(f, kem, sig, run_id=""):
+    """Aggiunge KEM, firma e ID della run (per l'archivio results_db.py) a tutte le righe, o all'ultima per avg_nginx_usage.csv."""
     try:
         df = pd.read_csv(f)
-        df["KEM"] = df.get("KEM", ""); df["Signature"] = df.get("Signature", "")
-        if "avg_nginx_usage" in f: df.loc[df.index[-1], ["KEM", "Signature"]] = kem, sig
-        else: df[["KEM", "Signature"]] = kem, sig
+        for col in ("KEM", "Signature", "Run_ID"): df[col] = df.get(col, "")
+        if "avg_nginx_usage" in f: df.loc[df.index[-1], ["KEM", "Signature", "Run_ID"]] = kem, sig, run_id
+        else: df[["KEM", "Signature", "Run_ID"]] = kem, sig, run_id
         df.to_csv(f, index=False)
     except Exception as e:
         print(f"❌ Errore su {f}: {e}")
 
+def nginx_cpu_times():
+    """CPU user/sys (s) di ogni processo nginx (master e worker), indicizzata per PID."""
+    times = {}
+    for p in psutil.process_iter(["name"]):
+        try:
+            if p.info["name"] == "nginx": times[p.pid] = tuple(p.cpu_times()[:2])
+        except (psutil.NoSuchProcess, psutil.AccessDenied): continue
+    return times
+
+def nginx_workers():
+    """Processi worker nginx (figli del master, cioè del processo nginx il cui padre non è nginx), ordinati per PID."""
+    procs = [p for p in psutil.process_iter(["name", "ppid"]) if p.info["name"] == "nginx"]
+    pids = {p.pid for p in procs}
+    masters = {p.pid for p in procs if p.info["ppid"] not in pids}
+    return sorted((p for p in procs if p.info["ppid"] in masters), key=lambda p: p.pid)
+
+class WorkerSampler:
+    """CPU user+sys (s), RSS, core corrente e context switch volontari/involontari di ogni worker nginx.
+    Ogni worker occupa un indice fisso (W0, W1, ...); un worker riavviato dal master prende l'indice di quello terminato."""
+    FIELDS = ["CPU(s)", "RSS(MB)", "Core", "Ctx_Vol", "Ctx_Invol"]
+
+    def __init__(self):
+        self.workers = nginx_workers()
+        print(f"Worker nginx individuati: {', '.join(str(p.pid) for p in self.workers) or 'nessuno'}")
+        self.columns = [f"W{i}_{field}" for i in range(len(self.workers)) for field in self.FIELDS]
+
+    def sample(self):
+        values, stale = [], False
+        for p in self.workers:
+            try:
+                with p.oneshot():
+                    cpu, ctx = p.cpu_times(), p.num_ctx_switches()
+                    values += [cpu.user + cpu.system, p.memory_info().rss / 2**20, p.cpu_num(), ctx.voluntary, ctx.involuntary]
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                values += [np.nan] * len(self.FIELDS); stale = True
+        if stale:
+            tracked = {p.pid for p in self.workers}
+            fresh = [p for p in nginx_workers() if p.pid not in tracked]
+            self.workers = [fresh.pop(0) if fresh and not p.is_running() else p for p in self.workers]
+        return values
+
+def nginx_cpu_delta(start, end):
+    """Somma dei delta di CPU user/sys tra due campionamenti; i processi nati nel frattempo partono da zero."""
+    user = sum(u - start.get(pid, (0.0, 0.0))[0] for pid, (u, _) in end.items())
+    sys_ = sum(s - start.get(pid, (0.0, 0.0))[1] for pid, (_, s) in end.items())
+    return max(0.0, user), max(0.0, sys_)
+
+class LogFollower:
+    """Segue il log in modo incrementale: a ogni lettura conta solo le righe aggiunte dall'offset precedente.
+    Se il file viene sostituito o troncato riparte dall'inizio del nuovo file. Con `on_line` ogni nuova riga completa
+    viene passata alla funzione."""
+    def __init__(self, path, on_line=None):
+        self.path, self.on_line, self.file, self.inode, self.offset, self.lines, self.partial = path, on_line, None, None, 0, 0, b""
+
+    def poll(self):
+        try: st = os.stat(self.path)
+        except FileNotFoundError: return self.lines
+        if st.st_ino != self.inode or st.st_size < self.offset:
+            if self.file: self.file.close()
+            self.file, self.inode, self.offset, self.lines, self.partial = open(self.path, "rb"), st.st_ino, 0, 0, b""
+        if st.st_size > self.offset:
+            data = self.file.read(st.st_size - self.offset)
+            self.offset += len(data); self.lines += data.count(b"\n")
+            if self.on_line:
+                *complete, self.partial = (self.partial + data).split(b"\n")
+                for line in complete: self.on_line(line)
+        return self.lines
+
+    def close(self):
+        if self.file: self.file.close()
+
+def nginx_usage():
+    """CPU user/sys (s) e RSS (B) complessivi dei processi nginx, per le metriche live."""
+    user = sys_ = rss = 0
+    for p in psutil.process_iter(["name"]):
+        try:
+            if p.info["name"] != "nginx": continue
+            with p.oneshot():
+                cpu = p.cpu_times(); user += cpu.user; sys_ += cpu.system; rss += p.memory_info().rss
+        except (psutil.NoSuchProcess, psutil.AccessDenied): continue
+    return user, sys_, rss
+
+# Metriche live (formato Prometheus) esposte su METRICS_PORT se > 0. Con CLIENT_MODE=full ogni richiesta corrisponde a un handshake.
+METRICS = MetricsRegistry()
+M_REQUESTS = METRICS.counter("nginx_requests_total", "Richieste registrate nel log di accesso")
+M_REQUEST_SECONDS = METRICS.histogram("nginx_request_seconds", "Durata lato server delle richieste ($request_time)", LATENCY_BUCKETS)
+METRICS.gauge("nginx_cpu_seconds_total", "CPU dei processi nginx (master e worker)", lambda: dict(zip(("user", "system"), nginx_usage()[:2])), "mode", "counter")
+METRICS.gauge("nginx_resident_memory_bytes", "RSS complessiva dei processi nginx", lambda: nginx_usage()[2])
+METRICS.gauge("nginx_host_network_bytes_total", "Byte di rete del container", lambda: dict(zip(("sent", "received"), psutil.net_io_counters()[:2])), "direction", "counter")
+METRICS.gauge("nginx_tcp_established_connections", "Connessioni TCP stabilite", lambda: established_connections())
+
+def tls_entry(line):
+    """Riga del log di accesso di una richiesta TLS del client, o None: le chiamate HTTP al coordinatore non hanno KEM."""
+    m = ACCESS_LOG_RE.search(line)
+    return m if m and m["kem"] not in ("", "-") else None
+
+def is_warmup(m, position):
+    """Warm-up dal numero di richiesta del Request_ID "<RUN_ID>-<n>" (il client numera il warm-up da 1 a WARMUP_REQUESTS),
+    o dalla posizione tra le richieste TLS del log se l'ID manca."""
+    number = m["rid"].rsplit("-", 1)[-1]
+    return (int(number) if number.isdigit() else position) <= WARMUP_REQUESTS
+
+def read_tls_entries():
+    """(riga, warm-up) delle richieste TLS del log di accesso, nell'ordine del log."""
+    with open(ACCESS_LOG, encoding="utf-8") as f:
+        entries = [m for line in f if (m := tls_entry(line))]
+    return [(m, is_warmup(m, i)) for i, m in enumerate(entries, 1)]
+
+class RequestCounter:
+    """Conta le richieste TLS di warm-up e misurate man mano che LogFollower legge il log, e aggiorna le metriche live."""
+    def __init__(self): self.total, self.warmup = 0, 0
+
+    def __call__(self, line):
+        if not (m := tls_entry(line.decode("utf-8", "replace"))): return
+        self.total += 1; self.warmup += is_warmup(m, self.total)
+        if METRICS_PORT > 0: M_REQUESTS.inc(); M_REQUEST_SECONDS.observe(float(m["request_time"]))
+
+    @property
+    def measured(self): return self.total - self.warmup
+
+def established_connections():
+    """Connessioni TCP in stato ESTABLISHED (01) lette da /proc/net/tcp e tcp6, senza enumerare i processi come psutil.net_connections."""
+    count = 0
+    try:
+        for path in TCP_TABLES:
+            if not os.path.exists(path): continue
+            with open(path, "rb") as f:
+                next(f, None)
+                count += sum(1 for line in f if line.split(None, 4)[3] == b"01")
+    except OSError:
+        return sum(1 for c in psutil.net_connections("inet") if c.status == "ESTABLISHED")
+    return count
+
+class SampleBuffer:
+    """Campioni numerici in un array preallocato (raddoppiato se pieno), scritti su CSV solo a fine monitoraggio."""
+    def __init__(self, columns, capacity):
+        self.columns, self.data, self.size = columns, np.empty((capacity, len(columns))), 0
+
+    def append(self, *values):
+        if self.size == len(self.data): self.data = np.concatenate([self.data, np.empty_like(self.data)])
+        self.data[self.size] = values; self.size += 1
+
+    def to_csv(self, path):
+        df = pd.DataFrame(self.data[:self.size], columns=self.columns)
+        df["Timestamp"] = [datetime.fromtimestamp(t).strftime("%d/%b/%Y:%H:%M:%S.%f")[:-3] for t in df["Timestamp"]]
+        for col in ("Bytes Sent", "Bytes Recv", "Conn Attive"): df[col] = df[col].astype(np.int64)
+        for col in self.columns[len(RESOURCE_COLUMNS):]:
+            df[col] = df[col].round(3) if col.endswith(("(s)", "(MB)")) else df[col].round().astype("Int64")
+        df["Sampling_Interval(ms)"] = f"{SAMPLING_INTERVAL * 1000:g}"  # letto da run_test.py per il passo dei grafici
+        df.to_csv(path, index=False)
+
 def monitor_resources():
-    print("Inizio monitoraggio delle risorse...")
-    with open(RESOURCE_LOG, "w", newline="", encoding="utf-8") as f:
-        w = csv.writer(f)
-        psutil.cpu_percent(None)
-        w.writerow(["Timestamp", "CPU (%)", "Mem (%)", "Bytes Sent", "Bytes Recv", "Conn Attive"])
+    """Campiona le risorse ogni SAMPLING_INTERVAL fino al completamento del batch e restituisce la CPU (user, sys)
+    consumata da nginx e quella del campionatore stesso."""
+    print(f"Inizio monitoraggio delle risorse (intervallo {SAMPLING_INTERVAL * 1000:g} ms)...")
+    cpu_start = nginx_cpu_times() if WARMUP_REQUESTS == 0 else None
+    counter, workers = RequestCounter(), WorkerSampler()
+    follower = LogFollower(ACCESS_LOG, counter)
+    samples = SampleBuffer(RESOURCE_COLUMNS + workers.columns, max(1024, int(60 / SAMPLING_INTERVAL)))
+    own_start, next_tick = resource.getrusage(resource.RUSAGE_SELF), time.perf_counter()
+    psutil.cpu_percent(None)
+    try:
         while True:
-            if os.path.exists(ACCESS_LOG) and sum(1 for _ in open(ACCESS_LOG, encoding="utf-8")) >= EXPECTED_REQUESTS:
+            follower.poll()
+            if cpu_start is None and counter.warmup >= WARMUP_REQUESTS: cpu_start = nginx_cpu_times()
+            if counter.measured >= NUM_REQUESTS:
                 break
-            w.writerow([datetime.now().strftime("%d/%b/%Y:%H:%M:%S.%f")[:-3], psutil.cpu_percent(), psutil.virtual_memory().percent,
-                        *psutil.net_io_counters()[:2], sum(1 for c in psutil.net_connections("inet") if c.status == "ESTABLISHED")])
-            f.flush()
-            time.sleep(SAMPLING_INTERVAL)
-    print("Monitoraggio terminato.")
+            samples.append(time.time(), psutil.cpu_percent(), psutil.virtual_memory().percent, *psutil.net_io_counters()[:2], established_connections(), *workers.sample())
+            # Scadenze assolute: il tempo speso a campionare non allunga l'intervallo; se in ritardo si riallinea senza raffiche.
+            next_tick += SAMPLING_INTERVAL
+            if (delay := next_tick - time.perf_counter()) > 0: time.sleep(delay)
+            else: next_tick = time.perf_counter()
+    finally:
+        follower.close()
+        samples.to_csv(RESOURCE_LOG)
+    own_end = resource.getrusage(resource.RUSAGE_SELF)
+    sampler_cpu = own_end.ru_utime - own_start.ru_utime + own_end.ru_stime - own_start.ru_stime
+    print(f"Monitoraggio terminato: {samples.size} campioni, CPU del campionatore {sampler_cpu:.3f} s.")
+    return nginx_cpu_delta(cpu_start or {}, nginx_cpu_times()), sampler_cpu
 
 def analyze_logs():
     if not os.path.exists(ACCESS_LOG): return None, None
     try:
-        with open(ACCESS_LOG, encoding="utf-8") as f:
-            timestamps = [datetime.fromtimestamp(float(l.split()[3][1:-1])) for l in f if len(l.split()) >= 4]
+        # Le richieste di warm-up del client restano fuori dall'intervallo di test.
+        timestamps = [datetime.fromtimestamp(float(m["msec"])) for m, warmup in read_tls_entries() if not warmup]
         return (min(timestamps), max(timestamps)) if timestamps else (None, None)
     except: return None, None
 
@@ -74,32 +251,90 @@ def analyze_performance():
     if not s or not e: return print("ERRORE: Intervallo di test non disponibile.")
     try:
         with open(RESOURCE_LOG, encoding="utf-8") as f:
-            data = [r for r in csv.DictReader(f) if s <= datetime.strptime(r["Timestamp"], "%d/%b/%Y:%H:%M:%S.%f") <= e]
+            reader = csv.DictReader(f)
+            data = [r for r in reader if s <= datetime.strptime(r["Timestamp"], "%d/%b/%Y:%H:%M:%S.%f") <= e]
         if not data: return print("ERRORE: Nessun dato nel periodo di test.")
         with open(OUTPUT_FILE, "w", newline="", encoding="utf-8") as f:
             w = csv.writer(f)
-            w.writerow(["Timestamp", "CPU (%)", "Mem (%)", "Bytes Sent", "Bytes Recv", "Conn Attive"])
-            w.writerows([[r[c] for c in ["Timestamp", "CPU (%)", "Mem (%)", "Bytes Sent", "Bytes Recv", "Conn Attive"]] for r in data])
+            w.writerow(reader.fieldnames)
+            w.writerows([[r[c] for c in reader.fieldnames] for r in data])
         print(f"Salvati {len(data)} campionamenti in {OUTPUT_FILE}.")
     except Exception as e:
         print(f"ERRORE nel salvataggio dati: {e}")
 
-def generate_avg_resource_usage():
+def export_request_log():
+    """Esporta una riga per richiesta del log di accesso (ID richiesta del client, $request_time, tempo upstream e PID del worker)
+    in request_nginx*.csv, per il join con i CSV del client eseguito da run_test.py."""
+    ms = lambda v: round(float(v) * 1000, 3) if v not in ("-", "") else None
+    try:
+        entries = read_tls_entries()
+        with open(REQUEST_LOG, "w", newline="", encoding="utf-8") as out:
+            w = csv.writer(out)
+            w.writerow(["Request_ID", "Timestamp", "Status", "Server_Request_Time(ms)", "Upstream_Time(ms)", "Worker_PID", "KEM", "Warmup", "Server_Handshake_Type"])
+            for m, warmup in entries:
+                w.writerow([m["rid"] if m["rid"] != "-" else "", m["msec"], m["status"], ms(m["request_time"]),
+                            ms(m["upstream_time"].split(",")[-1].strip()), m["pid"], KEM_MAP.get(m["kem"], m["kem"]), warmup, handshake_type(m)])
+        print(f"Log per richiesta salvato in {REQUEST_LOG}.")
+    except OSError as e:
+        print(f"ERRORE nell'esportazione del log per richiesta: {e}")
+
+def handshake_type(m):
+    """Tipo di handshake della richiesta, come la colonna Handshake_Type del client: "reused" se non è la prima richiesta
+    della connessione ($connection_requests > 1), "resumed" se la sessione TLS è stata ripresa ($ssl_session_reused = r),
+    altrimenti "full". Le righe dei log meno recenti, senza questi campi, contano come handshake completi."""
+    if m["conn_requests"] and int(m["conn_requests"]) > 1: return "reused"
+    return "resumed" if m["reused"] == "r" else "full"
+
+def count_handshakes():
+    """Handshake (completi, ripresi) delle richieste TLS misurate (warm-up escluso): le richieste su una connessione già
+    aperta non eseguono handshake e non vengono contate, come sul client."""
+    try: types = [handshake_type(m) for m, warmup in read_tls_entries() if not warmup]
+    except OSError: return 0, 0
+    return types.count("full"), types.count("resumed")
+
+def generate_avg_resource_usage(nginx_cpu=(0.0, 0.0), sampler_cpu=0.0):
     try:
         with open(OUTPUT_FILE, encoding="utf-8") as f:
             data = list(csv.DictReader(f))
         if not data: return print("ERRORE: Nessun dato disponibile per calcolare la media.")
         avg_cpu = sum(float(r["CPU (%)"]) for r in data) / len(data)
         avg_ram = sum(float(r["Mem (%)"]) for r in data) / len(data)
-        file_exists = os.path.isfile(AVG_METRICS_FILE)
-        with open(AVG_METRICS_FILE, "a", newline="", encoding="utf-8") as f:
-            w = csv.writer(f)
-            if not file_exists: w.writerow(["Timestamp", "CPU Media (%)", "Mem Media (%)"])
-            w.writerow([datetime.now().strftime("%d/%b/%Y:%H:%M:%S"), f"{avg_cpu:.2f}", f"{avg_ram:.2f}"])
-        print(f"Medie CPU e RAM aggiornate in {AVG_METRICS_FILE}.")
+        full, resumed = count_handshakes()
+        # Come Client_CPU_us_per_Handshake: CPU divisa per gli handshake (completi e ripresi), vuota se non ce ne sono stati
+        cpu_us = f"{(nginx_cpu[0] + nginx_cpu[1]) * 1e6 / (full + resumed):.2f}" if full + resumed else ""
+        row = {"Timestamp": datetime.now().strftime("%d/%b/%Y:%H:%M:%S"), "CPU Media (%)": f"{avg_cpu:.2f}", "Mem Media (%)": f"{avg_ram:.2f}",
+               "Nginx_CPU_User(s)": f"{nginx_cpu[0]:.4f}", "Nginx_CPU_Sys(s)": f"{nginx_cpu[1]:.4f}", "Nginx_CPU_us_per_Handshake": cpu_us,
+               "Nginx_Full_Handshakes": full, "Nginx_Resumed_Handshakes": resumed,
+               "Sampler_CPU(s)": f"{sampler_cpu:.4f}", "Sampling_Interval(ms)": f"{SAMPLING_INTERVAL * 1000:g}"}
+        df = pd.read_csv(AVG_METRICS_FILE) if os.path.isfile(AVG_METRICS_FILE) else pd.DataFrame(columns=list(row))
+        pd.concat([df, pd.DataFrame([row])], ignore_index=True).to_csv(AVG_METRICS_FILE, index=False)
+        print(f"Medie CPU e RAM aggiornate in {AVG_METRICS_FILE} ({cpu_us or '-'} µs CPU nginx per handshake su {full + resumed} handshake).")
     except Exception as e:
         print(f"ERRORE nel calcolo delle medie: {e}")
     
+def coordinator_request(path, method="GET", timeout=35):
+    with urllib.request.urlopen(urllib.request.Request(f"{COORDINATOR_URL}{path}", method=method), timeout=timeout) as r:
+        return json.load(r)
+
+def wait_for_run():
+    """Attende con long-poll che un client blocchi la run corrente e ne restituisce l'ID. Dopo COORDINATOR_WAIT secondi
+    (o se il coordinatore non risponde) il monitoraggio parte comunque e la run resta "current"."""
+    deadline = time.time() + COORDINATOR_WAIT
+    while (remaining := deadline - time.time()) > 0:
+        try:
+            state = coordinator_request(f"/wait?phase=locked&timeout={min(25, remaining):.1f}")
+            if state.get("reached"):
+                print(f"Run {state['run_id']} bloccata dal client.")
+                return state["run_id"]
+        except (OSError, ValueError):
+            time.sleep(0.5)
+    print("Coordinatore non disponibile o nessun client: avvio il monitoraggio senza ID di run.")
+    return "current"
+
+def notify_server_done(run_id):
+    try: coordinator_request(f"/runs/{run_id}/server-done", "POST", timeout=5)
+    except (OSError, ValueError) as e: print(f"Impossibile notificare il coordinatore: {e}")
+
 def log_system_info():
     cpu_info = psutil.cpu_freq()
     ram_info = psutil.virtual_memory()
@@ -111,11 +346,16 @@ def log_system_info():
 
 if __name__ == "__main__":
     try:
-        monitor_resources()
+        if METRICS_PORT > 0:
+            METRICS.serve(METRICS_PORT); print(f"Metriche live su http://0.0.0.0:{METRICS_PORT}/metrics")
+        run_id = wait_for_run()
+        nginx_cpu, sampler_cpu = monitor_resources()
         analyze_performance()
-        generate_avg_resource_usage()
+        export_request_log()
+        generate_avg_resource_usage(nginx_cpu, sampler_cpu)
         kem, sig = get_kem_sig_from_logs(ACCESS_LOG, "/etc/nginx/certs/qsc-ca-chain.crt")
-        for f in [RESOURCE_LOG, OUTPUT_FILE, AVG_METRICS_FILE]: append_kem_sig_to_csv(f, kem, sig)
+        for f in [RESOURCE_LOG, OUTPUT_FILE, AVG_METRICS_FILE]: append_kem_sig_to_csv(f, kem, sig, run_id)
         log_system_info()
+        notify_server_done(run_id)
     except Exception as e:
         print(f"ERRORE GENERALE: {e}")
\ No newline at end of file
@@ -0,0 +1,259 @@
+"""Archivio SQLite dei risultati (report/results.db), alternativo all'unione posizionale dei CSV di mergecsv.py.
+
+Importa in modo incrementale (solo i file nuovi o modificati, per mtime e dimensione):
+  - requests:       log per richiesta del client (request_client*.csv);
+  - client_monitor: campionamenti del client (system_client*.csv);
+  - server_monitor: campionamenti di nginx nell'intervallo di test (monitor_nginx_filtered*.csv);
+  - client_avg:     medie per run del client (average_metrics.csv), con il riepilogo del pcap (colonne "(Wireshark)",
+                    esposte anche dalla vista pcap_summary);
+  - nginx_avg:      medie per run di nginx (avg_nginx_usage.csv).
+Ogni riga porta Run_ID, KEM e Signature; la tabella runs associa a ogni run la replica (dal registro di run_test.py
+o, in sua assenza, dall'ordine dei file per KEM/firma). La vista merged unisce le medie di client e nginx sul Run_ID.
+
+    python results_db.py ingest
+    python results_db.py merged [--output merged_average_metrics.csv]
+    python results_db.py scenarios [--metric "Avg_Handshake_Time(ms)" ...]
+    python results_db.py sql "SELECT KEM, Signature, COUNT(*) FROM requests WHERE Warmup = 0 GROUP BY 1, 2"
+"""
+import argparse, json, os, re, sqlite3, statistics, sys, time
+from collections import defaultdict
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REPORT_DIR = os.path.join(BASE_DIR, "report")
+DB_FILE, LEDGER_FILE = os.path.join(REPORT_DIR, "results.db"), os.path.join(REPORT_DIR, "ledger.jsonl")
+# Serie numerate (una per run): tabella -> (cartella in report/, prefisso dei file). L'ordine conta: requests per primo.
+SERIES = {"requests": ("request_logs", "request_client"), "client_monitor": ("system_logs", "system_client"),
+          "server_monitor": ("filtered_logs", "monitor_nginx_filtered")}
+# CSV cumulativi (una riga per run): tabella -> percorso in report/.
+AVERAGES = {"client_avg": "request_logs/avg/average_metrics.csv", "nginx_avg": "filtered_logs/avg_nginx_usage.csv"}
+KEY_COLUMNS = ["Source", "Run_ID", "KEM", "Signature"]
+SCENARIO_METRICS = ["Avg_Handshake_Time(ms)", "Avg_Total_Time(ms)", "Client_Avg_CPU_Usage(%)", "Nginx_Avg_CPU_usage(%)", "Nginx_Avg_RAM_usage(%)"]
+FILE_INDEX = re.compile(r"(\d+)\.csv$")
+
+class Stdev:
+    """Deviazione standard campionaria come funzione di aggregazione SQL (SQLite non ne ha una)."""
+    def __init__(self): self.values = []
+    def step(self, value):
+        if value is not None: self.values.append(float(value))
+    def finalize(self): return statistics.stdev(self.values) if len(self.values) > 1 else None
+
+def quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+def connect(path=DB_FILE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.create_aggregate("stdev", 1, Stdev)
+    conn.executescript("""
+        PRAGMA journal_mode = WAL;
+        CREATE TABLE IF NOT EXISTS files (Path TEXT PRIMARY KEY, Tbl TEXT, Mtime INTEGER, Size INTEGER);
+        CREATE TABLE IF NOT EXISTS runs (Run_ID TEXT PRIMARY KEY, KEM TEXT, Signature TEXT, Replica INTEGER, File_Index INTEGER,
+                                         Scenario TEXT, Source TEXT);
+        CREATE INDEX IF NOT EXISTS runs_scenario ON runs (KEM, Signature, Replica);
+        CREATE INDEX IF NOT EXISTS runs_key ON runs (Scenario, Replica);""")
+    for table in [*SERIES, *AVERAGES]:
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(f'{c} TEXT' for c in KEY_COLUMNS)})")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_run ON {table} (Run_ID)")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_scenario ON {table} (KEM, Signature)")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_source ON {table} (Source)")
+    return conn
+
+def table_columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+def insert_frame(conn, table, df):
+    """Inserisce `df` in `table`, aggiungendo le colonne che mancano (i CSV guadagnano colonne nel tempo).
+    I nomi delle colonne sono quelli dei CSV; SQLite li confronta senza distinguere maiuscole e minuscole."""
+    existing = {c.lower() for c in table_columns(conn, table)}
+    for col in df.columns:
+        if col.lower() not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {quote(col)}"); existing.add(col.lower())
+    rows = df.astype(object).where(df.notna(), None).values.tolist()
+    conn.executemany(f"INSERT INTO {table} ({', '.join(map(quote, df.columns))}) VALUES ({', '.join('?' * len(df.columns))})", rows)
+
+def valid_run_id(value):
+    return isinstance(value, str) and value not in ("", "current", "logs")
+
+def request_run_id(df):
+    """ID della run dai Request_ID "<RUN_ID>-<numero richiesta>" del client (assenti nei report meno recenti)."""
+    if "Request_ID" not in df.columns: return None
+    ids = df["Request_ID"].dropna().astype(str).str.rsplit("-", n=1).str[0]
+    return ids.mode()[0] if not ids.empty else None
+
+def kem_sig(df):
+    """KEM e firma più frequenti tra le richieste riuscite (o tra tutte le righe per i monitor)."""
+    if "Status" in df.columns: df = df[df["Status"] == "Success"]
+    pick = lambda col: df[col].dropna().astype(str).str.strip().mode()[0] if col in df.columns and df[col].notna().any() else "Unknown"
+    return pick("KEM"), pick("Signature")
+
+def default_scenario(kem, sig, df):
+    """Chiave di scenario di una run assente dal registro, dalle colonne del CSV del client: KEM|firma|workload|CLIENT_MODE=<modalità>,
+    con le etichette Workload di un mix unite da "+". Le run registrate usano la chiave del registro (KEM, firma, workload ed env)."""
+    workloads = sorted(df["Workload"].dropna().astype(str).unique()) if "Workload" in df.columns else []
+    modes = df["Client_Mode"].dropna().astype(str).mode() if "Client_Mode" in df.columns else pd.Series(dtype=str)
+    return f"{kem}|{sig}|{'+'.join(workloads) or 'hello'}|CLIENT_MODE={modes.iloc[0] if not modes.empty else 'full'}"
+
+def load_replicas():
+    """{file relativo a BASE_DIR: (replica, scenario)} dal registro delle repliche di run_test.py."""
+    replicas = {}
+    if os.path.exists(LEDGER_FILE):
+        with open(LEDGER_FILE, encoding="utf-8") as f:
+            for line in f:
+                try: entry = json.loads(line)
+                except ValueError: continue
+                for path in entry["files"]: replicas[os.path.normpath(path)] = (entry["replica"], entry["scenario"])
+    return replicas
+
+def scan(folder, prefix):
+    path = os.path.join(REPORT_DIR, folder)
+    if not os.path.isdir(path): return []
+    return sorted((os.path.join(path, f) for f in os.listdir(path) if f.startswith(prefix) and FILE_INDEX.search(f)),
+                  key=lambda p: int(FILE_INDEX.search(p)[1]))
+
+def ingest_series(conn, table, path, run_by_index):
+    df = pd.read_csv(path)
+    index, kem, sig = int(FILE_INDEX.search(path)[1]), *kem_sig(df)
+    if table == "requests":
+        run_id = request_run_id(df) or f"#{index}"
+        conn.execute("DELETE FROM runs WHERE Source = ?", (path,))
+        conn.execute("INSERT OR REPLACE INTO runs (Run_ID, KEM, Signature, File_Index, Scenario, Source) VALUES (?, ?, ?, ?, ?, ?)",
+                     (run_id, kem, sig, index, default_scenario(kem, sig, df), path))
+        run_by_index[index] = run_id
+    else:
+        own = df["Run_ID"].dropna().astype(str) if "Run_ID" in df.columns else pd.Series(dtype=str)
+        run_id = own.iloc[0] if not own.empty and valid_run_id(own.iloc[0]) else run_by_index.get(index, f"#{index}")
+    insert_frame(conn, table, df.drop(columns=[c for c in df.columns if c.lower() in ("source", "run_id")])
+                 .assign(Source=path, Run_ID=run_id, KEM=kem, Signature=sig))
+
+def ingest_averages(conn, table, path, runs_by_scenario):
+    """Una riga per run. Le righe senza Run_ID (report meno recenti o run senza coordinatore) vengono associate, per
+    KEM/firma, alla k-esima run nell'ordine dei file del client: unione per posizione, ma all'interno dello scenario."""
+    df = pd.read_csv(path)
+    for col in ("KEM", "Signature"):
+        df[col] = df[col].astype(str).str.strip() if col in df.columns else "Unknown"
+    seen, run_ids = defaultdict(int), []
+    for i, (run_id, kem, sig) in enumerate(zip(df["Run_ID"] if "Run_ID" in df.columns else [None] * len(df), df["KEM"], df["Signature"])):
+        ordinal, seen[(kem, sig)] = seen[(kem, sig)], seen[(kem, sig)] + 1
+        if valid_run_id(run_id): run_ids.append(run_id)
+        else:
+            runs = runs_by_scenario.get((kem, sig), [])
+            run_ids.append(runs[ordinal] if ordinal < len(runs) else f"{table}#{i + 1}")
+    insert_frame(conn, table, df.drop(columns=[c for c in df.columns if c.lower() in ("source", "run_id")]).assign(Source=path, Run_ID=run_ids))
+
+def assign_replicas(conn):
+    """Replica e scenario di ogni run: dal registro se il file del client vi compare, altrimenti lo scenario ricavato dal CSV
+    all'importazione (default_scenario) e l'ordine del file all'interno dello scenario."""
+    ledger, counters, updates = load_replicas(), defaultdict(int), []
+    for run_id, scenario, source in conn.execute("SELECT Run_ID, Scenario, Source FROM runs ORDER BY File_Index").fetchall():
+        counters[scenario] += 1
+        replica, scenario = ledger.get(os.path.normpath(os.path.relpath(source, BASE_DIR)), (counters[scenario], scenario))
+        updates.append((replica, scenario, run_id))
+    conn.executemany("UPDATE runs SET Replica = ?, Scenario = ? WHERE Run_ID = ?", updates)
+
+def create_views(conn):
+    """merged: medie del client con CPU e RAM medie di nginx subito dopo quelle del client (come mergecsv.py), unite sul
+    Run_ID; pcap_summary: le colonne del riepilogo pcap del client."""
+    client, nginx = table_columns(conn, "client_avg"), {c.lower() for c in table_columns(conn, "nginx_avg")}
+    names = [c for c in client if c != "Source"]
+    select = [f"c.{quote(c)}" for c in names]
+    at = names.index("Client_Avg_RAM_Usage(%)") + 1 if "Client_Avg_RAM_Usage(%)" in names else len(select)
+    select[at:at] = [f"n.{quote(src)} AS {quote(dst)}" for src, dst in [("CPU Media (%)", "Nginx_Avg_CPU_usage(%)"), ("Mem Media (%)", "Nginx_Avg_RAM_usage(%)")] if src.lower() in nginx]
+    conn.executescript(f"""
+        DROP VIEW IF EXISTS merged; DROP VIEW IF EXISTS pcap_summary;
+        CREATE VIEW merged AS SELECT {', '.join(select)}, r.Scenario AS Scenario, r.Replica AS Replica FROM client_avg c
+            LEFT JOIN nginx_avg n ON n.Run_ID = c.Run_ID LEFT JOIN runs r ON r.Run_ID = c.Run_ID ORDER BY c.rowid;
+        CREATE VIEW pcap_summary AS SELECT {', '.join(['Run_ID', 'KEM', 'Signature'] + [quote(c) for c in client if c.endswith('(Wireshark)')])} FROM client_avg;""")
+
+def ingest(db=DB_FILE):
+    """Aggiorna il database con i file di report/ nuovi, modificati o rimossi; restituisce il numero di file importati."""
+    start, conn = time.perf_counter(), connect(db)
+    known = {p: (t, m, s) for p, t, m, s in conn.execute("SELECT Path, Tbl, Mtime, Size FROM files")}
+    run_by_index = {int(FILE_INDEX.search(src)[1]): run_id for run_id, src in conn.execute("SELECT Run_ID, Source FROM runs")}
+    series = [(table, p) for table, (folder, prefix) in SERIES.items() for p in scan(folder, prefix)]
+    averages = [(table, os.path.join(REPORT_DIR, rel)) for table, rel in AVERAGES.items() if os.path.exists(os.path.join(REPORT_DIR, rel))]
+    removed, imported = set(known) - {p for _, p in series + averages}, 0
+
+    def load(table, path, loader, *args):
+        nonlocal imported
+        st = os.stat(path)
+        conn.execute(f"DELETE FROM {table} WHERE Source = ?", (path,))
+        try: loader(conn, table, path, *args)
+        except Exception as e:
+            conn.execute(f"DELETE FROM {table} WHERE Source = ?", (path,))
+            return print(f"⚠️ Errore nell'importazione di {path}: {e}")
+        conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)", (path, table, st.st_mtime_ns, st.st_size))
+        imported += 1
+
+    unchanged = lambda table, path: known.get(path) == (table, os.stat(path).st_mtime_ns, os.stat(path).st_size)
+    with conn:
+        for path in removed:
+            for table in (known[path][0], "runs"): conn.execute(f"DELETE FROM {table} WHERE Source = ?", (path,))
+            conn.execute("DELETE FROM files WHERE Path = ?", (path,))
+        changed = [(t, p) for t, p in series if not unchanged(t, p)]
+        for table, path in changed: load(table, path, ingest_series, run_by_index)
+        assign_replicas(conn)
+        # Le medie senza Run_ID dipendono dall'ordine delle run: si reimportano anche quando cambiano i file del client.
+        runs_changed = any(known[p][0] == "requests" for p in removed) or any(t == "requests" for t, _ in changed)
+        runs_by_scenario = defaultdict(list)
+        for run_id, kem, sig in conn.execute("SELECT Run_ID, KEM, Signature FROM runs ORDER BY File_Index"): runs_by_scenario[(kem, sig)].append(run_id)
+        for table, path in averages:
+            if runs_changed or not unchanged(table, path): load(table, path, ingest_averages, runs_by_scenario)
+        create_views(conn)
+    conn.close()
+    print(f"🗄️ {imported} file importati in {db} in {time.perf_counter() - start:.2f}s.")
+    return imported
+
+def query(sql, params=(), db=DB_FILE):
+    conn = connect(db)
+    try: return pd.read_sql_query(sql, conn, params=params)
+    finally: conn.close()
+
+def merged_table(db=DB_FILE):
+    """Medie del client e di nginx per run, con le colonne di merged_average_metrics.csv più Run_ID, Scenario e Replica."""
+    return query("SELECT * FROM merged", db=db)
+
+def scenario_table(metrics=SCENARIO_METRICS, db=DB_FILE):
+    """Per scenario (KEM, firma, workload e modalità del client): numero di run e media/deviazione standard tra le run di ogni metrica."""
+    conn = connect(db)
+    try:
+        available = {c.lower(): c for c in pd.read_sql_query("SELECT * FROM merged LIMIT 0", conn).columns}
+        metrics = [available[m.lower()] for m in metrics if m.lower() in available]
+        group = ["KEM", "Signature", "Scenario"]
+        aggregates = [f"AVG({quote(m)}) AS {quote(m + '_mean')}, stdev({quote(m)}) AS {quote(m + '_std')}" for m in metrics]
+        return pd.read_sql_query(f"SELECT {', '.join(group)}, COUNT(*) AS Runs{''.join(', ' + a for a in aggregates)} FROM merged "
+                                 f"GROUP BY {', '.join(group)} ORDER BY {', '.join(group)}", conn)
+    finally: conn.close()
+
+def emit(df, output):
+    if output:
+        df.to_csv(output, index=False); print(f"📄 {len(df)} righe salvate in {output}")
+    else: print(df.to_string(index=False))
+
+def main():
+    parser = argparse.ArgumentParser(description="Archivio SQLite dei risultati dei test (report/results.db)")
+    parser.add_argument("--db", default=DB_FILE)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("ingest", help="importa i CSV nuovi o modificati di report/")
+    for name, text in [("merged", "medie di client e nginx unite per Run_ID"), ("scenarios", "aggregati per scenario"), ("sql", "query SQL libera")]:
+        p = sub.add_parser(name, help=text)
+        p.add_argument("--output", help="CSV di destinazione (default: stampa a video)")
+        p.add_argument("--no-ingest", action="store_true", help="interroga il database senza aggiornarlo")
+        if name == "scenarios": p.add_argument("--metric", action="append", help="colonna della vista merged (default: SCENARIO_METRICS)")
+        if name == "sql": p.add_argument("query")
+    args = parser.parse_args()
+
+    if args.command == "ingest" or not args.no_ingest: ingest(args.db)
+    if args.command == "ingest": return
+    start = time.perf_counter()
+    try:
+        if args.command == "merged": df = merged_table(args.db)
+        elif args.command == "scenarios": df = scenario_table(args.metric or SCENARIO_METRICS, args.db)
+        else: df = query(args.query, db=args.db)
+    except (sqlite3.Error, pd.errors.DatabaseError) as e:
+        sys.exit(f"❌ Errore nella query: {e}")
+    emit(df, args.output)
+    print(f"⏱️ Query eseguita in {(time.perf_counter() - start) * 1000:.1f} ms", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -1,159 +1,575 @@
-# Configurazioni da testare
-#sig_list, kem_list = ["ecdsa_p256", "mldsa44", "p256_mldsa44"], ["secp256r1", "mlkem512", "p256_mlkem512"]
-#sig_list, kem_list= ["ecdsa_p384", "mldsa65", "p384_mldsa65"], ["secp384r1", "mlkem768", "p384_mlkem768"]
-#sig_list, kem_list = ["ecdsa_p521", "mldsa87", "p521_mldsa87"], ["secp521r1", "mlkem1024","p521_mlkem1024"]
-import json, subprocess, psutil, time, math, re, logging, os, random, csv, pandas as pd, numpy as np, matplotlib.pyplot as plt
+import json, subprocess, warnings, psutil, time, math, re, logging, os, random, csv, statistics, shutil, threading, itertools, hashlib, pickle, inspect, urllib.request, urllib.parse, pandas as pd, numpy as np, matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
 from collections import defaultdict
-
-sig_list, kem_list = ["ecdsa_p256", "mldsa44", "p256_mldsa44"], ["secp256r1", "mlkem512", "p256_mlkem512"]
-NUM_RUNS, TIMEOUT, SLEEP = 10, 300, 2
-CLIENT, SERVER = "client_analysis", "nginx_pq"
+from concurrent.futures import ProcessPoolExecutor
+from stats_engine import replica_arrays, stack_arrays, mean_per_request, summarize, outlier_scores
+from html_report import write_html_report
+from results_db import ingest as ingest_results, default_scenario, FILE_INDEX
+from experiment import BASE_DIR, TIMEOUT, SLEEP, load_scenarios
+from stack_ops import (CLIENT, SERVER, CERT_GENERATOR, WIRESHARK, VOLUMES, CERT_CACHE_DIR, STACK_SUBNET_BASE, run_subprocess, check_logs,
+                       stack_host, prebuild_certificates)
+
+# Scenari da testare: vedi experiment.py ("Matrice degli Esperimenti" nel readme).
+LEDGER_FILE = os.path.join(BASE_DIR, "report", "ledger.jsonl")
+scenarios, NUM_RUNS = load_scenarios()
+kem_list, sig_list, workload_list = [s["kem"] for s in scenarios], [s["sig"] for s in scenarios], [s["workload"] for s in scenarios]
+# Modalità adattiva: con ADAPTIVE_CI > 0 ogni scenario parte da MIN_RUNS repliche e viene esteso finché la semiampiezza
+# relativa dell'intervallo di confidenza al 95% del TLS handshake medio non scende sotto ADAPTIVE_CI (al massimo MAX_RUNS).
+ADAPTIVE_CI, MIN_RUNS, MAX_RUNS = 0.0, 3, 30
+# Uno scenario con MAX_FAILURES repliche fallite di seguito (nessuna run completata) viene abbandonato; in modalità adattiva
+# ogni scenario ha al più MAX_RUNS + MAX_FAILURES tentativi per esecuzione di run_test.py.
+MAX_FAILURES = 3
+REQUIRED_RUNS, USED_RUNS = (MIN_RUNS, MAX_RUNS) if ADAPTIVE_CI > 0 else (NUM_RUNS, NUM_RUNS)
+# Analisi statistica (request_stats.csv e replica_outliers.csv): campioni bootstrap, livello dell'IC e soglia del z-score robusto.
+STATS_ANALYSIS, BOOTSTRAP_SAMPLES, CI_LEVEL, OUTLIER_Z = True, 2000, 0.95, 3.5
+# Report: "png" (grafici statici), "html" (report interattivo unico in report/report.html) o "both"; i PNG sono generati
+# da RENDER_WORKERS processi e quelli con dati invariati non vengono rigenerati.
+REPORT_FORMAT, RENDER_WORKERS = "png", os.cpu_count() or 1
+T_95 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228, 2.201, 2.179, 2.160, 2.145, 2.131,
+        2.120, 2.110, 2.101, 2.093, 2.086, 2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+# Stack persistente: i container restano attivi tra le repliche; a ogni replica il certificato viene installato con
+# `nginx -s reload`, il client riparte con il DEFAULT_GROUPS dello scenario e access log, pcap e keylog vengono ruotati.
+PERSISTENT_STACK = False
+# Cache dei certificati: con CERT_CACHE le catene di ogni firma vengono generate una volta in CERT_CACHE_DIR prima del piano
+# e durante i test cert-generator le copia dalla cache montata in sola lettura. FORCE_NEW_CERT=1 nell'env di uno scenario
+# genera invece nuove chiavi a ogni replica.
+CERT_CACHE = True
+# Stack paralleli: con PARALLEL_STACKS > 1 il piano viene distribuito su N stack isolati (progetto compose, subnet
+# 192.168.<STACK_SUBNET_BASE+k>.0/24 di stack_ops.py, volumi e cpuset propri). Ogni stack scrive in report/stacks/s<k>, unito a report/ a fine replica.
+# Prima del piano NOISE_CHECK confronta la mediana del TLS handshake isolata e in parallelo (scarto massimo NOISE_TOLERANCE).
+PARALLEL_STACKS, COORDINATOR_PORT_BASE, HTTPS_PORT_BASE = 1, 5100, 8443
+NOISE_CHECK, NOISE_TOLERANCE = True, 0.05
+COORDINATOR_URL, COORDINATOR_GRACE = "http://localhost:5000", 15  # secondi senza risposta dal coordinatore prima di ripiegare sui log
 CLIENT_DONE, SERVER_DONE = r"\[INFO\] Test completato in .* Report: /app/output/request_logs/request_client\d+\.csv", r"--- Informazioni RAM ---"
 
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 docker_compose_path, SHARED_VOLUMED_PATH = os.path.join(BASE_DIR, "docker-compose.yml"), os.path.join(BASE_DIR, "shared_plan")
 output_csv = os.path.join(BASE_DIR, "report/request_logs/avg/average_metrics_per_request.csv")
 output_csv_avg = os.path.join(BASE_DIR, "report/request_logs/avg/average_metrics.csv")
 GRAPH_DIR, FILTERED_LOG_DIR = os.path.join(BASE_DIR, "report/graph"), os.path.join(BASE_DIR, "report/filtered_logs")
+JOINED_DIR, join_summary_csv = os.path.join(BASE_DIR, "report/request_logs/joined"), os.path.join(BASE_DIR, "report/request_logs/avg/request_join_breakdown.csv")
 input_folder, monitor_folder = os.path.join(BASE_DIR, "report/request_logs"), os.path.join(BASE_DIR, "report/system_logs")
-for d in (GRAPH_DIR, FILTERED_LOG_DIR, input_folder, monitor_folder, SHARED_VOLUMED_PATH): os.makedirs(d, exist_ok=True)
+for d in (GRAPH_DIR, FILTERED_LOG_DIR, JOINED_DIR, input_folder, os.path.dirname(output_csv), monitor_folder, SHARED_VOLUMED_PATH): os.makedirs(d, exist_ok=True)
 plan_path = os.path.join(SHARED_VOLUMED_PATH, "plan.json")
-
-def get_kem_sig_from_file(filepath):
+STACKS_DIR, STACK_REPORT_DIR = os.path.join(BASE_DIR, "stacks"), os.path.join(BASE_DIR, "report", "stacks")
+# Indice dei CSV del client: KEM/firma, righe e medie di ogni file, con le metriche per richiesta in un .npz per file.
+SUMMARY_INDEX, SUMMARY_CACHE_DIR = os.path.join(BASE_DIR, "report/summary_index.json"), os.path.join(BASE_DIR, "report/.summary_cache")
+render_manifest, html_report_path = os.path.join(GRAPH_DIR, ".render_cache.json"), os.path.join(BASE_DIR, "report/report.html")
+request_stats_csv, replica_outliers_csv = os.path.join(BASE_DIR, "report/request_logs/avg/request_stats.csv"), os.path.join(BASE_DIR, "report/request_logs/avg/replica_outliers.csv")
+noise_check_csv = os.path.join(BASE_DIR, "report/request_logs/avg/noise_check.csv")
+# Fasi dell'handshake registrate dal client per ogni richiesta (colonne HS_<fase>(ms)), nell'ordine del grafico impilato.
+HANDSHAKE_PHASES = ["ClientHello", "ServerHello", "Certificate", "CertificateVerify", "ServerFinished", "ClientFinished"]
+REQUEST_METRICS = ["Connect_Time(ms)", "TLS_Handshake(ms)", "Total_Time(ms)", "Elapsed_Time(ms)", "Cert_Size(B)"] + [f"HS_{p}(ms)" for p in HANDSHAKE_PHASES]
+STATS_METRICS = [m for m in REQUEST_METRICS if m != "Cert_Size(B)"]
+
+def load_measured_requests(filepath):
+    """Richieste di un file client escluse quelle di warm-up (colonna Warmup, assente nei report meno recenti)."""
+    df = pd.read_csv(filepath)
+    return df[~df["Warmup"].astype(str).eq("True")] if "Warmup" in df.columns else df
+
+def get_kem_sig(df):
     try:
-        df = pd.read_csv(filepath)
         df = df[df["Status"] == "Success"]
         return df["KEM"].dropna().mode()[0].strip(), df["Signature"].dropna().mode()[0].strip()
-    except Exception as e:
-        print(f"Errore durante l'estrazione di KEM/SIG da {filepath}: {e}")
+    except Exception:
         return "Unknown", "Unknown"
 
-def group_request_files_by_kem_sig(folder):
+def summary_cache_file(name):
+    return os.path.join(SUMMARY_CACHE_DIR, name.replace(".csv", ".npz"))
+
+def summarize_request_file(name, st):
+    """Voce dell'indice per un CSV del client; salva le metriche per richiesta (fallite a NaN) in un .npz."""
+    df = load_measured_requests(os.path.join(input_folder, name))
+    kem, sig = get_kem_sig(df)
+    run_ids = df["Request_ID"].dropna().astype(str).str.rsplit("-", n=1).str[0].mode() if "Request_ID" in df.columns else pd.Series(dtype=str)
+    numbers, values = replica_arrays(df, REQUEST_METRICS)
+    os.makedirs(SUMMARY_CACHE_DIR, exist_ok=True)
+    np.savez(summary_cache_file(name), numbers=numbers, values=values)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        means = np.nanmean(values, axis=0) if len(values) else np.full(len(REQUEST_METRICS), np.nan)
+    return {"mtime": st.st_mtime_ns, "size": st.st_size, "kem": kem, "sig": sig, "default_scenario": default_scenario(kem, sig, df),
+            "run_id": run_ids.iloc[0] if not run_ids.empty else None, "rows": len(df), "success": int(df["Status"].eq("Success").sum()),
+            "means": {m: None if math.isnan(v) else round(float(v), 4) for m, v in zip(REQUEST_METRICS, means)}}
+
+def update_summary_index():
+    """Aggiorna report/summary_index.json rileggendo solo i CSV del client nuovi o modificati (mtime e dimensione).
+    Lo scenario di ogni file è la chiave del ledger (KEM, firma, workload ed env) o, per i file non registrati,
+    quella ricavata dalle colonne Workload e Client_Mode del CSV (default_scenario).
+    Restituisce l'indice {file: voce} e l'insieme degli scenari con file aggiunti, modificati, rimossi o riassegnati."""
+    index, changed, seen = {}, set(), set()
+    if os.path.exists(SUMMARY_INDEX):
+        with open(SUMMARY_INDEX, encoding="utf-8") as f: index = json.load(f)
+    for name in sorted(list_request_files()):
+        seen.add(name)
+        st, entry = os.stat(os.path.join(input_folder, name)), index.get(name)
+        if (entry and entry["mtime"] == st.st_mtime_ns and entry["size"] == st.st_size and "default_scenario" in entry
+                and os.path.exists(summary_cache_file(name))): continue
+        try: new = summarize_request_file(name, st)
+        except Exception as e: print(f"⚠️ Errore nella lettura di {name}: {e}"); continue
+        changed |= {entry.get("scenario")} if entry else set()
+        index[name] = new
+    for name in set(index) - seen:
+        changed.add(index[name].get("scenario"))
+        del index[name]
+        if os.path.exists(summary_cache_file(name)): os.remove(summary_cache_file(name))
+    ledger = {os.path.basename(p): key for key, replicas in load_ledger().items() for files in replicas.values() for p in files}
+    for name, entry in index.items():
+        scenario = ledger.get(name, entry["default_scenario"])
+        if entry.get("scenario") != scenario: changed |= {entry.get("scenario"), scenario}
+        entry["scenario"] = scenario
+    changed.discard(None)
+    if changed:
+        with open(SUMMARY_INDEX + ".tmp", "w", encoding="utf-8") as f: json.dump(index, f)
+        os.replace(SUMMARY_INDEX + ".tmp", SUMMARY_INDEX)
+    return index, changed
+
+def group_request_files_by_scenario(index):
     grouped = defaultdict(list)
-    for file in sorted(f for f in os.listdir(folder) if os.path.isfile(os.path.join(folder, f))):
-        if file.startswith("request_client") and file.endswith(".csv"):
-            path = os.path.join(folder, file)
-            kem, sig = get_kem_sig_from_file(path)
-            if kem != "Unknown" and sig != "Unknown": grouped[(kem, sig)].append(path)
-    return {k: v for k, v in grouped.items() if len(v) >= NUM_RUNS}
-
-def generate_average_metrics_per_request(kem, sig, files, output_csv):
-    dfs = [pd.read_csv(f).sort_values("Request_Number").reset_index(drop=True) for f in files[:NUM_RUNS]]
-    metric_cols = ["Connect_Time(ms)", "TLS_Handshake(ms)", "Total_Time(ms)", "Elapsed_Time(ms)", "Cert_Size(B)"]
-    result_rows = []
-    for i in range(len(dfs[0])):
-        avg_row = sum(df.loc[i, metric_cols].values for df in dfs) / len(dfs)
-        result_rows.append([kem, sig] + [round(val, 3) for val in avg_row.tolist()])
-
-    file_exists = os.path.exists(output_csv)
-    with open(output_csv, "a", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        if not file_exists:
-            writer.writerow(["KEM", "Signature", "Avg_Connect_Time(ms)", "Avg_Handshake_Time(ms)",
-                             "Avg_Total_Time(ms)", "Avg_Elapsed_Time(ms)", "Avg_Cert_Size(B)"])
-        writer.writerows(result_rows)
-    print(f"✅ Aggiunte {len(result_rows)} righe ad average_metrics_per_request.csv per {kem} - {sig}")
+    for name in sorted(index):
+        if index[name]["kem"] != "Unknown" and index[name]["sig"] != "Unknown": grouped[index[name]["scenario"]].append(name)
+    return {k: v for k, v in grouped.items() if len(v) >= REQUIRED_RUNS}
+
+def scenario_title(scenario):
+    """"KEM: ... | Signature: ..." più, su una seconda riga, workload e opzioni della chiave di scenario."""
+    kem, sig, *extra = scenario.split("|")
+    return f"KEM: {kem} | Signature: {sig}" + (f"\n{' | '.join(extra)}" if extra else "")
+
+def scenario_slug(scenario):
+    return re.sub(r"[^\w.=+-]+", "_", scenario)
+
+def monitor_scenario(df, path, index):
+    """Scenario di un file di monitoraggio: dal Run_ID della run o, per i report meno recenti, dal CSV del client con lo
+    stesso numero di file. None se la run non è nell'indice."""
+    by_run = {e["run_id"]: e["scenario"] for e in index.values() if e.get("run_id")}
+    by_number = {int(FILE_INDEX.search(name)[1]): e["scenario"] for name, e in index.items() if FILE_INDEX.search(name)}
+    run_ids = df["Run_ID"].dropna().astype(str) if "Run_ID" in df.columns else pd.Series(dtype=str)
+    if not run_ids.empty and run_ids.iloc[0] in by_run: return by_run[run_ids.iloc[0]]
+    return by_number.get(int(FILE_INDEX.search(path)[1])) if FILE_INDEX.search(path) else None
+
+def load_cached_replicas(names):
+    replicas = []
+    for name in names:
+        with np.load(summary_cache_file(name)) as z: replicas.append((z["numbers"], z["values"]))
+    return replicas
+
+def stale_scenarios(path, grouped, changed):
+    """Scenari da ricalcolare per l'output `path`: quelli cambiati, o tutti se l'output non esiste ancora o non ha la
+    colonna Scenario (righe per sola coppia KEM/firma dei report meno recenti)."""
+    return changed | set(grouped) if not os.path.exists(path) or "Scenario" not in pd.read_csv(path, nrows=0).columns else changed
+
+def rewrite_scenario_rows(path, stale, new_rows, columns):
+    """Riscrive `path` sostituendo le righe degli scenari (colonna Scenario) in `stale` con `new_rows`: nessuna riga duplicata.
+    Le righe senza Scenario dei report meno recenti vengono scartate: stale_scenarios le fa ricalcolare tutte."""
+    old = pd.read_csv(path) if os.path.exists(path) else pd.DataFrame(columns=columns)
+    keep = old[~old["Scenario"].astype(str).isin(stale)] if "Scenario" in old.columns else old.iloc[0:0]
+    frames = [f for f in (keep.reindex(columns=columns), pd.DataFrame(new_rows, columns=columns)) if len(f)]
+    (pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)).to_csv(path, index=False)
+
+def generate_average_metrics_per_request(kem, sig, scenario, files):
+    # Repliche allineate su Request_Number: richieste mancanti, fallite o colonne delle fasi assenti nei file meno recenti
+    # restano NaN e ogni media usa le sole repliche con un valore.
+    cube, _ = stack_arrays(load_cached_replicas(files[:USED_RUNS]))
+    return [[kem, sig, scenario] + row for row in np.round(mean_per_request(cube), 3).tolist()]
 
 def process_all_batches_for_avg_per_request(input_folder, output_csv):
-    grouped_files = group_request_files_by_kem_sig(input_folder)
-    for (kem, sig), file_list in grouped_files.items():
-        generate_average_metrics_per_request(kem, sig, file_list, output_csv)
-
-def run_subprocess(cmd, timeout=None):
-    try:
-        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, encoding="utf-8", errors="replace")
-        stdout, stderr = proc.communicate(timeout=timeout)
-        return proc.returncode, stdout, stderr
-    except subprocess.TimeoutExpired:
-        proc.terminate()
-        try: proc.wait(timeout=2)
-        except subprocess.TimeoutExpired: proc.kill()
-        return -1, "", "⏱️ Timeout"
-
-def check_logs(container, pattern):
-    code, out, err = run_subprocess(["docker", "logs", "--tail", "100", container], timeout=5)
-    return re.search(pattern, out) is not None if out else False
-
-def update_kem(kem):
-    with open(docker_compose_path, "r", encoding="utf-8") as f:
-        content = re.sub(r"(DEFAULT_GROUPS=)[^\s\n]+", f"\\1{kem}", f.read())
-    with open(docker_compose_path, "w", encoding="utf-8") as f:
-        f.write(content)
-    print(f"✅ KEM: {kem}")
-
-def update_sig(sig):
-    with open(docker_compose_path, "r", encoding="utf-8") as f:
-        content = re.sub(r"(SIGNATURE_ALGO=)[^\s\n]+", f"\\1{sig}", f.read())
-    with open(docker_compose_path, "w", encoding="utf-8") as f:
-        f.write(content)
-    print(f"✅ Signature: {sig}")
-
-def run_single_test(i):
-    print(f"\n🚀 Test {i}")
-    code, _, err = run_subprocess(["docker-compose", "up", "-d"], timeout=30)
+    """Aggiorna l'indice e ricalcola le medie per richiesta dei soli scenari con file nuovi o modificati.
+    Restituisce l'indice e gli scenari cambiati, riusati dall'analisi statistica."""
+    index, changed = update_summary_index()
+    grouped = group_request_files_by_scenario(index)
+    stale = stale_scenarios(output_csv, grouped, changed)
+    if not stale: print("⏭️ Nessun CSV del client nuovo o modificato: average_metrics_per_request.csv è aggiornato."); return index, changed
+    header = ["KEM", "Signature", "Scenario", "Avg_Connect_Time(ms)", "Avg_Handshake_Time(ms)", "Avg_Total_Time(ms)",
+              "Avg_Elapsed_Time(ms)", "Avg_Cert_Size(B)"] + [f"Avg_HS_{p}(ms)" for p in HANDSHAKE_PHASES]
+    rows = []
+    for scenario in sorted(stale & set(grouped)):
+        entry = index[grouped[scenario][0]]
+        rows += generate_average_metrics_per_request(entry["kem"], entry["sig"], scenario, grouped[scenario])
+        print(f"✅ Medie per richiesta ricalcolate per {scenario}")
+    rewrite_scenario_rows(output_csv, stale, rows, header)
+    return index, changed
+
+def analyze_request_stats(index, changed):
+    """Per ogni scenario: media, mediana, p95 e p99 delle richieste riuscite con IC bootstrap (request_stats.csv) e
+    z-score robusto della mediana di ogni replica, con le repliche anomale segnalate (replica_outliers.csv).
+    Come per le medie, vengono ricalcolati solo gli scenari con file nuovi o modificati."""
+    grouped, stats_rows, outlier_rows = group_request_files_by_scenario(index), [], []
+    stale = stale_scenarios(request_stats_csv, grouped, changed) | stale_scenarios(replica_outliers_csv, grouped, changed)
+    if not stale: return print("⏭️ Statistiche per richiesta già aggiornate.")
+    columns = [REQUEST_METRICS.index(m) for m in STATS_METRICS]
+    for scenario in sorted(stale & set(grouped)):
+        files = grouped[scenario][:USED_RUNS]
+        kem, sig = index[files[0]]["kem"], index[files[0]]["sig"]
+        cube, _ = stack_arrays([(numbers, values[:, columns]) for numbers, values in load_cached_replicas(files)])
+        s = summarize(cube, BOOTSTRAP_SAMPLES, CI_LEVEL)
+        for m, metric in enumerate(STATS_METRICS):
+            if not s["requests"][m]: continue
+            stats_rows.append([kem, sig, scenario, metric, s["replicas"][m], s["requests"][m]] +
+                              [round(float(v), 4) for name in ("mean", "p50", "p95", "p99") for v in (s[name][m], *s[f"{name}_ci"][:, m])])
+        z = outlier_scores(s["replica_median"])
+        for r, f in enumerate(files):
+            flagged = [metric for m, metric in enumerate(STATS_METRICS) if abs(z[r, m]) > OUTLIER_Z]
+            outlier_rows.append([kem, sig, scenario, f] + [round(float(v), 2) for v in z[r]] + [bool(flagged), ";".join(flagged)])
+            if flagged: print(f"⚠️ {f} ({scenario}) anomala per {', '.join(flagged)}")
+    ci = lambda name: [name, f"{name}_CI_Low", f"{name}_CI_High"]
+    rewrite_scenario_rows(request_stats_csv, stale, stats_rows, ["KEM", "Signature", "Scenario", "Metric", "Replicas", "Requests"] + ci("Mean") + ci("Median") + ci("P95") + ci("P99"))
+    rewrite_scenario_rows(replica_outliers_csv, stale, outlier_rows, ["KEM", "Signature", "Scenario", "File"] + [f"Z_{m}" for m in STATS_METRICS] + ["Outlier", "Outlier_Metrics"])
+    print(f"✅ Statistiche per richiesta in {request_stats_csv}, repliche anomale in {replica_outliers_csv}")
+
+def scenario_env(idx):
+    """Variabili interpolate da docker-compose.yml per lo scenario: KEM, firma, workload e opzioni dello spec."""
+    s = scenarios[idx]
+    return {**s["env"], "DEFAULT_GROUPS": s["kem"], "SIGNATURE_ALGO": s["sig"], "WORKLOAD": s["workload"]}
+
+def scenario_key(idx):
+    s = scenarios[idx]
+    return "|".join([s["kem"], s["sig"], s["workload"]] + [f"{k}={v}" for k, v in sorted(s["env"].items())])
+
+def load_ledger():
+    """Repliche completate per scenario, dal registro scritto a fine di ogni replica: {chiave scenario: {replica: [file]}}."""
+    done = defaultdict(dict)
+    if os.path.exists(LEDGER_FILE):
+        with open(LEDGER_FILE, encoding="utf-8") as f:
+            for line in f:
+                try: entry = json.loads(line)
+                except ValueError: continue  # riga troncata da un'interruzione
+                done[entry["scenario"]][entry["replica"]] = [os.path.join(BASE_DIR, p) for p in entry["files"]]
+    return done
+
+def record_replica(idx, replica, run_id, files):
+    with open(LEDGER_FILE, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"scenario": scenario_key(idx), "replica": replica, "run_id": run_id, "files": [os.path.relpath(p, BASE_DIR) for p in files],
+                            "completed": time.strftime("%Y-%m-%d %H:%M:%S")}) + "\n")
+
+def coordinator_wait(phase, deadline, run_id=None, url=COORDINATOR_URL):
+    """Long-poll sul coordinatore Flask finché la run (`run_id`, default la corrente) raggiunge `phase`.
+    Restituisce lo stato della run, None allo scadere di `deadline` o se il coordinatore non risponde per COORDINATOR_GRACE s."""
+    last_ok = time.time()
+    while (remaining := deadline - time.time()) > 0:
+        query = urllib.parse.urlencode({"phase": phase, "timeout": f"{min(25, remaining):.1f}", **({"run_id": run_id} if run_id else {})})
+        try:
+            with urllib.request.urlopen(f"{url}/wait?{query}", timeout=35) as r: state = json.load(r)
+            last_ok = time.time()
+            if state.get("reached"): return state
+        except (OSError, ValueError):
+            if time.time() - last_ok > COORDINATOR_GRACE: return None
+            time.sleep(0.2)
+    return None
+
+def compose_cmd(stack=0):
+    """Comando docker-compose dello stack principale (0) o dello stack parallelo k, con progetto e file propri."""
+    if not stack: return ["docker-compose"]
+    return ["docker-compose", "-p", f"pqstack{stack}", "-f", os.path.join(STACKS_DIR, f"docker-compose.s{stack}.yml"), "--project-directory", BASE_DIR]
+
+def stack_cpuset(stack):
+    per_stack = max(1, (os.cpu_count() or 1) // PARALLEL_STACKS)
+    first = ((stack - 1) * per_stack) % (os.cpu_count() or 1)
+    return f"{first}-{first + per_stack - 1}"
+
+def write_stack_compose(stack):
+    """docker-compose.yml dello stack k, derivato da quello principale: subnet, porte pubblicate, nomi dei container,
+    cartella dei report e cpuset dedicati."""
+    with open(docker_compose_path, "r", encoding="utf-8") as f: content = f.read()
+    for pattern, repl in [(r"192\.168\.1\.", f"192.168.{STACK_SUBNET_BASE + stack}."), (r'"5000:5000"', f'"{COORDINATOR_PORT_BASE + stack}:5000"'),
+                          (r'"443:443"', f'"{HTTPS_PORT_BASE + stack}:443"'), (r"\./report:", f"./report/stacks/s{stack}:"),
+                          (r"( +)container_name: (\S+)", f'\\1container_name: \\2_s{stack}\n\\1cpuset: "{stack_cpuset(stack)}"')]:
+        content = re.sub(pattern, repl, content)
+    os.makedirs(STACKS_DIR, exist_ok=True)
+    with open(os.path.join(STACKS_DIR, f"docker-compose.s{stack}.yml"), "w", encoding="utf-8") as f: f.write(content)
+
+def run_single_test(i, stack=0, env=None):
+    """Esegue una replica con `env` interpolato in docker-compose.yml; restituisce l'ID della run completata ("logs" se
+    rilevata dai log dei container) o None."""
+    tag, compose = f"[s{stack}] " if stack else "", compose_cmd(stack)
+    url, suffix = (f"http://localhost:{COORDINATOR_PORT_BASE + stack}", f"_s{stack}") if stack else (COORDINATOR_URL, "")
+    print(f"\n🚀 {tag}Test {i}")
+    code, _, err = run_subprocess(compose + ["up", "-d"], timeout=30, env=env)
+    if code != 0:
+        print(f"❌ {tag}Errore: {err}")
+        return None
+    print(f"⌛ {tag}In attesa della run sul coordinatore...")
+    start, completed = time.time(), None
+    if (run := coordinator_wait("locked", start + TIMEOUT, url=url)) and coordinator_wait("complete", start + TIMEOUT, run["run_id"], url):
+        print(f"✅ {tag}Completato (run {run['run_id']}).")
+        completed = run["run_id"]
+    else:
+        # Coordinatore non raggiungibile o run incompleta: ripiego sui log dei container per il tempo residuo.
+        print(f"⌛ {tag}In attesa log...")
+        while time.time() - start < TIMEOUT:
+            if check_logs(CLIENT + suffix, CLIENT_DONE) and check_logs(SERVER + suffix, SERVER_DONE):
+                print(f"✅ {tag}Completato.")
+                completed = "logs"
+                break
+            time.sleep(SLEEP)
+        else:
+            print(f"⚠️ {tag}Timeout dopo {TIMEOUT}s.")
+    print(f"🛑 {tag}Arresto container...")
+    if stack:
+        run_subprocess(compose + ["down", "-v"], timeout=60, env=env)
+    else:
+        run_subprocess(compose + ["down"], timeout=30, env=env)
+        print("🧹 Cleanup volumi...")
+        for v in VOLUMES:
+            run_subprocess(["docker", "volume", "rm", "-f", v])
+    time.sleep(SLEEP)
+    return completed
+
+NUMBERED_FILE, merge_lock = re.compile(r"^(?P<name>.*?)\d+\.(?P<ext>\w+)$"), threading.Lock()
+
+def merge_stack_output(stack):
+    """Sposta in report/ i file scritti dallo stack k: i file numerati prendono il primo indice libero della stessa cartella,
+    i CSV cumulativi (medie) vengono accodati senza intestazione. Restituisce i nuovi request_client*.csv."""
+    src, new_requests = os.path.join(STACK_REPORT_DIR, f"s{stack}"), []
+    with merge_lock:
+        for root, _, files in os.walk(src):
+            dest_dir = os.path.normpath(os.path.join(BASE_DIR, "report", os.path.relpath(root, src)))
+            os.makedirs(dest_dir, exist_ok=True)
+            for f in sorted(files):
+                path = os.path.join(root, f)
+                if m := NUMBERED_FILE.match(f):
+                    counter = 1
+                    while os.path.exists(dest := os.path.join(dest_dir, f"{m['name']}{counter}.{m['ext']}")): counter += 1
+                    shutil.move(path, dest)
+                    if m["name"] == "request_client" and dest_dir == os.path.normpath(input_folder): new_requests.append(dest)
+                elif f.endswith(".csv") and os.path.exists(dest := os.path.join(dest_dir, f)):
+                    with open(path, encoding="utf-8") as s, open(dest, "a", encoding="utf-8") as d:
+                        next(s, None); d.writelines(s)
+                    os.remove(path)
+                else: shutil.move(path, dest)
+    return new_requests
+
+def run_stack_test(i, stack, env, merge=True):
+    write_stack_compose(stack)
+    shutil.rmtree(os.path.join(STACK_REPORT_DIR, f"s{stack}"), ignore_errors=True)
+    run_id = run_single_test(i, stack, env)
+    return run_id, merge_stack_output(stack) if merge else []
+
+def stack_median_handshake(stack):
+    folder = os.path.join(STACK_REPORT_DIR, f"s{stack}", "request_logs")
+    files = [os.path.join(folder, f) for f in os.listdir(folder) if f.startswith("request_client")] if os.path.isdir(folder) else []
+    if not files: return math.nan
+    df = pd.concat([load_measured_requests(f) for f in files])
+    return df[df["Status"] == "Success"]["TLS_Handshake(ms)"].median()
+
+def noise_check(idx):
+    """Una replica dello scenario sullo stack 1 da solo, poi una su tutti gli stack insieme: la mediana del TLS handshake
+    di ogni stack in parallelo non deve scostarsi da quella isolata più di NOISE_TOLERANCE. Le repliche non entrano nei report."""
+    kem, sig, env = kem_list[idx], sig_list[idx], scenario_env(idx)
+    print(f"\n🔊 Controllo del rumore tra stack paralleli ({kem} + {sig})")
+    run_stack_test(0, 1, env, merge=False)
+    isolated = stack_median_handshake(1)
+    threads = [threading.Thread(target=run_stack_test, args=(0, k, env, False)) for k in range(1, PARALLEL_STACKS + 1)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    rows, ok = [], not math.isnan(isolated)
+    for k in range(1, PARALLEL_STACKS + 1):
+        median = stack_median_handshake(k)
+        deviation = (median - isolated) / isolated if ok and isolated else math.nan
+        ok = ok and not math.isnan(deviation) and abs(deviation) <= NOISE_TOLERANCE
+        rows.append([time.strftime("%Y-%m-%d %H:%M:%S"), kem, sig, PARALLEL_STACKS, k, round(isolated, 4), round(median, 4), round(deviation * 100, 2)])
+        print(f"📏 s{k}: mediana TLS {median:.3f} ms in parallelo contro {isolated:.3f} ms isolata ({deviation:+.2%})")
+        shutil.rmtree(os.path.join(STACK_REPORT_DIR, f"s{k}"), ignore_errors=True)
+    file_exists = os.path.exists(noise_check_csv)
+    with open(noise_check_csv, "a", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        if not file_exists:
+            writer.writerow(["Timestamp", "KEM", "Signature", "Stacks", "Stack", "Isolated_Median_TLS(ms)", "Parallel_Median_TLS(ms)", "Deviation(%)"])
+        writer.writerows(rows)
+    return ok
+
+def run_parallel_plan(steps, scenario_files, outcomes):
+    """Distribuisce le repliche del piano sugli stack: ogni stack preleva la replica successiva appena libero."""
+    queue, lock = list(steps), threading.Lock()
+    def worker(stack):
+        while True:
+            with lock:
+                while queue and outcomes.abandoned(queue[0][0]): queue.pop(0)
+                if not queue: return
+                scenario_idx, replica = queue.pop(0)
+            kem, sig, workload = kem_list[scenario_idx], sig_list[scenario_idx], workload_list[scenario_idx]
+            print(f"\n🔀 [s{stack}] Scenario: {kem} + {sig} | Workload: {workload} | Replica: {replica}")
+            run_id, new_files = run_stack_test(replica, stack, scenario_env(scenario_idx))
+            with lock:
+                scenario_files[scenario_idx] += new_files
+                if run_id: record_replica(scenario_idx, replica, run_id, new_files)
+                outcomes.record(scenario_idx, run_id)
+    threads = [threading.Thread(target=worker, args=(k,)) for k in range(1, PARALLEL_STACKS + 1)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+
+def docker_exec(container, command, env=None, detach=False, timeout=60):
+    cmd = ["docker", "exec"] + (["-d"] if detach else []) + [a for k, v in (env or {}).items() for a in ("-e", f"{k}={v}")]
+    code, out, err = run_subprocess(cmd + [container, "sh", "-c", command], timeout=timeout)
+    if code != 0: print(f"⚠️ {container}: {command} -> {err.strip() or out.strip()}")
+    return code == 0
+
+def start_persistent_stack():
+    """Avvia una sola volta lo stack con AUTO_RUN=0: nginx e il client restano in attesa dei comandi di run_test.py."""
+    code, _, err = run_subprocess(["docker-compose", "up", "-d"], timeout=60, env={"AUTO_RUN": "0"})
     if code != 0:
         print(f"❌ Errore: {err}")
-        return
-    print("⌛ In attesa log...")
-    start = time.time()
-    while time.time() - start < TIMEOUT:
-        if check_logs(CLIENT, CLIENT_DONE) and check_logs(SERVER, SERVER_DONE):
-            print(f"✅ Completato.")
-            break
-        time.sleep(SLEEP)
+        return False
+    time.sleep(SLEEP)
+    return True
+
+def install_certificate(sig, force_new="0"):
+    """Installa CA e certificato del server nel volume condiviso (dalla cache o rigenerati); nginx li carica al reload successivo."""
+    print(f"🔏 Certificato {sig}...")
+    return docker_exec(CERT_GENERATOR, "/bin/sh /cert-generator/generate_certs.sh", {"SIGNATURE_ALGO": sig, "FORCE_NEW_CERT": force_new}, timeout=60)
+
+def rotate_replica_state(tag):
+    """Archivia access log, pcap e keylog della replica precedente e riavvia la cattura su file vuoti.
+    Il reload di nginx riapre l'access log e carica l'eventuale nuovo certificato."""
+    docker_exec(SERVER, f"[ ! -f /opt/nginx/logs/access_custom.log ] || mv /opt/nginx/logs/access_custom.log /opt/nginx/logs/access_custom.{tag}.log;"
+                        " nginx -c /opt/nginx/nginx.conf -s reload")
+    run_subprocess(["docker", "stop", WIRESHARK], timeout=30)
+    docker_exec(CLIENT, f"for f in /app/pcap/capture.pcap /tls_keys/tls-secrets.log; do [ ! -f $f ] || mv $f ${{f%.*}}.{tag}.${{f##*.}}; done")
+    run_subprocess(["docker", "start", WIRESHARK], timeout=30)
+    deadline = time.time() + 30
+    while time.time() < deadline and not docker_exec(CLIENT, "[ -f /app/pcap/capture.pcap ]"): time.sleep(0.5)
+
+def run_persistent_test(i, env, new_cert):
+    """Replica sullo stack persistente: le opzioni dello scenario arrivano agli script con `docker exec -e`
+    (quelle del backend Flask restano quelle dell'avvio). Restituisce l'ID della run completata o None."""
+    print(f"\n🚀 Test {i} (stack persistente)")
+    if new_cert and not install_certificate(env["SIGNATURE_ALGO"], env.get("FORCE_NEW_CERT", "0")): return None
+    rotate_replica_state(time.strftime("%Y%m%d%H%M%S"))
+    start, completed = time.time(), None
+    docker_exec(SERVER, "python3 /opt/nginx/start_server.py > /proc/1/fd/1 2>&1", env, detach=True)
+    docker_exec(CLIENT, "python3 /app/start_client.py > /proc/1/fd/1 2>&1", env, detach=True)
+    print("⌛ In attesa della run sul coordinatore...")
+    # Nessun ripiego sui log: con i container persistenti conterrebbero le righe di completamento delle repliche precedenti.
+    if (run := coordinator_wait("locked", start + TIMEOUT)) and coordinator_wait("complete", start + TIMEOUT, run["run_id"]):
+        print(f"✅ Completato (run {run['run_id']}).")
+        completed = run["run_id"]
     else:
-        print(f"⚠️ Timeout dopo {TIMEOUT}s.")
+        print(f"⚠️ Run non completata entro {TIMEOUT}s: arresto degli script rimasti attivi.")
+        docker_exec(CLIENT, "pkill -f start_client.py"); docker_exec(SERVER, "pkill -f start_server.py")
+    time.sleep(SLEEP)
+    return completed
+
+def stop_persistent_stack():
     print("🛑 Arresto container...")
-    run_subprocess(["docker-compose", "down"], timeout=30)
+    run_subprocess(["docker-compose", "down"], timeout=60)
     print("🧹 Cleanup volumi...")
-    for v in ["webapppostquantum_certs", "webapppostquantum_pcap", "webapppostquantum_tls_keys"]:
+    for v in VOLUMES:
         run_subprocess(["docker", "volume", "rm", "-f", v])
-    if i < NUM_RUNS: time.sleep(SLEEP)
+
+def render_elapsed(path, x, values, title, cert_str):
+    plt.figure(figsize=(10, 5))
+    plt.plot(x, values, marker='o', linestyle='-', color='blue', label="Elapsed Time (ms)")
+    plt.xlabel("Request Completion Order"); plt.ylabel("Elapsed Time (ms)")
+    plt.title(f"Elapsed Time per Request\n{title}")
+    plt.legend(title=f"Certificate Size: {cert_str}"); plt.grid(True); plt.tight_layout()
+    plt.savefig(path); plt.close()
+
+def render_tls_breakdown(path, x, segments, title, cert_str):
+    """Connect, fasi dell'handshake impilate, residuo TLS non attribuito e tempo HTTP per richiesta."""
+    colors = plt.cm.tab10(np.linspace(0, 1, len(segments)))
+    plt.figure(figsize=(14, 7))
+    bottom = np.zeros(len(x))
+    for (label, values), color in zip(segments, colors):
+        plt.bar(x, values, bottom=bottom, label=label, color=color, alpha=0.8)
+        bottom = bottom + values
+    plt.xlabel("Request Completion Order"); plt.ylabel("Time (ms)")
+    plt.title(f"Handshake Phase Breakdown for TLS Connections\n{title}")
+    plt.legend(title=f"Certificate Size: {cert_str}"); plt.grid(axis="y", linestyle="--", alpha=0.7)
+    plt.tight_layout(); plt.savefig(path, dpi=300); plt.close()
+
+def render_boxplot(path, data_subset, labels_subset, ylabel, whis_val=4.0, perc_limit=99):
+    fig = plt.figure(figsize=(max(6, len(labels_subset) * 1.8), 6))
+    ax = fig.add_axes([0.1, 0.15, 0.8, 0.75])
+    ax.boxplot(data_subset, patch_artist=True, whis=whis_val,
+               boxprops=dict(facecolor='lightblue', alpha=0.7, edgecolor='black', linewidth=1.5),
+               whiskerprops=dict(color='black', linewidth=2),
+               capprops=dict(color='black', linewidth=2),
+               medianprops=dict(color='red', linewidth=2),
+               flierprops=dict(marker='o', color='black', markersize=6, alpha=0.6))
+
+    flat_data = [v for batch in data_subset for v in batch]
+    if flat_data:
+        perc_y = np.percentile(flat_data, perc_limit)
+        box_stats = [np.percentile(b, 75) + whis_val * (np.percentile(b, 75) - np.percentile(b, 25)) for b in data_subset]
+        y_max = max(perc_y, max(box_stats)); y_min = min(min(b) for b in data_subset)
+        y_margin = (y_max - y_min) * 0.2
+        ax.set_ylim(max(0, y_min - y_margin), y_max + y_margin)
+
+        for idx, box in enumerate(data_subset):
+            outliers = sum(v > np.percentile(box, perc_limit) for v in box)
+            if outliers > 0:
+                ax.annotate(f"+{outliers} outlier", xy=(idx + 1, y_max + y_margin * 0.1),
+                            ha='center', fontsize=8, color='gray')
+
+    ax.set_title(ylabel); ax.set_ylabel(ylabel)
+    ax.set_xticks(range(1, len(labels_subset) + 1))
+    ax.set_xticklabels(labels_subset, rotation=30, ha="right")
+    ax.set_xlim(0.5, len(labels_subset) + 0.5)
+    plt.savefig(path, dpi=300)
+    plt.close(fig)
+
+def render_job(job):
+    fn, path, kwargs = job
+    fn(path, **kwargs)
+    return path
+
+def render_figures(jobs):
+    """Renderizza i job (funzione, file, argomenti) su un pool di processi con backend Agg. Una figura viene saltata se
+    l'hash dei suoi dati e del sorgente della funzione coincide con quello registrato in .render_cache.json e il file esiste.
+    Si usa il sorgente e non il solo bytecode, che non include le costanti: cambiare dpi, colori o titoli ridisegna la figura."""
+    manifest = {}
+    if os.path.exists(render_manifest):
+        with open(render_manifest, encoding="utf-8") as f: manifest = json.load(f)
+    todo = []
+    for fn, path, kwargs in jobs:
+        digest = hashlib.sha256(inspect.getsource(fn).encode() + pickle.dumps((fn.__name__, kwargs))).hexdigest()
+        if manifest.get(os.path.basename(path)) != digest or not os.path.exists(path): todo.append((fn, path, kwargs))
+        manifest[os.path.basename(path)] = digest
+    if RENDER_WORKERS > 1 and len(todo) > 1:
+        with ProcessPoolExecutor(min(RENDER_WORKERS, len(todo))) as pool:
+            for _ in pool.map(render_job, todo, chunksize=max(1, len(todo) // (RENDER_WORKERS * 4))): pass
+    else:
+        for job in todo: render_job(job)
+    with open(render_manifest + ".tmp", "w", encoding="utf-8") as f: json.dump(manifest, f)
+    os.replace(render_manifest + ".tmp", render_manifest)
+    print(f"🖼️ Grafici: {len(todo)} generati, {len(jobs) - len(todo)} invariati.")
 
 def generate_graphs_from_average_per_request():
     if not os.path.exists(output_csv): logging.warning("File average_metrics_per_request.csv non trovato."); return
     df = pd.read_csv(output_csv)
     if df.empty:  logging.warning("Il file delle medie per richiesta è vuoto."); return
+    if REPORT_FORMAT in ("html", "both"): write_html_report(df, pd.read_csv(request_stats_csv) if os.path.exists(request_stats_csv) else None, html_report_path)
+    if REPORT_FORMAT not in ("png", "both"): return
 
-    reqs_per_batch, reqs_per_plot, total_batches = 500, 100, len(df) // 500
+    # Un batch per scenario, qualunque sia il suo NUM_REQUESTS (finestre fisse di righe mescolerebbero scenari diversi).
+    # I CSV meno recenti, senza colonna Scenario, vengono raggruppati per KEM/firma.
+    reqs_per_plot = 100
     metrics = ["Avg_Connect_Time(ms)", "Avg_Handshake_Time(ms)", "Avg_Total_Time(ms)", "Avg_Elapsed_Time(ms)"]
-    batch_labels, boxplot_data = [], {k: [] for k in metrics}
+    batch_labels, boxplot_data, jobs = [], {k: [] for k in metrics}, []
 
-    for b in range(total_batches):
-        df_batch = df.iloc[b * reqs_per_batch:(b + 1) * reqs_per_batch]
+    for _, df_batch in df.groupby(["Scenario"] if "Scenario" in df.columns else ["KEM", "Signature"], sort=False):
         kem, sig = df_batch["KEM"].iloc[0], df_batch["Signature"].iloc[0]
-        cert_size = int(df_batch["Avg_Cert_Size(B)"].iloc[0])
-        batch_labels.append(f"{kem}\n{sig}\n{cert_size} B")
-        for m in metrics: boxplot_data[m].append(df_batch[m].tolist())
+        scenario = df_batch["Scenario"].iloc[0] if "Scenario" in df_batch.columns else f"{kem}|{sig}"
+        cert_size = int(df_batch["Avg_Cert_Size(B)"].dropna().iloc[0]) if df_batch["Avg_Cert_Size(B)"].notna().any() else 0
+        batch_labels.append("\n".join(scenario.split("|") + [f"{cert_size} B"]))
+        for m in metrics: boxplot_data[m].append(df_batch[m].dropna().tolist())
 
-        for i in range(0, reqs_per_batch, reqs_per_plot):
+        for i in range(0, len(df_batch), reqs_per_plot):
             df_subset = df_batch.iloc[i:i + reqs_per_plot].reset_index(drop=True)
             x = list(range(i + 1, i + 1 + len(df_subset)))
-            cert_str = f"{cert_size:.2f} B"
+            common = {"x": x, "title": scenario_title(scenario), "cert_str": f"{cert_size:.2f} B"}
+            jobs.append((render_elapsed, os.path.join(GRAPH_DIR, f"elapsed_time_graph_{scenario_slug(scenario)}_{x[0]}_{x[-1]}.png"),
+                         {**common, "values": df_subset["Avg_Elapsed_Time(ms)"].to_numpy()}))
 
-            # Elapsed Time
-            plt.figure(figsize=(10, 5))
-            plt.plot(x, df_subset["Avg_Elapsed_Time(ms)"], marker='o', linestyle='-', color='blue', label="Elapsed Time (ms)")
-            plt.xlabel("Request Completion Order"); plt.ylabel("Elapsed Time (ms)")
-            plt.title(f"Elapsed Time per Request\nKEM: {kem} | Signature: {sig}")
-            plt.legend(title=f"Certificate Size: {cert_str}"); plt.grid(True); plt.tight_layout()
-            plt.savefig(os.path.join(GRAPH_DIR, f"elapsed_time_graph_batch_{b+1}_{x[0]}_{x[-1]}.png")); plt.close()
-
-            # TLS Breakdown
             connect = df_subset["Avg_Connect_Time(ms)"]
-            handshake = df_subset["Avg_Handshake_Time(ms)"] - connect
-            total = df_subset["Avg_Total_Time(ms)"] - df_subset["Avg_Handshake_Time(ms)"]
-            plt.figure(figsize=(14, 7))
-            plt.bar(x, connect, label="Connect Time", color="red", alpha=0.7)
-            plt.bar(x, handshake, bottom=connect, label="TLS Handshake Time", color="orange", alpha=0.7)
-            plt.bar(x, total, bottom=df_subset["Avg_Handshake_Time(ms)"], label="Total Time", color="gray", alpha=0.7)
-            plt.xlabel("Request Completion Order"); plt.ylabel("Time (ms)")
-            plt.title(f"Timing Breakdown for TLS Connections\nKEM: {kem} | Signature: {sig}")
-            plt.legend(title=f"Certificate Size: {cert_str}"); plt.grid(axis="y", linestyle="--", alpha=0.7)
-            plt.tight_layout(); plt.savefig(os.path.join(GRAPH_DIR, f"tls_avg_graph_batch_{b+1}_{x[0]}_{x[-1]}.png"), dpi=300); plt.close()
-
-    # Boxplot ogni 3 batch
-    max_per_image, whis_val, perc_limit = 3, 4.0, 99
+            phases = {p: df_subset.get(f"Avg_HS_{p}(ms)", pd.Series(0.0, index=df_subset.index)).fillna(0) for p in HANDSHAKE_PHASES}
+            tls_other = (df_subset["Avg_Handshake_Time(ms)"] - connect - sum(phases.values())).clip(lower=0)
+            segments = [("Connect Time", connect)] + [(p, v) for p, v in phases.items()] + [
+                ("Other TLS", tls_other), ("HTTP Time", df_subset["Avg_Total_Time(ms)"] - df_subset["Avg_Handshake_Time(ms)"])]
+            jobs.append((render_tls_breakdown, os.path.join(GRAPH_DIR, f"tls_avg_graph_{scenario_slug(scenario)}_{x[0]}_{x[-1]}.png"),
+                         {**common, "segments": [(label, values.to_numpy(dtype=float)) for label, values in segments]}))
+
+    # Boxplot ogni 3 scenari
+    max_per_image = 3
     for metric, ylabel in {
         "Avg_Connect_Time(ms)": "Connect Time (ms)",
         "Avg_Handshake_Time(ms)": "Handshake Time (ms)",
@@ -162,142 +578,266 @@ def generate_graphs_from_average_per_request():
     }.items():
         for img_index in range(math.ceil(len(batch_labels) / max_per_image)):
             start, end = img_index * max_per_image, (img_index + 1) * max_per_image
-            data_subset, labels_subset = boxplot_data[metric][start:end], batch_labels[start:end]
-
-            fig = plt.figure(figsize=(max(6, len(labels_subset) * 1.8), 6))
-            ax = fig.add_axes([0.1, 0.15, 0.8, 0.75])
-            bp = ax.boxplot(data_subset, patch_artist=True, whis=whis_val,
-                            boxprops=dict(facecolor='lightblue', alpha=0.7, edgecolor='black', linewidth=1.5),
-                            whiskerprops=dict(color='black', linewidth=2),
-                            capprops=dict(color='black', linewidth=2),
-                            medianprops=dict(color='red', linewidth=2),
-                            flierprops=dict(marker='o', color='black', markersize=6, alpha=0.6))
-
-            flat_data = [v for batch in data_subset for v in batch]
-            if flat_data:
-                perc_y = np.percentile(flat_data, perc_limit)
-                box_stats = [np.percentile(b, 75) + whis_val * (np.percentile(b, 75) - np.percentile(b, 25)) for b in data_subset]
-                y_max = max(perc_y, max(box_stats)); y_min = min(min(b) for b in data_subset)
-                y_margin = (y_max - y_min) * 0.2
-                ax.set_ylim(max(0, y_min - y_margin), y_max + y_margin)
-
-                for idx, box in enumerate(data_subset):
-                    outliers = sum(v > np.percentile(box, perc_limit) for v in box)
-                    if outliers > 0:
-                        ax.annotate(f"+{outliers} outlier", xy=(idx + 1, y_max + y_margin * 0.1),
-                                    ha='center', fontsize=8, color='gray')
-
-            ax.set_title(ylabel); ax.set_ylabel(ylabel)
-            ax.set_xticks(range(1, len(labels_subset) + 1))
-            ax.set_xticklabels(labels_subset, rotation=30, ha="right")
-            ax.set_xlim(0.5, len(labels_subset) + 0.5)
-            plt.savefig(os.path.join(GRAPH_DIR, f"{ylabel.replace(' ', '_')}_boxplot_part{img_index + 1}.png"), dpi=300)
-            plt.close(fig)
-
-def generate_server_performance_graphs():
-    print("📈 Generazione grafici performance server per ogni coppia KEM/Signature...")
-    grouped_files = defaultdict(list)
-    for file in os.listdir(FILTERED_LOG_DIR):
+            jobs.append((render_boxplot, os.path.join(GRAPH_DIR, f"{ylabel.replace(' ', '_')}_boxplot_part{img_index + 1}.png"),
+                         {"data_subset": boxplot_data[metric][start:end], "labels_subset": batch_labels[start:end], "ylabel": ylabel}))
+    render_figures(jobs)
+
+def sampling_interval(dfs):
+    """Intervallo di campionamento (s) dei monitor: la colonna Sampling_Interval(ms) scritta da start_server.py o, nei CSV che
+    non la hanno (client e report meno recenti), la mediana degli scarti tra i Timestamp. Tra repliche diverse vale il più ampio."""
+    col = "Sampling_Interval(ms)"
+    intervals = [df[col].max() / 1000 if col in df.columns and df[col].notna().any() else df["Timestamp"].diff().dt.total_seconds().median() for df in dfs]
+    return max([i for i in intervals if i > 0] or [0.1])
+
+def nginx_worker_usage(dfs, interval):
+    """Vista per worker nginx mediata sulle repliche: CPU (%) nel tempo, a intervalli di `interval` s, RSS e context switch
+    accumulati nel batch. None se i monitor non hanno colonne per worker."""
+    workers = sorted({int(m.group(1)) for df in dfs for col in df.columns if (m := re.fullmatch(r"W(\d+)_CPU\(s\)", col))})
+    if not workers: return None
+    cpu, rss, ctx_vol, ctx_invol = {}, [], [], []
+    for w in workers:
+        col = lambda field: f"W{w}_{field}"
+        runs = [df for df in dfs if col("CPU(s)") in df.columns]
+        series = []
+        for df in runs:
+            t = (df["Timestamp"] - df["Timestamp"].min()).dt.total_seconds()
+            usage = df[col("CPU(s)")].diff() / t.diff() * 100
+            series.append(pd.DataFrame({"Index": t // interval, "CPU": usage}).dropna().groupby("Index")["CPU"].mean())
+        avg = pd.concat(series, axis=1).mean(axis=1).sort_index()
+        cpu[w] = (avg.index.to_numpy() * interval * 1000, avg.to_numpy())
+        rss.append(np.nanmean([df[col("RSS(MB)")].max() for df in runs]))
+        ctx_vol.append(np.nanmean([df[col("Ctx_Vol")].max() - df[col("Ctx_Vol")].min() for df in runs]))
+        ctx_invol.append(np.nanmean([df[col("Ctx_Invol")].max() - df[col("Ctx_Invol")].min() for df in runs]))
+    return {"workers": workers, "cpu": cpu, "rss": rss, "ctx_vol": ctx_vol, "ctx_invol": ctx_invol}
+
+def render_nginx_workers(path, workers, cpu, rss, ctx_vol, ctx_invol, title):
+    fig, (ax_cpu, ax_rss, ax_ctx) = plt.subplots(3, 1, figsize=(14, 15), gridspec_kw={"height_ratios": [2, 1, 1]})
+    for w in workers: ax_cpu.plot(*cpu[w], label=f"Worker {w}", marker=".")
+    ax_cpu.set(xlabel="Time (ms)", ylabel="CPU (% of one core)", title=f"Nginx CPU Usage per Worker\n{title}")
+    ax_cpu.legend(loc="upper left", bbox_to_anchor=(1, 1)); ax_cpu.grid(True, linestyle="--", alpha=0.7)
+    labels, x = [f"Worker {w}" for w in workers], np.arange(len(workers))
+    ax_rss.bar(x, rss, color="steelblue", alpha=0.8)
+    ax_rss.set(xticks=x, xticklabels=labels, ylabel="Peak RSS (MB)", title="Peak RSS per Worker"); ax_rss.grid(axis="y", linestyle="--", alpha=0.7)
+    ax_ctx.bar(x - 0.2, ctx_vol, width=0.4, label="Voluntary", color="seagreen", alpha=0.8)
+    ax_ctx.bar(x + 0.2, ctx_invol, width=0.4, label="Involuntary", color="darkorange", alpha=0.8)
+    ax_ctx.set(xticks=x, xticklabels=labels, ylabel="Context Switches", title="Context Switches per Worker during the Batch")
+    ax_ctx.legend(); ax_ctx.grid(axis="y", linestyle="--", alpha=0.7)
+    fig.tight_layout(); fig.savefig(path, dpi=300, bbox_inches="tight"); plt.close(fig)
+
+def render_server_usage(path, x, cpu, mem, title):
+    fig, ax = plt.subplots(figsize=(14, 7))
+    ax.plot(x, cpu, label="CPU Usage (%)", color="red", marker="o")
+    ax.plot(x, mem, label="Memory Usage (%)", color="blue", marker="o")
+    ax.set(xlabel="Time (ms)", ylabel="Usage (%)", title=f"Server Resource Usage Over Time\n{title}")
+    ax.legend(title=title, loc="upper left", bbox_to_anchor=(1, 1))
+    ax.grid(True, linestyle="--", alpha=0.7)
+    fig.savefig(path, dpi=300, bbox_inches="tight"); plt.close(fig)
+
+def generate_server_performance_graphs(index):
+    """Uso di CPU e memoria di nginx e vista per worker di ogni scenario, come job di render_figures: un grafico viene
+    ridisegnato solo se cambiano i dati mediati sulle repliche."""
+    print("📈 Generazione grafici performance server per ogni scenario...")
+    grouped_files, jobs = defaultdict(list), []
+    for file in sorted(os.listdir(FILTERED_LOG_DIR)):
         if file.startswith("monitor_nginx_filtered") and file.endswith(".csv"):
             path = os.path.join(FILTERED_LOG_DIR, file)
-            kem, sig = get_kem_sig_from_monitor_file(path)
-            if kem != "Unknown" and sig != "Unknown": grouped_files[(kem, sig)].append(path)
-
-    for (kem, sig), files in grouped_files.items():
-        if len(files) < NUM_RUNS: print(f"⏭️ Salto {kem} + {sig} (solo {len(files)} file)"); continue
-        out_path = os.path.join(GRAPH_DIR, f"server_cpu_memory_usage_{kem}_{sig}.png".replace("/", "_"))
-        if os.path.exists(out_path): print(f"📁 Già esistente: {out_path}, salto."); continue
+            scenario = get_scenario_from_monitor_file(path, index)
+            if scenario: grouped_files[scenario].append(path)
 
+    for scenario, files in grouped_files.items():
+        if len(files) < REQUIRED_RUNS: print(f"⏭️ Salto {scenario} (solo {len(files)} file)"); continue
         dfs = []
-        for f in files[:NUM_RUNS]:
+        for f in files[:USED_RUNS]:
             try:
                 df = pd.read_csv(f)
                 df["Timestamp"] = pd.to_datetime(df["Timestamp"], format="%d/%b/%Y:%H:%M:%S.%f")
                 dfs.append(df)
             except Exception as e:
                 print(f"⚠️ Errore nel parsing di {f}: {e}")
-        if len(dfs) < NUM_RUNS:
-            print(f"⚠️ File validi insufficienti per {kem} + {sig}, salto."); continue
+        if len(dfs) < REQUIRED_RUNS:
+            print(f"⚠️ File validi insufficienti per {scenario}, salto."); continue
 
-        min_range = min((df["Timestamp"].max() - df["Timestamp"].min()).total_seconds() for df in dfs)
+        min_range, interval = min((df["Timestamp"].max() - df["Timestamp"].min()).total_seconds() for df in dfs), sampling_interval(dfs)
         df_monitor_avg = pd.concat([df[df["Timestamp"] <= df["Timestamp"].min() + pd.Timedelta(seconds=min_range)]
-            .assign(Index=(df["Timestamp"] - df["Timestamp"].min()).dt.total_seconds() // 0.1)
+            .assign(Index=(df["Timestamp"] - df["Timestamp"].min()).dt.total_seconds() // interval)
             .groupby("Index")[["CPU (%)", "Mem (%)"]].mean().reset_index()
             for df in dfs]).groupby("Index")[["CPU (%)", "Mem (%)"]].mean().reset_index()
 
-        time_ms = df_monitor_avg["Index"] * 100
-        fig, ax = plt.subplots(figsize=(14, 7))
-        ax.plot(time_ms, df_monitor_avg["CPU (%)"], label="CPU Usage (%)", color="red", marker="o")
-        ax.plot(time_ms, df_monitor_avg["Mem (%)"], label="Memory Usage (%)", color="blue", marker="o")
-        ax.set(xlabel="Time (ms)", ylabel="Usage (%)",
-               title=f"Server Resource Usage Over Time\nKEM: {kem} | Signature: {sig}")
-        ax.legend(title=f"KEM: {kem} | Signature: {sig}", loc="upper left", bbox_to_anchor=(1, 1))
-        ax.grid(True, linestyle="--", alpha=0.7)
-        fig.savefig(out_path, dpi=300, bbox_inches="tight")
-        plt.close(fig)
-        print(f"✅ Grafico generato: {out_path}")
-
-def get_kem_sig_from_monitor_file(filepath):
+        slug, title = scenario_slug(scenario), scenario_title(scenario)
+        jobs.append((render_server_usage, os.path.join(GRAPH_DIR, f"server_cpu_memory_usage_{slug}.png"), {"x": (df_monitor_avg["Index"] * interval * 1000).to_numpy(),
+                     "cpu": df_monitor_avg["CPU (%)"].to_numpy(), "mem": df_monitor_avg["Mem (%)"].to_numpy(), "title": title}))
+        workers = nginx_worker_usage(dfs, interval)
+        if workers: jobs.append((render_nginx_workers, os.path.join(GRAPH_DIR, f"server_worker_usage_{slug}.png"), {**workers, "title": title}))
+        else: print(f"⏭️ Nessuna colonna per worker nei monitor di {scenario}, salto la vista per worker.")
+    if jobs: render_figures(jobs)
+
+def get_scenario_from_monitor_file(filepath, index):
     try:
-        df = pd.read_csv(filepath)
-        return df["KEM"].dropna().iloc[0].strip(), df["Signature"].dropna().iloc[0].strip()
+        return monitor_scenario(pd.read_csv(filepath), filepath, index)
     except Exception as e:
-        print(f"Errore durante l'estrazione di KEM/SIG dal file di monitoraggio {filepath}: {e}")
-        return "Unknown", "Unknown"
+        print(f"Errore durante l'estrazione dello scenario dal file di monitoraggio {filepath}: {e}")
+        return None
 
-def generate_system_monitor_graph():
+def generate_system_monitor_graph(index):
     folder = os.path.join(BASE_DIR, "report", "system_logs")
     files = [os.path.join(folder, f) for f in os.listdir(folder) if f.startswith("system_client") and f.endswith(".csv")]
     if not files: print("⚠️ Nessun file di monitoraggio trovato."); return
 
-    grouped = defaultdict(list)
+    grouped, jobs = defaultdict(list), []
     for path in files:
         try:
             df = pd.read_csv(path)
-            kem, sig = df["KEM"].dropna().iloc[0], df["Signature"].dropna().iloc[0]
-            grouped[(kem, sig)].append(df)
+            scenario = monitor_scenario(df, path, index)
+            if scenario: grouped[scenario].append(df)
         except Exception as e: print(f"Errore durante la lettura di {path}: {e}")
 
-    for (kem, sig), dfs in grouped.items():
-        if len(dfs) < NUM_RUNS:
-            print(f"⏭️ Non abbastanza file per {kem} + {sig} (trovati {len(dfs)})"); continue
+    for scenario, dfs in grouped.items():
+        if len(dfs) < REQUIRED_RUNS:
+            print(f"⏭️ Non abbastanza file per {scenario} (trovati {len(dfs)})"); continue
 
         for df in dfs:
             df["Timestamp"] = pd.to_datetime(df["Timestamp"])
-        min_range = min((df["Timestamp"].max() - df["Timestamp"].min()).total_seconds() for df in dfs)
+        min_range, interval = min((df["Timestamp"].max() - df["Timestamp"].min()).total_seconds() for df in dfs), sampling_interval(dfs)
 
         df_avg = pd.concat([df[df["Timestamp"] <= df["Timestamp"].min() + pd.Timedelta(seconds=min_range)]
-            .assign(Index=lambda x: (x["Timestamp"] - x["Timestamp"].min()).dt.total_seconds() // 0.1)
+            .assign(Index=lambda x: (x["Timestamp"] - x["Timestamp"].min()).dt.total_seconds() // interval)
             .groupby("Index")[["CPU_Usage(%)", "Memory_Usage(%)"]].mean().reset_index()
             for df in dfs]).groupby("Index")[["CPU_Usage(%)", "Memory_Usage(%)"]].mean().reset_index()
 
-        x = (df_avg["Index"] * 100).tolist()
         mem_total = psutil.virtual_memory().total / (1024 ** 2)
         cores = psutil.cpu_count(logical=True)
-        plt.figure(figsize=(14, 6))
-        plt.plot(x, df_avg["CPU_Usage(%)"], label="CPU Usage (%)", color="green", marker="o")
-        plt.plot(x, df_avg["Memory_Usage(%)"], label="Memory Usage (%)", color="purple", marker="x")
-        plt.xlabel("Time (ms)"); plt.ylabel("Usage (%)")
-        plt.title(f"CPU & RAM Usage Over Time\nKEM: {kem} | Signature: {sig}")
-        plt.legend(title=f"Cores: {cores} | RAM: {mem_total:.1f} MB", loc="upper right")
-        plt.grid(True, linestyle="--", alpha=0.6); plt.tight_layout()
-        fname = f"resource_usage_{kem}_{sig}".replace("/", "_").replace("\n", "_").strip() + ".png"
-        plt.savefig(os.path.join(GRAPH_DIR, fname), dpi=300); plt.close()
-        print(f"✅ Grafico salvato: {fname}")
+        fname = f"resource_usage_{scenario_slug(scenario)}.png"
+        jobs.append((render_resource_usage, os.path.join(GRAPH_DIR, fname), {"x": (df_avg["Index"] * interval * 1000).tolist(), "cpu": df_avg["CPU_Usage(%)"].to_numpy(),
+                     "mem": df_avg["Memory_Usage(%)"].to_numpy(), "title": scenario_title(scenario), "legend": f"Cores: {cores} | RAM: {mem_total:.1f} MB"}))
+    if jobs: render_figures(jobs)
+
+def render_resource_usage(path, x, cpu, mem, title, legend):
+    plt.figure(figsize=(14, 6))
+    plt.plot(x, cpu, label="CPU Usage (%)", color="green", marker="o")
+    plt.plot(x, mem, label="Memory Usage (%)", color="purple", marker="x")
+    plt.xlabel("Time (ms)"); plt.ylabel("Usage (%)")
+    plt.title(f"CPU & RAM Usage Over Time\n{title}")
+    plt.legend(title=legend, loc="upper right")
+    plt.grid(True, linestyle="--", alpha=0.6); plt.tight_layout()
+    plt.savefig(path, dpi=300); plt.close()
+
+def join_client_server_requests(index):
+    """Unisce ogni riga dei CSV del client alla riga del log nginx con lo stesso Request_ID e scompone il tempo di ogni richiesta:
+    connect TCP, handshake TLS, rete della fase HTTP (tempo HTTP del client meno $request_time), elaborazione lato server e
+    overhead del client (tempo misurato in Python oltre al TOTAL_TIME di libcurl). Un file joined_* per file client e un
+    riepilogo per scenario in request_join_breakdown.csv."""
+    server_files = [os.path.join(FILTERED_LOG_DIR, f) for f in sorted(os.listdir(FILTERED_LOG_DIR)) if f.startswith("request_nginx") and f.endswith(".csv")]
+    client_files = sorted(list_request_files())
+    if not server_files or not client_files: return print("⏭️ Log per richiesta di client o nginx assenti, salto il join.")
+    server = pd.concat([pd.read_csv(f) for f in server_files], ignore_index=True).dropna(subset=["Request_ID"])
+    server = server.drop(columns=["KEM", "Warmup"]).drop_duplicates("Request_ID").rename(columns={"Timestamp": "Server_Timestamp", "Status": "Server_Status"})
+    joined_all = []
+    for file in client_files:
+        client = load_measured_requests(os.path.join(input_folder, file))
+        if "Request_ID" not in client.columns: continue
+        df = client.merge(server, on="Request_ID", how="left")
+        df["TLS_Only(ms)"] = df["TLS_Handshake(ms)"] - df["Connect_Time(ms)"]
+        df["HTTP_Network(ms)"] = (df["Total_Time(ms)"] - df["TLS_Handshake(ms)"] - df["Server_Request_Time(ms)"]).clip(lower=0)
+        df["Client_Overhead(ms)"] = df["Elapsed_Time(ms)"] - df["Total_Time(ms)"]
+        df["Scenario"] = index[file]["scenario"] if file in index else default_scenario(*get_kem_sig(client), client)
+        df = df[["Request_ID", "Request_Number", "KEM", "Signature", "Scenario", "Status", "Server_Status", "Worker_PID", "Connect_Time(ms)", "TLS_Only(ms)",
+                 "TLS_Handshake(ms)", "Total_Time(ms)", "Elapsed_Time(ms)", "Server_Request_Time(ms)", "Upstream_Time(ms)",
+                 "HTTP_Network(ms)", "Client_Overhead(ms)"] + [c for c in ("Client_Mode", "Handshake_Type", "Server_Handshake_Type") if c in df.columns]]
+        df.to_csv(os.path.join(JOINED_DIR, f"joined_{file}"), index=False)
+        joined_all.append(df)
+    if not joined_all: return print("⏭️ Nessun CSV del client con Request_ID, salto il join.")
+    df = pd.concat(joined_all, ignore_index=True)
+    df = df[df["Status"] == "Success"]
+    parts = ["Connect_Time(ms)", "TLS_Only(ms)", "HTTP_Network(ms)", "Server_Request_Time(ms)", "Upstream_Time(ms)", "Client_Overhead(ms)"]
+    summary = df.groupby(["KEM", "Signature", "Scenario"]).agg(Requests=("Request_ID", "size"), Matched=("Worker_PID", "count"),
+                                                   Workers=("Worker_PID", "nunique"), **{f"Avg_{p}": (p, "mean") for p in parts}).round(4).reset_index()
+    summary.insert(5, "Match_Rate(%)", (summary["Matched"] / summary["Requests"] * 100).round(2))
+    summary.to_csv(join_summary_csv, index=False)
+    print(f"✅ Join client/nginx completato: {len(df)} richieste, riepilogo in {join_summary_csv}")
+
+def list_request_files():
+    return {f for f in os.listdir(input_folder) if f.startswith("request_client") and f.endswith(".csv")}
+
+def relative_handshake_ci(files, index):
+    """Semiampiezza relativa dell'IC al 95% della media del TLS handshake, calcolato sulle medie delle repliche di `index`
+    (l'indice aggiornato una volta per round da run_all_tests_randomized)."""
+    means = [index[os.path.basename(f)]["means"]["TLS_Handshake(ms)"] for f in files if os.path.basename(f) in index]
+    means = [m for m in means if m is not None]
+    if len(means) < 2 or statistics.mean(means) == 0: return math.inf
+    t = T_95[len(means) - 2] if len(means) - 2 < len(T_95) else 1.96
+    return t * statistics.stdev(means) / math.sqrt(len(means)) / statistics.mean(means)
+
+class ReplicaOutcomes:
+    """Tentativi e fallimenti consecutivi per scenario: una replica senza run_id non entra nel ledger e verrebbe
+    ripianificata all'infinito, quindi lo scenario viene abbandonato dopo MAX_FAILURES fallimenti di seguito."""
+    def __init__(self):
+        self.attempts, self.failures = defaultdict(int), defaultdict(int)
+
+    def record(self, idx, run_id):
+        self.attempts[idx] += 1
+        self.failures[idx] = 0 if run_id else self.failures[idx] + 1
+        if self.failures[idx] == MAX_FAILURES:
+            print(f"🚫 {kem_list[idx]} + {sig_list[idx]} ({workload_list[idx]}): {MAX_FAILURES} repliche fallite di seguito, scenario abbandonato.")
+
+    def abandoned(self, idx):
+        return self.failures[idx] >= MAX_FAILURES
+
+def next_replica(done):
+    """Primo numero di replica non registrato nel ledger: riempie i buchi lasciati dalle repliche fallite."""
+    return next(j for j in itertools.count(1) if j not in done)
 
 def run_all_tests_randomized():
-    plan = [(i, j) for i in range(len(kem_list)) for j in range(1, NUM_RUNS + 1)]
+    """Esegue in ordine casuale le repliche degli scenari non ancora registrate nel ledger: un piano interrotto riprende
+    dalle sole repliche mancanti. I file delle repliche già completate restano validi per la modalità adattiva."""
+    done = load_ledger()
+    scenario_files, last_sig, outcomes = defaultdict(list), None, ReplicaOutcomes()
+    for idx in range(len(scenarios)):
+        for replica in sorted(done[scenario_key(idx)]): scenario_files[idx] += done[scenario_key(idx)][replica]
+    plan = [(i, j) for i in range(len(scenarios)) for j in range(1, (MIN_RUNS if ADAPTIVE_CI > 0 else scenarios[i]["runs"]) + 1)
+            if j not in done[scenario_key(i)]]
+    skipped = sum(len(done[scenario_key(i)]) for i in range(len(scenarios)))
+    if skipped: print(f"📒 {skipped} repliche già registrate in {LEDGER_FILE}: restano {len(plan)} repliche.")
     random.shuffle(plan)
-    with open(plan_path, "w", encoding="utf-8") as f:
-        json.dump(plan, f)
-    print(f"📤 Piano test salvato in {plan_path}")
-    last_kem, last_sig = None, None
-    for scenario_idx, replica in plan:
-        kem, sig = kem_list[scenario_idx], sig_list[scenario_idx]
-        print(f"\n🔀 Scenario: {kem} + {sig} | Replica: {replica}")
-        if kem != last_kem: update_kem(kem); last_kem = kem
-        if sig != last_sig: update_sig(sig); last_sig = sig
-        run_single_test(replica)
+    def run_plan(steps):
+        nonlocal last_sig
+        with open(plan_path, "w", encoding="utf-8") as f:
+            json.dump(steps, f)
+        print(f"📤 Piano test salvato in {plan_path}")
+        if PARALLEL_STACKS > 1: return run_parallel_plan(steps, scenario_files, outcomes)
+        for scenario_idx, replica in steps:
+            if outcomes.abandoned(scenario_idx): continue
+            kem, sig, workload, env = kem_list[scenario_idx], sig_list[scenario_idx], workload_list[scenario_idx], scenario_env(scenario_idx)
+            print(f"\n🔀 Scenario: {kem} + {sig} | Workload: {workload} | Replica: {replica}")
+            before = list_request_files()
+            if PERSISTENT_STACK:
+                run_id = run_persistent_test(replica, env, new_cert=sig != last_sig or env.get("FORCE_NEW_CERT") == "1")
+                last_sig = sig
+            else:
+                run_id = run_single_test(replica, env=env)
+            new_files = [os.path.join(input_folder, f) for f in sorted(list_request_files() - before)]
+            scenario_files[scenario_idx] += new_files
+            if run_id: record_replica(scenario_idx, replica, run_id, new_files)
+            outcomes.record(scenario_idx, run_id)
+    global PARALLEL_STACKS
+    if plan and CERT_CACHE:
+        prebuild_certificates([scenarios[i]["sig"] for i, _ in plan], [stack_host()] + [stack_host(k) for k in range(1, PARALLEL_STACKS + 1) if PARALLEL_STACKS > 1])
+    if plan and PARALLEL_STACKS > 1 and NOISE_CHECK and not noise_check(plan[0][0]):
+        print(f"⚠️ Gli stack paralleli alterano le latenze oltre ±{NOISE_TOLERANCE:.0%}: eseguo il piano su un solo stack.")
+        PARALLEL_STACKS = 1
+    if PERSISTENT_STACK and PARALLEL_STACKS == 1 and not start_persistent_stack(): return
+    if plan: run_plan(plan)
+    while ADAPTIVE_CI > 0:
+        (index, _), extend, ledger = update_summary_index(), [], load_ledger()
+        for idx in range(len(scenarios)):
+            if outcomes.abandoned(idx): continue
+            ci, recorded = relative_handshake_ci(scenario_files[idx], index), ledger[scenario_key(idx)]
+            print(f"📐 {kem_list[idx]} + {sig_list[idx]}: IC relativo ±{ci:.2%} su {len(recorded)} repliche")
+            if ci > ADAPTIVE_CI and len(recorded) < MAX_RUNS and outcomes.attempts[idx] < MAX_RUNS + MAX_FAILURES:
+                extend.append((idx, next_replica(recorded)))
+        if not extend: break
+        random.shuffle(extend)
+        run_plan(extend)
+    if PERSISTENT_STACK and PARALLEL_STACKS == 1: stop_persistent_stack()
     print("\n🎉 Tutti i test completati!")
 
 def classify_algorithms_and_update_csv(csv_path):
@@ -316,8 +856,11 @@ def classify_algorithms_and_update_csv(csv_path):
 if __name__ == "__main__":
     run_all_tests_randomized()
     print(f"\n📊 Generazione medie e grafici per tutti i batch completati...")
-    process_all_batches_for_avg_per_request(input_folder, output_csv)
+    index, changed = process_all_batches_for_avg_per_request(input_folder, output_csv)
+    if STATS_ANALYSIS: analyze_request_stats(index, changed)
+    join_client_server_requests(index)
+    ingest_results()
     classify_algorithms_and_update_csv(output_csv_avg)
     generate_graphs_from_average_per_request()
-    generate_system_monitor_graph()
-    generate_server_performance_graphs()  
\ No newline at end of file
+    generate_system_monitor_graph(index)
+    generate_server_performance_graphs(index)  
\ No newline at end of file
@@ -0,0 +1,39 @@
+"""Container, volumi e comandi docker dello stack condivisi da run_test.py e startup_bench.py; l'import non avvia comandi."""
+import os, re, subprocess
+from experiment import BASE_DIR
+
+CLIENT, SERVER, CERT_GENERATOR, WIRESHARK = "client_analysis", "nginx_pq", "cert-generator", "pq_wireshark"
+VOLUMES = ["webapppostquantum_certs", "webapppostquantum_pcap", "webapppostquantum_tls_keys"]
+CERT_CACHE_DIR = os.path.join(BASE_DIR, "cert-cache")
+# Lo stack parallelo k usa la subnet 192.168.<STACK_SUBNET_BASE+k>.0/24, con nginx su .100.
+STACK_SUBNET_BASE = 100
+
+def run_subprocess(cmd, timeout=None, env=None):
+    try:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, encoding="utf-8", errors="replace",
+                                env={**os.environ, **env} if env else None)
+        stdout, stderr = proc.communicate(timeout=timeout)
+        return proc.returncode, stdout, stderr
+    except subprocess.TimeoutExpired:
+        proc.terminate()
+        try: proc.wait(timeout=2)
+        except subprocess.TimeoutExpired: proc.kill()
+        return -1, "", "⏱️ Timeout"
+
+def check_logs(container, pattern):
+    code, out, err = run_subprocess(["docker", "logs", "--tail", "100", container], timeout=5)
+    return re.search(pattern, out) is not None if out else False
+
+def stack_host(stack=0):
+    return f"192.168.{STACK_SUBNET_BASE + stack}.100" if stack else "192.168.1.100"
+
+def prebuild_certificates(sigs, hosts):
+    """Popola cert-cache/ per ogni firma e indirizzo di nginx (il CN del certificato), con cert-generator montato in scrittura.
+    Le voci già presenti non vengono rigenerate."""
+    os.makedirs(CERT_CACHE_DIR, exist_ok=True)
+    for sig in dict.fromkeys(sigs):
+        for host in hosts:
+            code, out, err = run_subprocess(["docker-compose", "run", "--rm", "--no-deps", "-e", f"SIGNATURE_ALGO={sig}", "-e", f"SERVER_HOST={host}",
+                                             "-e", "CERT_DIR=/tmp", "--entrypoint", "/bin/sh", CERT_GENERATOR, "/cert-generator/generate_certs.sh"],
+                                            timeout=300, env={"CERT_CACHE_MODE": "rw", "FORCE_NEW_CERT": "0"})
+            print(f"🔏 Cache certificati {sig} @ {host}: " + ("pronta" if code == 0 else f"errore {(err or out).strip()[-200:]}"))
@@ -0,0 +1,54 @@
+"""Tempo di avvio dello stack con certificati generati da zero (cold) o copiati da cert-cache/ (warm).
+
+Per ogni firma degli scenari di experiment.json avvia lo stack con AUTO_RUN=0 (nessun test) e misura, da `docker-compose up -d`:
+  - Certs_Ready(s): il messaggio "Certificati pronti." di cert-generator;
+  - TLS_Ready(s): la prima richiesta HTTPS riuscita dal client verso nginx con verifica della CA.
+In modalità cold FORCE_NEW_CERT=1 genera nuove chiavi; in modalità warm la cache viene popolata prima della misura.
+
+    python startup_bench.py [--repeats 3] [--sig mldsa87 --sig p521_mldsa87]
+"""
+import argparse, csv, os, statistics, time
+from experiment import BASE_DIR, SLEEP, load_scenarios
+from stack_ops import CERT_GENERATOR, CLIENT, VOLUMES, check_logs, prebuild_certificates, run_subprocess, stack_host
+
+OUTPUT_CSV, READY_TIMEOUT = os.path.join(BASE_DIR, "report", "startup_bench.csv"), 120
+
+def measure_startup(sig, mode):
+    env = {"SIGNATURE_ALGO": sig, "AUTO_RUN": "0", "FORCE_NEW_CERT": "1" if mode == "cold" else "0"}
+    probe = ["docker", "exec", CLIENT, "curl", "-sf", "-o", "/dev/null", "--cacert", "/opt/certs/CA.crt", f"https://{stack_host()}/"]
+    start, certs_ready, tls_ready = time.perf_counter(), None, None
+    code, _, err = run_subprocess(["docker-compose", "up", "-d"], timeout=120, env=env)
+    if code != 0: print(f"❌ Errore: {err}")
+    while code == 0 and tls_ready is None and time.perf_counter() - start < READY_TIMEOUT:
+        if certs_ready is None and check_logs(CERT_GENERATOR, r"Certificati pronti\."): certs_ready = time.perf_counter() - start
+        if certs_ready is not None and run_subprocess(probe, timeout=10)[0] == 0: tls_ready = time.perf_counter() - start
+        else: time.sleep(0.1)
+    run_subprocess(["docker-compose", "down"], timeout=60, env=env)
+    for v in VOLUMES: run_subprocess(["docker", "volume", "rm", "-f", v])
+    time.sleep(SLEEP)
+    return certs_ready, tls_ready
+
+def main():
+    parser = argparse.ArgumentParser(description="Avvio dello stack con certificati nuovi (cold) o dalla cache (warm)")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--sig", action="append", help="firma da misurare (default: tutte quelle degli scenari)")
+    parser.add_argument("--output", default=OUTPUT_CSV)
+    args = parser.parse_args()
+
+    sigs, rows = list(dict.fromkeys(args.sig or [sc["sig"] for sc in load_scenarios()[0]])), []
+    prebuild_certificates(sigs, [stack_host()])
+    for sig in sigs:
+        for mode in ("cold", "warm"):
+            times = [measure_startup(sig, mode) for _ in range(args.repeats)]
+            rows += [[sig, mode, i + 1, *(round(t, 3) if t is not None else None for t in pair)] for i, pair in enumerate(times)]
+            ready = [t for _, t in times if t is not None]
+            print(f"⏱️ {sig} {mode}: TLS pronto in {statistics.median(ready):.2f} s (mediana di {len(ready)})" if ready else f"⚠️ {sig} {mode}: stack mai pronto entro {READY_TIMEOUT}s")
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Signature", "Mode", "Repeat", "Certs_Ready(s)", "TLS_Ready(s)"])
+        writer.writerows(rows)
+    print(f"📄 Risultati salvati in {args.output}")
+
+if __name__ == "__main__":
+    main()
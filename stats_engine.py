@@ -0,0 +1,72 @@
+"""Statistiche vettorizzate sulle repliche di uno scenario, senza cicli sulle righe.
+
+Le repliche (CSV del client) vengono impilate in un unico array (repliche × richieste × metriche), allineate su
+Request_Number: le richieste assenti in una replica (lunghezze diverse) e quelle fallite valgono NaN e sono escluse
+da medie e percentili. Usato da run_test.py:
+
+    cube, requests = stack_replicas(frames, ["TLS_Handshake(ms)", "Total_Time(ms)"])
+    avg = mean_per_request(cube)               # richieste × metriche
+    summary = summarize(cube, samples=2000)    # mediana, p95, p99 e IC bootstrap per metrica
+    z = outlier_scores(summary["replica_median"])
+"""
+import warnings
+import numpy as np
+
+QUANTILES = (50, 95, 99)
+
+def replica_arrays(frame, columns, key="Request_Number", status="Status"):
+    """(numeri di richiesta, valori richieste × metriche) di una replica, con NaN sulle richieste fallite."""
+    values = frame.reindex(columns=columns).to_numpy(dtype=float, copy=True)
+    if status in frame.columns: values[~frame[status].eq("Success").to_numpy()] = np.nan
+    return frame[key].to_numpy(), values
+
+def stack_arrays(replicas):
+    """Impila le coppie (numeri di richiesta, valori) di replica_arrays allineandole sull'unione dei numeri di richiesta."""
+    keys = np.unique(np.concatenate([k for k, _ in replicas]))
+    cube = np.full((len(replicas), len(keys), replicas[0][1].shape[1]), np.nan)
+    for r, (k, values) in enumerate(replicas):
+        cube[r, np.searchsorted(keys, k)] = values
+    return cube, keys
+
+def stack_replicas(frames, columns, key="Request_Number", status="Status"):
+    """Array (repliche × richieste × metriche) e numeri di richiesta corrispondenti all'asse delle richieste."""
+    return stack_arrays([replica_arrays(f, columns, key, status) for f in frames])
+
+def mean_per_request(cube):
+    """Media tra le repliche di ogni richiesta (richieste × metriche), sulle sole repliche con un valore."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return np.nanmean(cube, axis=0)
+
+def bootstrap_ci(values, samples=2000, level=0.95, seed=0):
+    """IC percentile della media tra repliche di `values` (repliche × metriche), ricampionando le repliche con reinserimento."""
+    rng = np.random.default_rng(seed)
+    idx = rng.integers(0, values.shape[0], (samples, values.shape[0]))
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        boot = np.nanmean(values[idx], axis=1)
+        return np.nanpercentile(boot, [(1 - level) / 2 * 100, (1 + level) / 2 * 100], axis=0)
+
+def summarize(cube, samples=2000, level=0.95, seed=0):
+    """Per metrica: media, mediana, p95 e p99 sulle richieste di tutte le repliche, con l'IC bootstrap della media e dei
+    percentili calcolati replica per replica (la replica è l'unità indipendente). Contiene anche i valori per replica."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        pooled = cube.reshape(-1, cube.shape[2])
+        per_replica = {"mean": np.nanmean(cube, axis=1), **dict(zip((f"p{q}" for q in QUANTILES), np.nanpercentile(cube, QUANTILES, axis=1)))}
+        result = {"replicas": np.sum(~np.isnan(cube).all(axis=1), axis=0), "requests": np.sum(~np.isnan(pooled), axis=0),
+                  "mean": np.nanmean(pooled, axis=0), **dict(zip((f"p{q}" for q in QUANTILES), np.nanpercentile(pooled, QUANTILES, axis=0)))}
+    for name, values in per_replica.items():
+        result[f"{name}_ci"] = bootstrap_ci(values, samples, level, seed)
+    result["replica_median"] = per_replica["p50"]
+    return result
+
+def outlier_scores(values):
+    """z-score robusto (Iglewicz-Hoaglin, su mediana e MAD) di ogni replica per metrica; 0 dove la MAD è nulla.
+    Con |z| > 3.5 la replica è anomala."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        median = np.nanmedian(values, axis=0)
+        mad = np.nanmedian(np.abs(values - median), axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(mad > 0, 0.6745 * (values - median) / mad, 0.0)
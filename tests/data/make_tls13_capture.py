@@ -0,0 +1,81 @@
+"""Rigenera tls13_handshake.pcap e tls13_handshake.keylog, usati da tests/test_pcap_reader.py.
+
+Due connessioni TLS 1.3 (certificato ECDSA P-256 autofirmato, CN 192.168.1.100) vengono eseguite in memoria con il modulo
+ssl; i byte scambiati sono incapsulati in frame Ethernet/IPv4/TCP tra 192.168.1.2 e 192.168.1.100:443 e scritti in un pcap
+classico. Il flight del server è diviso in segmenti da SEGMENT_SIZE byte per esercitare il riassemblaggio TCP.
+Stampa i valori attesi dal test (dimensione del Certificate, byte di handshake per connessione).
+
+    python tests/data/make_tls13_capture.py
+"""
+import os, ssl, struct, subprocess, tempfile
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+PCAP_FILE, KEYLOG_FILE = os.path.join(DATA_DIR, "tls13_handshake.pcap"), os.path.join(DATA_DIR, "tls13_handshake.keylog")
+CLIENT_IP, SERVER_IP, SERVER_PORT, SEGMENT_SIZE, CONNECTIONS = "192.168.1.2", "192.168.1.100", 443, 600, 2
+HEADERS = 14 + 20 + 20  # Ethernet + IPv4 + TCP senza opzioni
+
+def checksum(data):
+    data += b"\x00" * (len(data) % 2)
+    s = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    while s >> 16: s = (s & 0xFFFF) + (s >> 16)
+    return ~s & 0xFFFF
+
+def frame(src, dst, sport, dport, seq, ack, flags, payload):
+    tcp = struct.pack("!HHIIBBHHH", sport, dport, seq, ack, 5 << 4, flags, 65535, 0, 0) + payload
+    ip = struct.pack("!BBHHHBBH4s4s", 0x45, 0, 20 + len(tcp), 0, 0x4000, 64, 6, 0, bytes(map(int, src.split("."))), bytes(map(int, dst.split("."))))
+    ip = ip[:10] + struct.pack("!H", checksum(ip)) + ip[12:]
+    return b"\x02\x00\x00\x00\x00\x02\x02\x00\x00\x00\x00\x01\x08\x00" + ip + tcp
+
+def pump(src, src_out):
+    """Esegue un passo dell'endpoint (handshake, lettura o scrittura) e restituisce i byte che ha prodotto."""
+    try: src()
+    except (ssl.SSLWantReadError, ssl.SSLWantWriteError): pass
+    return src_out.read()
+
+def connection(client_ctx, server_ctx, n):
+    """Messaggi (dal client?, byte, di handshake?) di una connessione, nell'ordine in cui sono scambiati."""
+    c_in, c_out, s_in, s_out = ssl.MemoryBIO(), ssl.MemoryBIO(), ssl.MemoryBIO(), ssl.MemoryBIO()
+    client, server = client_ctx.wrap_bio(c_in, c_out, server_hostname=SERVER_IP), server_ctx.wrap_bio(s_in, s_out, server_side=True)
+    msgs = [(True, pump(client.do_handshake, c_out), True)]
+    s_in.write(msgs[-1][1]); msgs.append((False, pump(server.do_handshake, s_out), True))
+    c_in.write(msgs[-1][1]); msgs.append((True, pump(client.do_handshake, c_out), True))
+    s_in.write(msgs[-1][1]); msgs.append((False, pump(server.do_handshake, s_out), False))  # NewSessionTicket
+    c_in.write(msgs[-1][1]); client.write(f"GET /{n} HTTP/1.1\r\nHost: {SERVER_IP}\r\n\r\n".encode()); msgs.append((True, c_out.read(), False))
+    s_in.write(msgs[-1][1]); server.read(); server.write(b"HTTP/1.1 200 OK\r\nContent-Length: 5\r\n\r\nhello"); msgs.append((False, s_out.read(), False))
+    return [m for m in msgs if m[1]]
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        key, cert = os.path.join(tmp, "key.pem"), os.path.join(tmp, "cert.pem")
+        subprocess.run(["openssl", "req", "-x509", "-newkey", "ec", "-pkeyopt", "ec_paramgen_curve:P-256", "-nodes", "-keyout", key, "-out", cert,
+                        "-days", "3650", "-subj", f"/CN={SERVER_IP}"], check=True, capture_output=True)
+        der_len = len(ssl.PEM_cert_to_DER_cert(open(cert).read()))
+        server_ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER); server_ctx.load_cert_chain(cert, key)
+        client_ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT); client_ctx.check_hostname, client_ctx.verify_mode = False, ssl.CERT_NONE
+        for ctx in (server_ctx, client_ctx): ctx.minimum_version = ssl.TLSVersion.TLSv1_3
+        if os.path.exists(KEYLOG_FILE): os.remove(KEYLOG_FILE)
+        client_ctx.keylog_filename = KEYLOG_FILE
+        packets, ts = [], 1_700_000_000.0
+        for n in range(CONNECTIONS):
+            sport, seq, tls = 50000 + n, {True: 1000 * (n + 1), False: 9000 * (n + 1)}, [0, 0]
+            def send(from_client, flags, payload=b""):
+                nonlocal ts
+                src, dst, sp, dp = (CLIENT_IP, SERVER_IP, sport, SERVER_PORT) if from_client else (SERVER_IP, CLIENT_IP, SERVER_PORT, sport)
+                packets.append((ts, frame(src, dst, sp, dp, seq[from_client], seq[not from_client], flags, payload)))
+                seq[from_client] = (seq[from_client] + len(payload) + (1 if flags & 0x03 else 0)) % (1 << 32); ts += 0.001
+                return HEADERS + len(payload)
+            send(True, 0x02); send(False, 0x12); send(True, 0x10)
+            for from_client, data, handshake in connection(client_ctx, server_ctx, n):
+                for i in range(0, len(data), SEGMENT_SIZE):
+                    size = send(from_client, 0x18, data[i:i + SEGMENT_SIZE])
+                    if handshake: tls[0 if from_client else 1] += size
+            send(True, 0x11); send(False, 0x11); send(True, 0x10)
+            print(f"Connessione {n + 1}: byte di handshake upload={tls[0]} download={tls[1]}")
+    with open(PCAP_FILE, "wb") as f:
+        f.write(struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1))
+        for t, data in packets: f.write(struct.pack("<IIII", int(t), round(t % 1 * 1e6), len(data), len(data)) + data)
+    print(f"Certificate atteso: {der_len + 13} B (certificato DER {der_len} B + 13 B di intestazioni del messaggio)")
+    print(f"Scritti {PCAP_FILE} ({len(packets)} pacchetti) e {KEYLOG_FILE}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""client/pcap_reader.py sulla cattura di tests/data (due handshake TLS 1.3 verso 192.168.1.100:443, rigenerabile con
+tests/data/make_tls13_capture.py). I valori attesi sono ricavati dai segmenti scritti dal generatore."""
+import os, sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "client"))
+import pcap_reader
+from pcap_reader import PcapAnalyzer
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+PCAP_FILE, KEYLOG_FILE = os.path.join(DATA_DIR, "tls13_handshake.pcap"), os.path.join(DATA_DIR, "tls13_handshake.keylog")
+# Certificato DER di 393 B: messaggio Certificate = 4 (intestazione) + 1 (contesto) + 3 (lista) + 3 (lunghezza) + 393 + 2 (estensioni).
+CERTIFICATE_SIZE = 393 + 13
+# Byte dei frame (54 B di intestazioni Ethernet/IPv4/TCP ciascuno) con dati di handshake, mediati sulle due connessioni:
+# client ClientHello (279 B) e CCS + Finished (134 B); server flight in due segmenti, 654 + 218 B e 654 + 217 B (la firma ECDSA
+# della seconda connessione è più corta di 1 B).
+TLS_UPLOAD, TLS_DOWNLOAD = 279 + 134, (654 + 218 + 654 + 217) / 2
+
+def analyze(keylog=None):
+    return PcapAnalyzer("192.168.1.100", 443, keylog).process(PCAP_FILE).summary()
+
+def test_connections_and_handshake_bytes():
+    stats = analyze(KEYLOG_FILE)
+    assert stats["connections"] == 2
+    assert stats["tls_upload"] == TLS_UPLOAD and stats["tls_download"] == TLS_DOWNLOAD
+    # Il totale comprende anche SYN/FIN/ACK, richiesta HTTP e NewSessionTicket, esclusi dai byte di handshake.
+    assert stats["upload"] > stats["tls_upload"] and stats["download"] > stats["tls_download"]
+
+@pytest.mark.skipif(pcap_reader.AESGCM is None, reason="cryptography non installato: flight del server non decifrabile")
+def test_certificate_size_with_keylog():
+    assert analyze(KEYLOG_FILE)["message_sizes"]["Certificate"] == CERTIFICATE_SIZE
+
+def test_without_keylog_only_cleartext_messages():
+    stats = analyze()
+    assert stats["message_sizes"]["Certificate"] == 0 and stats["message_sizes"]["ClientHello"] > 0
+    assert stats["tls_upload"] == TLS_UPLOAD and stats["tls_download"] == TLS_DOWNLOAD
@@ -0,0 +1,25 @@
+"""stats_engine.bootstrap_ci e outlier_scores su array piccoli con risultato calcolabile a mano."""
+import os, sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from stats_engine import bootstrap_ci, outlier_scores
+
+def test_outlier_scores():
+    # Colonna 0: mediana 12, scarti |v - 12| = 2, 1, 0, 1, 28 -> MAD 1, z = 0.6745 * (v - 12).
+    # Colonna 1: costante, MAD nulla -> 0. Colonna 2: NaN escluso, mediana 3, scarti 2, 1, 1, 97 -> MAD 1.5.
+    values = np.array([[10, 5, 1], [11, 5, 2], [12, 5, np.nan], [13, 5, 4], [40, 5, 100]], dtype=float)
+    expected = np.array([[-1.349, 0, -0.8993], [-0.6745, 0, -0.4497], [0, 0, np.nan], [0.6745, 0, 0.4497], [18.886, 0, 43.6177]])
+    np.testing.assert_allclose(outlier_scores(values), expected, atol=1e-4)
+
+def test_bootstrap_ci_identical_replicas():
+    # Repliche identiche: ogni ricampionamento ha la stessa media; la replica NaN della colonna 1 è ignorata.
+    values = np.array([[2, np.nan], [2, 7], [2, 7]], dtype=float)
+    np.testing.assert_allclose(bootstrap_ci(values), [[2, 7], [2, 7]])
+
+def test_bootstrap_ci_two_replicas():
+    # Due repliche 0 e 10: la media di un ricampionamento vale 0, 5 o 10 con probabilità 1/4, 1/2, 1/4.
+    # IC al 95% (percentili 2.5 e 97.5) -> [0, 10]; IC al 40% (percentili 30 e 70, dentro la massa di 5) -> [5, 5].
+    values = np.array([[0.0], [10.0]])
+    np.testing.assert_allclose(bootstrap_ci(values, level=0.95), [[0], [10]])
+    np.testing.assert_allclose(bootstrap_ci(values, level=0.4), [[5], [5]])
@@ -0,0 +1,132 @@
+"""Microbenchmark dell'handshake TLS 1.3 in un unico processo su memory BIO, senza rete né container.
+
+Per ogni coppia KEM/firma degli scenari di experiment.json (experiment.py) genera i certificati con cert-generator/generate_certs.sh,
+avvia un processo figlio con DEFAULT_GROUPS impostato tramite openssl.cnf (come nei container) e misura
+handshake/s e latenza di ogni fase. Usa l'OpenSSL locale: le coppie non supportate vengono segnalate e saltate.
+
+    python tls_bench.py [--duration 0.5] [--provider oqsprovider[=/percorso/oqsprovider.so]]
+"""
+import argparse, csv, json, os, ssl, statistics, struct, subprocess, sys, tempfile, time
+from experiment import load_scenarios
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CERT_SCRIPT, OUTPUT_CSV = os.path.join(BASE_DIR, "cert-generator", "generate_certs.sh"), os.path.join(BASE_DIR, "report", "tls_bench.csv")
+PHASES = ["ClientHello", "ServerFlight", "ClientFinished", "ServerFinished"]
+GROUP_IDS = {"secp256r1": 0x17, "secp384r1": 0x18, "secp521r1": 0x19, "x25519": 0x1D, "x448": 0x1E,
+             "mlkem512": 0x200, "mlkem768": 0x201, "mlkem1024": 0x202, "p256_mlkem512": 0x2F4B, "p384_mlkem768": 0x2F4C,
+             "p521_mlkem1024": 0x2F4D, "SecP256r1MLKEM768": 0x11EB, "X25519MLKEM768": 0x11EC}
+
+def write_openssl_conf(path, providers):
+    """openssl.cnf con i provider richiesti e Groups = $ENV::DEFAULT_GROUPS, come nelle immagini client/nginx."""
+    lines = ["openssl_conf = bench_init", "[bench_init]", "providers = provider_sect", "ssl_conf = ssl_sect",
+             "[provider_sect]", "default = default_sect"] + [f"{name} = {name}_sect" for name, _ in providers] + ["[default_sect]", "activate = 1"]
+    for name, module in providers:
+        lines += [f"[{name}_sect]", "activate = 1"] + ([f"module = {module}"] if module else [])
+    lines += ["[ssl_sect]", "system_default = system_default_sect", "[system_default_sect]", "Groups = $ENV::DEFAULT_GROUPS"]
+    with open(path, "w", encoding="utf-8") as f: f.write("\n".join(lines) + "\n")
+
+def generate_certs(sig, cert_dir, env):
+    os.makedirs(cert_dir, exist_ok=True)
+    result = subprocess.run(["sh", CERT_SCRIPT], env={**env, "SIGNATURE_ALGO": sig, "CERT_DIR": cert_dir}, capture_output=True, text=True)
+    return result.returncode == 0
+
+def server_hello_group(data):
+    """Gruppo scelto dal server, letto dall'estensione key_share del ServerHello (primo record del volo del server)."""
+    try:
+        msg = data[5:]
+        pos = 39 + msg[38] + 3
+        end = pos + 2 + struct.unpack_from("!H", msg, pos)[0]
+        pos += 2
+        while pos + 4 <= end:
+            ext, length = struct.unpack_from("!HH", msg, pos)
+            if ext == 0x33: return struct.unpack_from("!H", msg, pos + 4)[0]
+            pos += 4 + length
+    except (IndexError, struct.error):
+        pass
+    return None
+
+def step(obj):
+    try:
+        obj.do_handshake()
+        return True
+    except ssl.SSLWantReadError:
+        return False
+
+def handshake(client_ctx, server_ctx):
+    """Esegue un handshake completo e restituisce la durata (s) di ogni fase e il gruppo negoziato."""
+    c_in, c_out, s_in, s_out = ssl.MemoryBIO(), ssl.MemoryBIO(), ssl.MemoryBIO(), ssl.MemoryBIO()
+    client, server = client_ctx.wrap_bio(c_in, c_out), server_ctx.wrap_bio(s_in, s_out, server_side=True)
+    timings, group, client_done, server_done = [], None, False, False
+    while not (client_done and server_done):
+        if len(timings) > 8: raise ssl.SSLError("Handshake non completato")
+        t = time.perf_counter(); client_done = step(client) or client_done; timings.append(time.perf_counter() - t)
+        s_in.write(c_out.read())
+        t = time.perf_counter(); server_done = step(server) or server_done; timings.append(time.perf_counter() - t)
+        flight = s_out.read()
+        if group is None: group = server_hello_group(flight)
+        c_in.write(flight)
+    # Eventuali passi extra (HelloRetryRequest) confluiscono nell'ultima fase.
+    return timings[:3] + [sum(timings[3:])], group
+
+def run_worker(cert_dir, duration, min_handshakes):
+    server_ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    server_ctx.minimum_version = ssl.TLSVersion.TLSv1_3
+    server_ctx.load_cert_chain(os.path.join(cert_dir, "qsc-ca-chain.crt"), os.path.join(cert_dir, "server.key"))
+    client_ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    client_ctx.minimum_version, client_ctx.check_hostname = ssl.TLSVersion.TLSv1_3, False
+    client_ctx.load_verify_locations(os.path.join(cert_dir, "CA.crt"))
+    handshake(client_ctx, server_ctx)  # warm-up
+    samples, group, start = [], None, time.perf_counter()
+    while len(samples) < min_handshakes or time.perf_counter() - start < duration:
+        timings, group = handshake(client_ctx, server_ctx)
+        samples.append(timings)
+    elapsed = time.perf_counter() - start
+    json.dump({"handshakes": len(samples), "elapsed": elapsed, "group": group,
+               "phases_us": [[round(t * 1e6, 2) for t in phase] for phase in zip(*samples)]}, sys.stdout)
+
+def bench_pair(kem, sig, args, conf_path, workdir):
+    env = {**os.environ, "OPENSSL_CONF": conf_path, "DEFAULT_GROUPS": kem}
+    cert_dir = os.path.join(workdir, sig)
+    if not os.path.exists(os.path.join(cert_dir, "qsc-ca-chain.crt")) and not generate_certs(sig, cert_dir, env):
+        return None, f"firma {sig} non disponibile nell'OpenSSL locale"
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--worker", cert_dir, "--duration", str(args.duration),
+                           "--min-handshakes", str(args.min_handshakes)], env=env, capture_output=True, text=True)
+    if proc.returncode != 0: return None, proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "errore sconosciuto"
+    result = json.loads(proc.stdout)
+    if kem in GROUP_IDS and result["group"] != GROUP_IDS[kem]:
+        return None, f"gruppo {kem} non disponibile (negoziato 0x{result['group'] or 0:04x})"
+    return result, None
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark in-memory dell'handshake TLS 1.3 per le coppie KEM/firma degli scenari di experiment.json")
+    parser.add_argument("--duration", type=float, default=0.5, help="secondi di misura per coppia")
+    parser.add_argument("--min-handshakes", type=int, default=20)
+    parser.add_argument("--provider", action="append", default=[], help="provider OpenSSL da attivare, es. oqsprovider o oqsprovider=/path/oqsprovider.so")
+    parser.add_argument("--output", default=OUTPUT_CSV)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker: return run_worker(args.worker, args.duration, args.min_handshakes)
+
+    scenarios, _ = load_scenarios()
+    providers = [tuple(p.split("=", 1)) if "=" in p else (p, None) for p in args.provider]
+    rows = []
+    with tempfile.TemporaryDirectory() as workdir:
+        conf_path = os.path.join(workdir, "openssl.cnf")
+        write_openssl_conf(conf_path, providers)
+        for kem, sig in dict.fromkeys((sc["kem"], sc["sig"]) for sc in scenarios):
+            result, error = bench_pair(kem, sig, args, conf_path, workdir)
+            if error: print(f"⏭️ Salto {kem} + {sig}: {error}"); continue
+            medians = [statistics.median(p) for p in result["phases_us"]]
+            hs_per_s = result["handshakes"] / result["elapsed"]
+            rows.append([kem, sig, result["handshakes"], round(hs_per_s, 1)] + [round(m, 1) for m in medians] + [round(sum(medians), 1)])
+            print(f"✅ {kem} + {sig}: {hs_per_s:.1f} handshake/s | " + ", ".join(f"{p}={m:.1f} µs" for p, m in zip(PHASES, medians)))
+    if not rows: return print("⚠️ Nessuna coppia KEM/firma supportata dall'OpenSSL locale.")
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["KEM", "Signature", "Handshakes", "Handshakes_per_s"] + [f"Median_{p}(us)" for p in PHASES] + ["Median_Sum(us)"])
+        writer.writerows(rows)
+    print(f"📄 Risultati salvati in {args.output}")
+
+if __name__ == "__main__":
+    main()